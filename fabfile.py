@@ -175,6 +175,15 @@ def celery():
         run('celery -B -A tandlr worker -l info')
 
 
+@task
+def dispatcher():
+    """
+    Starts the notification dispatcher inside the Vagrant VM.
+    """
+    with virtualenv():
+        run('python manage.py run_notification_dispatcher')
+
+
 @task
 def deploy(git_ref, upgrade=False):
     """
@@ -252,6 +261,11 @@ def deploy(git_ref, upgrade=False):
                 run('sudo /usr/bin/supervisorctl restart {0}-celeryd'.format(
                     env.user))
 
+            message = 'Restarting notification dispatcher'
+            with cmd_msg(message, spaces=2):
+                run('sudo /usr/bin/supervisorctl restart '
+                    '{0}-dispatcher'.format(env.user))
+
             message = white('Registering deployment')
             with cmd_msg(message, spaces=2):
                 register_deployment(commit, branch)
@@ -18,7 +18,11 @@ class MassNotificationAdmin(admin.ModelAdmin):
         'body',
         'university',
         'delivery_date',
-        'state'
+        'state',
+        'total_devices',
+        'sent_devices',
+        'failed_devices',
+        'progress'
     )
 
     search_fields = ('body', )
@@ -27,9 +31,10 @@ class MassNotificationAdmin(admin.ModelAdmin):
 
     def has_change_permission(self, request, obj=None):
         """
-        Disables the edition of an instance if it is currently delivered.
+        Disables the edition of an instance if it is being or was already
+        delivered.
         """
-        if obj and obj.state == MassNotification.STATE.DELIVERED:
+        if obj and obj.state != MassNotification.STATE.SCHEDULED:
             return False
 
         return super(MassNotificationAdmin, self).has_change_permission(
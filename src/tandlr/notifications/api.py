@@ -1,8 +1,6 @@
 # -*- coding: utf-8 -*-
 import json
 
-from django.utils import timezone
-
 from rest_framework import status
 from rest_framework.decorators import detail_route, list_route
 from rest_framework.response import Response
@@ -10,6 +8,7 @@ from rest_framework.response import Response
 from tandlr.api.v2.routers import router
 from tandlr.core.api import mixins, viewsets
 
+from . import counters
 from .models import Notification
 from .serializers import NotificationV2Serializer
 
@@ -49,14 +48,38 @@ class NotificationViewSet(
         produces:
             - application/json
         """
-        notifications = self.get_queryset()
-        count = notifications.filter(is_read=False).update(
-            is_read=True,
-            last_modified=timezone.now()
-        )
+        count = counters.mark_as_read(request.user.id, self.get_queryset())
 
         return Response({'updated_items': count})
 
+    @list_route(methods=['get'])
+    def unread_count(self, request):
+        """
+        Returns the number of unread notifications.
+        ---
+
+        omit_serializer: true
+
+        type:
+            unread_count:
+                type: int
+                required: true
+
+        responseMessages:
+            - code: 200
+              message: OK
+            - code: 500
+              message: INTERNAL SERVER ERROR
+
+        consumes:
+            - application/json
+        produces:
+            - application/json
+        """
+        count = counters.get_counts([request.user.id])[request.user.id]
+
+        return Response({'unread_count': count})
+
     @detail_route(methods=['post'])
     def mark_as_read(self, request, pk=None):
         """
@@ -79,8 +102,11 @@ class NotificationViewSet(
             - application/json
         """
         notification = self.get_object()
-        notification.is_read = True
-        notification.save()
+        counters.mark_as_read(
+            request.user.id,
+            Notification.objects.filter(pk=notification.pk)
+        )
+        notification.refresh_from_db()
 
         serializer = self.get_serializer(notification)
         return Response(serializer.data)
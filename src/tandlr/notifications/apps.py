@@ -16,10 +16,6 @@ class NotificationsAppConfig(AppConfig):
         """
         Registers the signals that will be handled by this module.
         """
-        post_save.connect(
-            signals.send_push_notification_on_creation,
-            sender=self.get_model('Notification')
-        )
         post_save.connect(
             signals.schedule_push_notification_delivery,
             sender=self.get_model('MassNotification')
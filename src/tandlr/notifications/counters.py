@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Unread notification counters.
+
+The number of unread notifications of every user is kept in its
+```UnreadNotificationCounter```, so the badges of the pushes and the
+```unread_count``` endpoints never count the notifications:
+
+    - The notifications created one by one or in bulk are added to the
+      counters of their receivers in the same transaction (see
+      ```Notification.save``` and ```NotificationManager.bulk_create```).
+    - ```mark_as_read``` subtracts the notifications that it actually marked
+      in the same transaction.
+    - A missing counter is created with the number of unread notifications
+      of its user.
+    - The ```reconcile_unread_notification_counters``` task fixes the
+      counters that drifted (deleted notifications, updates made outside of
+      this module) in chunks of NOTIFICATION_COUNTER_CHUNK_SIZE users. Every
+      chunk locks its counters, so the concurrent changes wait for it.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from tandlr.notifications.models import (
+    Notification,
+    UnreadNotificationCounter
+)
+
+
+def count_unread(user_ids):
+    """
+    Returns the number of unread notifications of the given users, counted
+    from their notifications.
+    """
+    return dict(
+        Notification.objects.filter(
+            receiver_id__in=user_ids,
+            is_read=False
+        ).values(
+            'receiver_id'
+        ).annotate(
+            count=Count('id')
+        ).values_list(
+            'receiver_id',
+            'count'
+        )
+    )
+
+
+def get_counts(user_ids):
+    """
+    Returns the number of unread notifications of the given users.
+    """
+    counts = dict(
+        UnreadNotificationCounter.objects.filter(
+            user_id__in=user_ids
+        ).values_list(
+            'user_id',
+            'count'
+        )
+    )
+
+    missing = [user_id for user_id in user_ids if user_id not in counts]
+
+    if missing:
+        counts.update(count_unread(missing))
+
+    return dict(
+        (user_id, max(counts.get(user_id, 0), 0)) for user_id in user_ids
+    )
+
+
+def add(counts):
+    """
+    Adds the given number of notifications to the counters of the given
+    users ({user id: number}). It must run in the transaction that changes
+    the notifications.
+    """
+    user_ids_by_delta = defaultdict(list)
+
+    for user_id, delta in counts.items():
+        if delta:
+            user_ids_by_delta[delta].append(user_id)
+
+    for delta, user_ids in user_ids_by_delta.items():
+        updated = UnreadNotificationCounter.objects.filter(
+            user_id__in=user_ids
+        ).update(
+            count=F('count') + delta
+        )
+
+        if updated < len(user_ids):
+            _create_missing(user_ids, delta)
+
+
+def mark_as_read(user_id, notifications):
+    """
+    Marks the unread notifications of the given queryset as read, they must
+    all belong to the given user. Returns the number of marked
+    notifications.
+    """
+    with transaction.atomic():
+        count = notifications.filter(
+            is_read=False
+        ).update(
+            is_read=True,
+            last_modified=timezone.now()
+        )
+
+        add({user_id: -count})
+
+    return count
+
+
+def reconcile():
+    """
+    Fixes the counters that drifted and creates the missing counters of the
+    users with unread notifications. Returns the number of fixed counters.
+    """
+    fixed = 0
+    last_user_id = 0
+
+    while True:
+        with transaction.atomic():
+            counters = list(
+                UnreadNotificationCounter.objects.select_for_update().filter(
+                    user_id__gt=last_user_id
+                ).order_by(
+                    'user_id'
+                ).values_list(
+                    'user_id',
+                    'count'
+                )[:settings.NOTIFICATION_COUNTER_CHUNK_SIZE]
+            )
+
+            if not counters:
+                break
+
+            counts = count_unread([user_id for user_id, _ in counters])
+
+            for user_id, count in counters:
+                if counts.get(user_id, 0) != count:
+                    UnreadNotificationCounter.objects.filter(
+                        user_id=user_id
+                    ).update(
+                        count=counts.get(user_id, 0)
+                    )
+                    fixed += 1
+
+        last_user_id = counters[-1][0]
+
+    missing = list(
+        get_user_model().objects.filter(
+            notifications__is_read=False,
+            unread_notification_counter__isnull=True
+        ).values_list(
+            'id',
+            flat=True
+        ).distinct()
+    )
+
+    with transaction.atomic():
+        _create_missing(missing, 0)
+
+    return fixed + len(missing)
+
+
+def _create_missing(user_ids, delta):
+    existing = set(
+        UnreadNotificationCounter.objects.filter(
+            user_id__in=user_ids
+        ).values_list(
+            'user_id',
+            flat=True
+        )
+    )
+    missing = [user_id for user_id in user_ids if user_id not in existing]
+    counts = count_unread(missing)
+
+    for user_id in missing:
+        try:
+            with transaction.atomic():
+                UnreadNotificationCounter.objects.create(
+                    user_id=user_id,
+                    count=counts.get(user_id, 0)
+                )
+        except IntegrityError:
+            #
+            # A concurrent transaction created the counter, without the
+            # changes of this one.
+            #
+            UnreadNotificationCounter.objects.filter(
+                user_id=user_id
+            ).update(
+                count=F('count') + delta
+            )
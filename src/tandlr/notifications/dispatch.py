@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+"""
+Dispatcher of the push notifications.
+
+Every new ```Notification``` is pending (```pending_dispatch```) until it's
+pushed. The ```run_notification_dispatcher``` command drains the pending
+notifications in micro-batches: it claims up to
+NOTIFICATION_DISPATCH_BATCH_SIZE of them every
+NOTIFICATION_DISPATCH_INTERVAL seconds (right away while it finds full
+batches) and pushes every batch with a handful of queries:
+
+    - The batch is claimed by a transaction that locks its rows, so a
+      notification is never claimed twice.
+    - The notifications with their target types, the unread counters of the
+      receivers (see ```tandlr.notifications.counters```) and their devices
+      are loaded with one query each.
+    - All the mobile notifications of the batch are written in a single
+      APNs frame, to a pooled connection.
+    - The batch is marked as delivered with a single ```UPDATE```.
+
+The notifications of a receiver about the same target are coalesced: the
+first one is pushed right away and opens a window of
+NOTIFICATION_COALESCING_WINDOW seconds (kept in the cache). The ones that
+arrive while the window is open are held (```dispatch_after```) until it
+closes, and then a single push carries the body of the latest one and the
+number of merged notifications (```count```). All of them are stored and
+marked as delivered, so a busy chat only wakes the devices once per window.
+Only the mobile pushes are coalesced: the web notification of every
+notification is sent the first time it's claimed, so the open browsers get
+all of them right away. The notifications are marked (```dispatch_after```)
+before their web notifications are sent, so a batch pushed again after a
+failure doesn't send them twice.
+
+The pending notifications are read through a partial index, so the polling
+is cheap. The ```dispatch_pending_notifications``` task drains them in case
+the worker is down, and the tasks that push the notifications created in
+bulk claim them before pushing them, so they are only pushed once.
+
+A batch that fails to be pushed is left pending again, but for its
+delivered notifications, and the dispatcher logs the error and carries on
+with the next batch. If the worker dies before pushing a claimed batch, its
+notifications are lost like a push dropped by the APNs.
+"""
+import json
+import logging
+import time
+from collections import OrderedDict, defaultdict
+from datetime import timedelta
+
+from channels import Group
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from tandlr.notifications import counters
+from tandlr.notifications.models import Notification
+from tandlr.notifications.push.apple import tasks as apple
+from tandlr.users.models import DeviceUser
+
+
+log = logging.getLogger(__name__)
+
+WINDOW_KEY = 'push-window:{0}:{1}:{2}'
+
+
+def claim(limit=None, **filters):
+    """
+    Claims up to the given number of pending notifications that match the
+    given filters, all of them if there is no limit. Returns their ids.
+
+    The notifications held by an open window are left pending.
+    """
+    with transaction.atomic():
+        pending = Notification.objects.select_for_update().filter(
+            Q(dispatch_after__isnull=True) |
+            Q(dispatch_after__lte=timezone.now()),
+            pending_dispatch=True,
+            **filters
+        ).order_by(
+            'id'
+        ).values_list(
+            'id',
+            flat=True
+        )
+
+        if limit is not None:
+            pending = pending[:limit]
+
+        notification_ids = list(pending)
+
+        Notification.objects.filter(
+            id__in=notification_ids
+        ).update(
+            pending_dispatch=False
+        )
+
+    return notification_ids
+
+
+def release(notification_ids):
+    """
+    Leaves pending again the given claimed notifications that weren't
+    delivered, returns their number.
+    """
+    return Notification.objects.filter(
+        id__in=notification_ids,
+        was_delivered=False
+    ).update(
+        pending_dispatch=True
+    )
+
+
+def dispatch(notification_ids, now=None):
+    """
+    Pushes the given claimed notifications to the receivers that enabled
+    the push notifications, returns the number of delivered ones.
+
+    The notifications are released if they can't be pushed.
+    """
+    if not notification_ids:
+        return 0
+
+    try:
+        return _dispatch(notification_ids, now)
+    except Exception:
+        release(notification_ids)
+        raise
+
+
+def _dispatch(notification_ids, now):
+    now = now or timezone.now()
+
+    notifications = list(
+        Notification.objects.filter(
+            id__in=notification_ids,
+            receiver__settings__push_notifications_enabled=True
+        ).select_related(
+            'target_type'
+        ).order_by(
+            'id'
+        )
+    )
+
+    #
+    # The notifications with a dispatch_after already had their web
+    # notification.
+    #
+    new_notifications = [
+        notification for notification in notifications
+        if notification.dispatch_after is None
+    ]
+
+    pushes, held = coalesce(notifications, now)
+
+    held_ids = set()
+
+    for dispatch_after, ids in held.items():
+        Notification.objects.filter(
+            id__in=ids
+        ).update(
+            pending_dispatch=True,
+            dispatch_after=dispatch_after
+        )
+        held_ids.update(ids)
+
+    Notification.objects.filter(
+        id__in=[
+            notification.id for notification in new_notifications
+            if notification.id not in held_ids
+        ]
+    ).update(
+        dispatch_after=now
+    )
+
+    for notification in new_notifications:
+        send_web_notification(notification)
+
+    if not pushes:
+        return 0
+
+    receiver_ids = set(
+        notification.receiver_id for notification, _ in pushes
+    )
+
+    unread_counts = counters.get_counts(receiver_ids)
+
+    tokens = defaultdict(list)
+
+    for user_id, token in DeviceUser.objects.exclude(
+        device_user_token__isnull=True
+    ).filter(
+        user_id__in=receiver_ids,
+        is_active=True,
+        device_os='iOS'
+    ).values_list(
+        'user_id',
+        'device_user_token'
+    ):
+        tokens[user_id].append(token)
+
+    mobile_notifications = []
+    delivered_ids = []
+
+    for notification, merged_ids in pushes:
+        extra = get_target(notification)
+        extra['count'] = len(merged_ids)
+
+        for token in tokens[notification.receiver_id]:
+            data = {
+                'token': token,
+                'alert': notification.body,
+                'badge': unread_counts.get(notification.receiver_id, 0)
+            }
+            data.update(extra)
+            mobile_notifications.append(data)
+
+        delivered_ids.extend(merged_ids)
+
+    if mobile_notifications:
+        apple.send_push_notifications_multiple(mobile_notifications)
+
+    return Notification.objects.filter(
+        id__in=delivered_ids
+    ).update(
+        was_delivered=True
+    )
+
+
+def get_target(notification):
+    """
+    Returns the target of the given notification sent with its pushes.
+    """
+    return {
+        'target_id': notification.target_id,
+        'target_type': (
+            notification.target_type.model
+            if notification.target_type_id else None
+        ),
+        'target_action': notification.target_action
+    }
+
+
+def send_web_notification(notification):
+    """
+    Sends the given notification to the browsers of its receiver.
+    """
+    Group('notifications' + str(notification.receiver_id)).send({
+        'text': json.dumps(dict(
+            (key, str(value))
+            for key, value in get_target(notification).items()
+        ))
+    })
+
+
+def coalesce(notifications, now):
+    """
+    Groups the given notifications by receiver and target. Returns the
+    pushes, the (latest notification, ids of the merged ones) of the groups
+    whose window is closed, and the ids of the notifications held by an
+    open window by the end of their window.
+
+    The windows of the pushed groups are opened.
+    """
+    window = timedelta(seconds=settings.NOTIFICATION_COALESCING_WINDOW)
+    groups = OrderedDict()
+    pushes = []
+
+    for notification in notifications:
+        if not window or notification.target_type_id is None:
+            pushes.append((notification, [notification.id]))
+            continue
+
+        key = WINDOW_KEY.format(
+            notification.receiver_id,
+            notification.target_type_id,
+            notification.target_id
+        )
+        groups.setdefault(key, []).append(notification)
+
+    if not groups:
+        return pushes, {}
+
+    opened = cache.get_many(list(groups))
+    held = defaultdict(list)
+    pushed_keys = []
+
+    for key, group in groups.items():
+        #
+        # The notifications are ordered by id, the last one is the latest.
+        #
+        if key in opened and opened[key] + window > now:
+            held[opened[key] + window].extend(
+                notification.id for notification in group
+            )
+        else:
+            pushes.append(
+                (group[-1], [notification.id for notification in group])
+            )
+            pushed_keys.append(key)
+
+    if pushed_keys:
+        cache.set_many(
+            dict((key, now) for key in pushed_keys),
+            timeout=settings.NOTIFICATION_COALESCING_WINDOW + 1
+        )
+
+    return pushes, held
+
+
+def drain():
+    """
+    Pushes all the pending notifications, returns the number of claimed
+    ones.
+    """
+    batch_size = settings.NOTIFICATION_DISPATCH_BATCH_SIZE
+    claimed = 0
+
+    while True:
+        notification_ids = claim(batch_size)
+        dispatch(notification_ids)
+        claimed += len(notification_ids)
+
+        if len(notification_ids) < batch_size:
+            return claimed
+
+
+class Dispatcher(object):
+    """
+    Pushes the pending notifications in micro-batches.
+    """
+
+    def __init__(self):
+        self.batch_size = settings.NOTIFICATION_DISPATCH_BATCH_SIZE
+        self.interval = settings.NOTIFICATION_DISPATCH_INTERVAL
+
+    def tick(self):
+        """
+        Pushes a batch of the pending notifications, returns the number of
+        claimed ones.
+        """
+        notification_ids = claim(self.batch_size)
+        dispatch(notification_ids)
+
+        return len(notification_ids)
+
+    def run(self):
+        while True:
+            started = time.time()
+
+            try:
+                claimed = self.tick()
+            except Exception:
+                log.exception('The pending notifications could not be pushed')
+                claimed = 0
+
+            #
+            # A full batch means that more notifications are waiting.
+            #
+            if claimed < self.batch_size:
+                time.sleep(max(self.interval - (time.time() - started), 0))
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Compares the pushes per second sent to a fake APNs gateway with a new
+connection per task, as before the pool, and with the pooled connections.
+
+The fake gateway listens on a local port, so the command never pushes to
+Apple. It encrypts the connections when a certificate is given, so the cost
+of the TLS handshakes is measured too:
+
+    ./manage.py benchmark_apns_pool --pushes 10000 --cert-file cert.pem
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from tandlr.notifications.push.apple.fake import FakeGateway
+from tandlr.notifications.push.apple.pool import (
+    ConnectionPool,
+    GatewayConnection
+)
+from tandlr.notifications.push.apple.tasks import get_frame
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the pool of connections to the APNs gateway.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pushes',
+            type=int,
+            default=10000,
+            help='Number of pushes sent by every run.'
+        )
+        parser.add_argument(
+            '--batch',
+            type=int,
+            default=1,
+            help='Number of pushes sent by every task.'
+        )
+        parser.add_argument(
+            '--cert-file',
+            default=None,
+            help='Certificate of the fake gateway, the runs use TLS.'
+        )
+        parser.add_argument(
+            '--key-file',
+            default=None,
+            help='Private key of the certificate.'
+        )
+
+    def handle(self, *args, **options):
+        gateway = FakeGateway(
+            options['cert_file'],
+            options['key_file']
+        ).start()
+
+        def connect():
+            return GatewayConnection(
+                gateway.address,
+                cert_file=options['cert_file'],
+                key_file=options['key_file'],
+                plaintext=not options['cert_file']
+            )
+
+        def write_unpooled(data):
+            connection = connect()
+
+            try:
+                return connection.write(data)
+            finally:
+                connection.close()
+
+        pool = ConnectionPool(connect, 1, 300)
+
+        try:
+            for name, write in (
+                ('new connection per task', write_unpooled),
+                ('pooled connections', pool.write)
+            ):
+                self.run(name, gateway, write, options)
+        finally:
+            pool.close()
+            gateway.stop()
+
+    def run(self, name, gateway, write, options):
+        pushes = options['pushes']
+        batch = options['batch']
+        received = len(gateway.tokens)
+        connections = gateway.connections
+
+        frames = []
+
+        for start in range(0, pushes, batch):
+            frames.append(
+                get_frame([
+                    {
+                        'token': '{:064x}'.format(index),
+                        'alert': 'Benchmark push {}'.format(index)
+                    }
+                    for index in range(start, min(start + batch, pushes))
+                ])
+            )
+
+        started = time.time()
+
+        for frame in frames:
+            write(frame)
+
+        sent = len(gateway.wait(received + pushes, timeout=60)) - received
+        elapsed = time.time() - started
+
+        self.stdout.write(
+            '{}: {} pushes in {:.2f} s, {:.0f} pushes/s, {} connections'
+            .format(
+                name,
+                sent,
+                elapsed,
+                sent / elapsed,
+                gateway.connections - connections
+            )
+        )
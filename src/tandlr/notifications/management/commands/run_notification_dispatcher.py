@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+"""
+Worker that pushes the pending notifications in micro-batches, see
+```tandlr.notifications.dispatch```:
+
+    ./manage.py run_notification_dispatcher
+
+Several workers can run at the same time, a notification is only claimed by
+one of them.
+"""
+from django.core.management.base import BaseCommand
+
+from tandlr.notifications.dispatch import Dispatcher
+
+
+class Command(BaseCommand):
+    help = 'Pushes the pending notifications in micro-batches.'
+
+    def handle(self, *args, **options):
+        Dispatcher().run()
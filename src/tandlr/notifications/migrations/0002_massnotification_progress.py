@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='massnotification',
+            name='state',
+            field=models.IntegerField(default=100, help_text='Tells whether the notification was already sent or it is scheduled for sending in future.', verbose_name='state', choices=[(100, 'Scheduled'), (150, 'Sending'), (200, 'Delivered')]),
+        ),
+        migrations.AddField(
+            model_name='massnotification',
+            name='total_devices',
+            field=models.PositiveIntegerField(default=0, help_text='The number of devices that will be notified.', verbose_name='total devices'),
+        ),
+        migrations.AddField(
+            model_name='massnotification',
+            name='sent_devices',
+            field=models.PositiveIntegerField(default=0, help_text='The number of devices already notified.', verbose_name='sent devices'),
+        ),
+        migrations.AddField(
+            model_name='massnotification',
+            name='failed_devices',
+            field=models.PositiveIntegerField(default=0, help_text='The number of devices that could not be notified.', verbose_name='failed devices'),
+        ),
+        migrations.AddField(
+            model_name='massnotification',
+            name='total_chunks',
+            field=models.PositiveIntegerField(default=0, help_text='The number of chunks of devices sent in parallel.', verbose_name='total chunks'),
+        ),
+        migrations.AddField(
+            model_name='massnotification',
+            name='processed_chunks',
+            field=models.PositiveIntegerField(default=0, help_text='The number of chunks of devices already processed.', verbose_name='processed chunks'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+#
+# Only the pending notifications are indexed, see
+# ```tandlr.notifications.dispatch```.
+#
+CREATE_INDEX = (
+    'CREATE INDEX notifications_notification_pending_dispatch '
+    'ON notifications_notification (id) '
+    'WHERE pending_dispatch'
+)
+
+DROP_INDEX = 'DROP INDEX IF EXISTS notifications_notification_pending_dispatch'
+
+
+def create_index(apps, schema_editor):
+    # Partial indexes are only available in PostgreSQL.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_INDEX)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_massnotification_progress'),
+    ]
+
+    operations = [
+        #
+        # The existing notifications were already pushed, or won't ever be.
+        #
+        migrations.AddField(
+            model_name='notification',
+            name='pending_dispatch',
+            field=models.BooleanField(default=False, help_text='Tells whether this notification is waiting to be pushed by the dispatcher or not.', verbose_name='pending dispatch', editable=False),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='pending_dispatch',
+            field=models.BooleanField(default=True, help_text='Tells whether this notification is waiting to be pushed by the dispatcher or not.', verbose_name='pending dispatch', editable=False),
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
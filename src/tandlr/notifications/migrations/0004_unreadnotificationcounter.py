@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def create_counters(apps, schema_editor):
+    Notification = apps.get_model('notifications', 'Notification')
+    UnreadNotificationCounter = apps.get_model(
+        'notifications',
+        'UnreadNotificationCounter'
+    )
+
+    counts = Notification.objects.filter(
+        is_read=False
+    ).values(
+        'receiver_id'
+    ).annotate(
+        count=Count('id')
+    ).values_list(
+        'receiver_id',
+        'count'
+    )
+
+    UnreadNotificationCounter.objects.bulk_create(
+        [
+            UnreadNotificationCounter(user_id=user_id, count=count)
+            for user_id, count in counts
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notifications', '0003_notification_pending_dispatch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnreadNotificationCounter',
+            fields=[
+                ('user', models.OneToOneField(related_name='unread_notification_counter', primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='user')),
+                ('count', models.IntegerField(default=0, help_text='The number of unread notifications of the user.', verbose_name='count')),
+            ],
+            options={
+                'verbose_name': 'unread notification counter',
+                'verbose_name_plural': 'unread notification counters',
+            },
+        ),
+        migrations.RunPython(create_counters, migrations.RunPython.noop),
+    ]
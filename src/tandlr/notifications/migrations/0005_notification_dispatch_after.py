@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_unreadnotificationcounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='dispatch_after',
+            field=models.DateTimeField(help_text='The date & time until which this notification is held to be merged with the following ones of the same target.', null=True, verbose_name='dispatch after', editable=False),
+        ),
+    ]
@@ -1,17 +1,44 @@
 # -*- coding: utf-8 -*-
 
+from collections import defaultdict
 from datetime import timedelta
 
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
 from tandlr.core.db.models import TimeStampedMixin
 
 
+class NotificationManager(models.Manager):
+
+    def bulk_create(self, objs, batch_size=None):
+        """
+        Creates the given notifications and adds the unread ones to the
+        counters of their receivers.
+        """
+        from tandlr.notifications import counters
+
+        objs = list(objs)
+        counts = defaultdict(int)
+
+        for notification in objs:
+            if not notification.is_read:
+                counts[notification.receiver_id] += 1
+
+        with transaction.atomic():
+            created = super(NotificationManager, self).bulk_create(
+                objs,
+                batch_size=batch_size
+            )
+            counters.add(counts)
+
+        return created
+
+
 class Notification(TimeStampedMixin):
     """
     Model to store users' notifications.
@@ -77,6 +104,24 @@ class Notification(TimeStampedMixin):
             'via push notificationsi or not.'
         )
     )
+    pending_dispatch = models.BooleanField(
+        default=True,
+        editable=False,
+        verbose_name=_('pending dispatch'),
+        help_text=_(
+            'Tells whether this notification is waiting to be pushed by '
+            'the dispatcher or not.'
+        )
+    )
+    dispatch_after = models.DateTimeField(
+        null=True,
+        editable=False,
+        verbose_name=_('dispatch after'),
+        help_text=_(
+            'The date & time until which this notification is held to be '
+            'merged with the following ones of the same target.'
+        )
+    )
     is_read = models.BooleanField(
         default=False,
         verbose_name=_('is read'),
@@ -86,10 +131,27 @@ class Notification(TimeStampedMixin):
         )
     )
 
+    objects = NotificationManager()
+
     class Meta:
         verbose_name = _('notification')
         verbose_name_plural = _('notifications')
 
+    def save(self, *args, **kwargs):
+        """
+        Adds the new unread notifications to the counter of their receiver
+        (see ```tandlr.notifications.counters```).
+        """
+        from tandlr.notifications import counters
+
+        created = self.pk is None
+
+        with transaction.atomic():
+            super(Notification, self).save(*args, **kwargs)
+
+            if created and not self.is_read:
+                counters.add({self.receiver_id: 1})
+
     @property
     def notifications_sent_in_last_period(self):
         return Notification.objects.filter(
@@ -97,16 +159,40 @@ class Notification(TimeStampedMixin):
         ).count()
 
 
+class UnreadNotificationCounter(models.Model):
+    """
+    Number of unread notifications of a user, kept in step with its
+    notifications (see ```tandlr.notifications.counters```).
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        primary_key=True,
+        related_name='unread_notification_counter',
+        verbose_name=_('user')
+    )
+    count = models.IntegerField(
+        default=0,
+        verbose_name=_('count'),
+        help_text=_('The number of unread notifications of the user.')
+    )
+
+    class Meta:
+        verbose_name = _('unread notification counter')
+        verbose_name_plural = _('unread notification counters')
+
+
 class MassNotification(TimeStampedMixin):
     """
     Model to store notifications sent massively to a group of users.
     """
     class STATE:
         SCHEDULED = 100
+        SENDING = 150
         DELIVERED = 200
 
     STATE_CHOICES = (
         (STATE.SCHEDULED, _('scheduled').title()),
+        (STATE.SENDING, _('sending').title()),
         (STATE.DELIVERED, _('delivered').title())
     )
 
@@ -153,9 +239,48 @@ class MassNotification(TimeStampedMixin):
         )
     )
 
+    total_devices = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('total devices'),
+        help_text=_('The number of devices that will be notified.')
+    )
+    sent_devices = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('sent devices'),
+        help_text=_('The number of devices already notified.')
+    )
+    failed_devices = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('failed devices'),
+        help_text=_('The number of devices that could not be notified.')
+    )
+    total_chunks = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('total chunks'),
+        help_text=_('The number of chunks of devices sent in parallel.')
+    )
+    processed_chunks = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('processed chunks'),
+        help_text=_('The number of chunks of devices already processed.')
+    )
+
     class Meta:
         verbose_name = _('mass notification')
         verbose_name_plural = _('mass notifications')
 
     def __unicode__(self):
         return self.body
+
+    @property
+    def progress(self):
+        """
+        Percentage of the devices already processed.
+        """
+        if not self.total_devices:
+            return 100 if self.state == self.STATE.DELIVERED else 0
+
+        return (
+            (self.sent_devices + self.failed_devices) * 100 //
+            self.total_devices
+        )
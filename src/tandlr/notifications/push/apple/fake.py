@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Fake gateway of the APNs for the tests and the benchmarks.
+
+It listens on a local port, decodes the frames written to it (command 2)
+and keeps the device tokens of their notifications. It encrypts the
+connections when a certificate is given.
+"""
+import socket
+import ssl
+import struct
+import threading
+import time
+from binascii import hexlify
+
+
+class FakeGateway(object):
+
+    def __init__(self, cert_file=None, key_file=None):
+        self.cert_file = cert_file
+        self.key_file = key_file
+        self.tokens = []
+        self.connections = 0
+        self.sockets = []
+        self.condition = threading.Condition()
+
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(128)
+        self.address = self.server.getsockname()
+
+    def start(self):
+        thread = threading.Thread(target=self.serve)
+        thread.daemon = True
+        thread.start()
+
+        return self
+
+    def stop(self):
+        self.disconnect()
+
+        try:
+            self.server.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+
+        self.server.close()
+
+    def disconnect(self):
+        """
+        Closes all the open connections, like the gateway does after an error
+        response.
+        """
+        with self.condition:
+            sockets, self.sockets = self.sockets, []
+
+        for client in sockets:
+            try:
+                client.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+            client.close()
+
+    def wait(self, count, timeout=5):
+        """
+        Waits until the given number of notifications are received, returns
+        the received tokens.
+        """
+        deadline = time.time() + timeout
+
+        with self.condition:
+            while len(self.tokens) < count:
+                remaining = deadline - time.time()
+
+                if remaining <= 0:
+                    break
+
+                self.condition.wait(remaining)
+
+            return list(self.tokens)
+
+    def serve(self):
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except socket.error:
+                return
+
+            thread = threading.Thread(target=self.read, args=(client,))
+            thread.daemon = True
+            thread.start()
+
+    def read(self, client):
+        try:
+            if self.cert_file:
+                client = ssl.wrap_socket(
+                    client,
+                    server_side=True,
+                    certfile=self.cert_file,
+                    keyfile=self.key_file
+                )
+        except (socket.error, ssl.SSLError):
+            client.close()
+            return
+
+        with self.condition:
+            self.connections += 1
+            self.sockets.append(client)
+
+        buffer = b''
+
+        while True:
+            try:
+                data = client.recv(65536)
+            except socket.error:
+                return
+
+            if not data:
+                return
+
+            buffer += data
+
+            #
+            # Every frame has a command (1 byte) and a length (4 bytes).
+            #
+            while len(buffer) >= 5:
+                _, length = struct.unpack('>BI', buffer[:5])
+
+                if len(buffer) < 5 + length:
+                    break
+
+                self.decode(buffer[5:5 + length])
+                buffer = buffer[5 + length:]
+
+    def decode(self, frame):
+        tokens = []
+        offset = 0
+
+        #
+        # Every item has an id (1 byte), a length (2 bytes) and its data, the
+        # device token is the item 1.
+        #
+        while offset < len(frame):
+            item_id, length = struct.unpack('>BH', frame[offset:offset + 3])
+
+            if item_id == 1:
+                tokens.append(hexlify(frame[offset + 3:offset + 3 + length]))
+
+            offset += 3 + length
+
+        with self.condition:
+            self.tokens.extend(tokens)
+            self.condition.notify_all()
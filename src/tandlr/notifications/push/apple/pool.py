@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Pool of the connections to the gateway of the Apple Push Notification
+service (APNs).
+
+Every push used to open a new connection to the gateway, with its own TLS
+handshake. The pushes are now written to the connections of a pool that
+lives in every worker process:
+
+    - The connections are kept open between the tasks, at most APNS_POOL_SIZE
+      of them are kept idle.
+    - The connections idle for more than APNS_POOL_IDLE_TIMEOUT seconds are
+      closed instead of being used, the gateway drops them silently.
+    - A connection closed by the gateway (it closes it after an error
+      response) or that fails to write is discarded, and the write is retried
+      once on a new connection.
+    - A forked worker never uses the connections of its parent.
+"""
+import os
+import select
+import socket
+import ssl
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+
+GATEWAY_ADDRESSES = {
+    True: ('gateway.sandbox.push.apple.com', 2195),
+    False: ('gateway.push.apple.com', 2195),
+}
+
+
+class GatewayConnection(object):
+    """
+    Connection to the gateway. The connection is only left unencrypted when
+    it's requested with plaintext (the fake gateway of the tests and the
+    benchmarks), otherwise a certificate is required.
+    """
+    def __init__(self, address, cert_file=None, key_file=None,
+                 plaintext=False):
+        if not cert_file and not plaintext:
+            raise ImproperlyConfigured(
+                'APNS_CERT_FILE_PATH is required to connect to the APNs.'
+            )
+
+        self.socket = socket.create_connection(address)
+
+        if not plaintext:
+            self.socket = ssl.wrap_socket(
+                self.socket,
+                keyfile=key_file,
+                certfile=cert_file
+            )
+
+        self.used_at = time.time()
+
+    def is_alive(self):
+        """
+        Returns False if the gateway closed the connection or sent an error
+        response, both make the socket readable.
+        """
+        try:
+            readable, _, _ = select.select([self.socket], [], [], 0)
+        except (select.error, socket.error, ValueError):
+            return False
+
+        return not readable
+
+    def write(self, data):
+        """
+        Writes the given data, returns the number of bytes written.
+        """
+        self.socket.sendall(data)
+        self.used_at = time.time()
+
+        return len(data)
+
+    def close(self):
+        try:
+            self.socket.close()
+        except socket.error:
+            pass
+
+
+class ConnectionPool(object):
+    """
+    Keeps open the connections returned by the given factory.
+    """
+    def __init__(self, factory, size, idle_timeout):
+        self.factory = factory
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.connections = deque()
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+
+    def acquire(self):
+        """
+        Returns the most recently used connection that is still alive, or a
+        new one.
+        """
+        now = time.time()
+
+        with self.lock:
+            #
+            # The oldest connections are on the left.
+            #
+            while self.connections and (
+                now - self.connections[0].used_at > self.idle_timeout
+            ):
+                self.connections.popleft().close()
+
+            while self.connections:
+                connection = self.connections.pop()
+
+                if connection.is_alive():
+                    return connection
+
+                connection.close()
+
+        return self.factory()
+
+    def release(self, connection):
+        with self.lock:
+            if len(self.connections) < self.size:
+                self.connections.append(connection)
+                return
+
+        connection.close()
+
+    def write(self, data):
+        """
+        Writes the given data to a connection of the pool, returns the number
+        of bytes written.
+        """
+        connection = self.acquire()
+
+        try:
+            written = connection.write(data)
+        except socket.error:
+            connection.close()
+            connection = self.factory()
+
+            try:
+                written = connection.write(data)
+            except socket.error:
+                connection.close()
+                raise
+
+        self.release(connection)
+
+        return written
+
+    def close(self):
+        with self.lock:
+            while self.connections:
+                self.connections.pop().close()
+
+
+def connect():
+    """
+    Returns a new connection to the gateway of the settings.
+    """
+    use_sandbox = getattr(settings, 'APNS_USE_SANDBOX', True)
+
+    return GatewayConnection(
+        getattr(
+            settings,
+            'APNS_GATEWAY_ADDRESS',
+            GATEWAY_ADDRESSES[use_sandbox]
+        ),
+        cert_file=getattr(settings, 'APNS_CERT_FILE_PATH', ''),
+        key_file=getattr(settings, 'APNS_KEY_FILE_PATH', None)
+    )
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Returns the pool of the current process.
+    """
+    global _pool
+
+    with _pool_lock:
+        #
+        # The connections inherited from the parent process are left to it.
+        #
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = ConnectionPool(
+                connect,
+                settings.APNS_POOL_SIZE,
+                settings.APNS_POOL_IDLE_TIMEOUT
+            )
+
+        return _pool
@@ -9,11 +9,15 @@ from django.conf import settings
 
 import pytz
 
+from tandlr.notifications.push.apple.pool import get_pool
+
 
 def _get_apns_connection():
     """
     Returns an instance of ```apns.APNs``` ready to interact with the
-    Apple Push Notification Service (APNs).
+    Apple Push Notification Service (APNs), only used for its feedback
+    service. The pushes are written to the connections of the pool of
+    ```tandlr.notifications.push.apple.pool```.
     """
     return APNs(
         use_sandbox=getattr(settings, 'APNS_USE_SANDBOX', True),
@@ -40,16 +44,15 @@ def send_push_notification(token, alert, sound='default', badge=1, **kwargs):
     Returns:
         None
     """
-    apns = _get_apns_connection()
-    payload = Payload(alert=alert, sound=sound, badge=badge, custom=kwargs)
-    apns.gateway_server.send_notification(token, payload)
+    kwargs.update(token=token, alert=alert, sound=sound, badge=badge)
+    get_pool().write(get_frame([kwargs]))
 
 
 @shared_task
 def send_push_notifications_multiple(notifications):
     """
     Sends multiple push notifications to the Apple Push Notification
-    service (APNs) in a single connection.
+    service (APNs) in a single frame, written to a pooled connection.
 
     Params:
         notifications (list): A list containing dictionary objects with the
@@ -58,8 +61,15 @@ def send_push_notifications_multiple(notifications):
     Returns:
         int: the number of bytes sent to the APNs
     """
+    return get_pool().write(get_frame(notifications))
+
+
+def get_frame(notifications):
+    """
+    Returns the frame of the given notifications, as expected by
+    ```send_push_notifications_multiple```.
+    """
     frame = Frame()
-    apns = _get_apns_connection()
     expiry = time.time() + (len(notifications) * 5)
     priority = 10
 
@@ -75,7 +85,7 @@ def send_push_notifications_multiple(notifications):
             index, expiry, priority
         )
 
-    return apns.gateway_server.write(frame.get_frame())
+    return frame.get_frame()
 
 
 @shared_task
@@ -2,15 +2,6 @@
 from . import tasks
 
 
-def send_push_notification_on_creation(sender, instance, created, **kwargs):
-    """
-    Sends a push notification to the receiver's active devices asyncronouslly
-    when a ```tandlr.notifications.model.Notification``` is created.
-    """
-    if created and instance.receiver.settings.push_notifications_enabled:
-        tasks.send_push_notification.apply_async((instance.pk, ))
-
-
 def schedule_push_notification_delivery(sender, instance, created, **kwargs):
     """
     Creates a new celery task to actually perform the a mass notification
@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
-from celery import shared_task
+import socket
+
+from celery import group, shared_task
 
 from channels import Group
 
+from django.conf import settings
+from django.db.models import F
 from django.utils import timezone
 
 from tandlr.users.models import DeviceUser
@@ -13,73 +17,64 @@ from .push.apple import tasks as apple
 @shared_task
 def send_push_notification(notification_id):
     """
-    Sends push notifications to the receiver's active devices.
+    Sends push notifications to the receiver's active devices, unless the
+    notification was already pushed by the dispatcher (see
+    ```tandlr.notifications.dispatch```).
 
     Params:
-        notification (Notification): The notification instance that will be
+        notification_id (int): The id of the notification that will be
             sent to the devices.
 
     Returns:
-        None
+        int: the number of delivered notifications.
     """
-    from .models import Notification
+    from .dispatch import claim, dispatch
 
-    notification = Notification.objects.get(id=notification_id)
-    kwargs = {
-        'is_active': True,
-        'device_os': 'iOS'
-    }
+    return dispatch(claim(id=notification_id))
 
-    # Send web notifications
-    response_data = (
-        '{{"target_id":"{}","target_type":"{}","target_action":"{}"}}'
-    ).format(
-        str(notification.target_id),
-        str(notification.target._meta.model_name),
-        str(notification.target_action)
-    )
 
-    #
-    # Send web notification to specific user.
-    #
-    Group('notifications' + str(notification.receiver.id)).send({
-        'text': response_data
-    })
+@shared_task
+def send_push_notification_batch(target_type_id, target_ids, target_action):
+    """
+    Sends the push notifications of the notifications created in bulk for
+    the given targets and action without waiting for the dispatcher.
 
-    #
-    # Send mobile notifications
-    #
-    receiver = notification.receiver
-    unread_count = receiver.notifications.filter(is_read=False).count()
+    The notifications are claimed like the dispatcher does (see
+    ```tandlr.notifications.dispatch```), so they are only pushed once.
 
-    extra = {
-        'target_id': notification.target_id,
-        'target_type': notification.target._meta.model_name,
-        'target_action': notification.target_action
-    }
+    Returns:
+        int: the number of delivered notifications.
+    """
+    from .dispatch import claim, dispatch
 
-    ios_devices = notification.receiver.devices.exclude(
-        device_user_token__isnull=True
-    ).filter(
-        **kwargs
+    return dispatch(
+        claim(
+            target_type_id=target_type_id,
+            target_id__in=target_ids,
+            target_action=target_action
+        )
     )
 
-    if ios_devices.exists():
-        notifications = []
 
-        for device in ios_devices:
-            data = {
-                'token': device.device_user_token,
-                'alert': notification.body,
-                'Badge': unread_count
-            }
-            data.update(extra)
-            notifications.append(data)
+@shared_task
+def dispatch_pending_notifications():
+    """
+    Pushes the pending notifications, in case the dispatcher is down.
+    """
+    from .dispatch import drain
 
-        apple.send_push_notifications_multiple(notifications)
+    return drain()
 
-    notification.was_delivered = True
-    notification.save()
+
+@shared_task
+def reconcile_unread_notification_counters():
+    """
+    Fixes the unread notification counters that drifted from the
+    notifications.
+    """
+    from .counters import reconcile
+
+    return reconcile()
 
 
 @shared_task
@@ -87,14 +82,25 @@ def send_mass_push_notification(notification_id):
     """
     Perform the delivery of a
     ```tandlr.notifications.models.MassNotification``` instance.
+
+    The devices are split in chunks of MASS_NOTIFICATION_CHUNK_SIZE tokens,
+    delimited with keyset pagination on the tokens, and the chunks are sent
+    in parallel by a group of ```send_mass_push_notification_chunk``` tasks.
     """
     from .models import MassNotification
 
+    #
+    # A notification delivered twice by the broker is only sent once.
+    #
+    if not MassNotification.objects.filter(
+        id=notification_id,
+        state=MassNotification.STATE.SCHEDULED
+    ).update(
+        state=MassNotification.STATE.SENDING
+    ):
+        return
+
     notification = MassNotification.objects.get(id=notification_id)
-    kwargs = {
-        'is_active': True,
-        'device_os': 'iOS'
-    }
 
     # Send web notifications
     response_data = '{{"target_action":"{}","message":"{}"}}'.format(
@@ -118,31 +124,159 @@ def send_mass_push_notification(notification_id):
     #
     # Send mobile notifications
     #
-    if notification.university:
-        kwargs.update(user__university=notification.university)
+    devices = get_mass_notification_devices(notification)
+    bounds = get_mass_notification_bounds(
+        devices,
+        settings.MASS_NOTIFICATION_CHUNK_SIZE
+    )
+
+    MassNotification.objects.filter(
+        id=notification_id
+    ).update(
+        total_devices=devices.values('device_user_token').distinct().count(),
+        total_chunks=len(bounds)
+    )
+
+    if bounds:
+        group(
+            send_mass_push_notification_chunk.s(notification_id, after, last)
+            for after, last in bounds
+        ).apply_async()
+    else:
+        _finish_mass_notification(notification_id)
+
+
+@shared_task(
+    bind=True,
+    max_retries=settings.MASS_NOTIFICATION_RETRIES,
+    default_retry_delay=settings.MASS_NOTIFICATION_RETRY_DELAY
+)
+def send_mass_push_notification_chunk(self, notification_id, after, last):
+    """
+    Sends a mass notification to the devices whose tokens are after the
+    given one, up to the last one (included), in a single frame.
+    """
+    from .models import MassNotification
+
+    notification = MassNotification.objects.get(id=notification_id)
+
+    tokens = get_mass_notification_devices(notification).filter(
+        **_get_token_range(after, last)
+    ).order_by(
+        'device_user_token'
+    ).values_list(
+        'device_user_token',
+        flat=True
+    ).distinct()
+
+    notifications = [
+        {
+            'token': token,
+            'alert': notification.body,
+            'target': 'massnotification'
+        }
+        for token in tokens
+    ]
+
+    sent = failed = 0
+
+    if notifications:
+        try:
+            apple.send_push_notifications_multiple(notifications)
+            sent = len(notifications)
+        except socket.error as error:
+            if self.request.retries < self.max_retries:
+                raise self.retry(exc=error)
+
+            failed = len(notifications)
+
+    MassNotification.objects.filter(
+        id=notification_id
+    ).update(
+        processed_chunks=F('processed_chunks') + 1,
+        sent_devices=F('sent_devices') + sent,
+        failed_devices=F('failed_devices') + failed
+    )
+
+    _finish_mass_notification(notification_id)
+
+
+def get_mass_notification_devices(notification):
+    """
+    Returns the active iOS devices that must receive the given mass
+    notification.
+    """
+    kwargs = {
+        'is_active': True,
+        'device_os': 'iOS'
+    }
+
+    if notification.university_id:
+        kwargs.update(user__university_id=notification.university_id)
 
-    ios_devices = DeviceUser.objects.exclude(
+    return DeviceUser.objects.exclude(
         device_user_token__isnull=True
     ).filter(
         **kwargs
-    ).distinct(
-        'device_user_token'
     )
 
-    # Only send notifications if there are active iOS devices
-    if ios_devices.exists():
-        for device in ios_devices:
-            notifications = []
-            data = {
-                'token': device.device_user_token,
-                'alert': notification.body,
-                'target': 'massnotification'
-            }
-            notifications.append(data)
 
-            apple.send_push_notifications_multiple(notifications)
+def get_mass_notification_bounds(devices, size):
+    """
+    Returns the (after, last) tokens of the chunks of the given devices,
+    the last token of the last chunk is None.
+
+    Every chunk only reads the token that ends it, through the index of the
+    tokens, so the devices are never loaded.
+    """
+    tokens = devices.order_by(
+        'device_user_token'
+    ).values_list(
+        'device_user_token',
+        flat=True
+    ).distinct()
+
+    bounds = []
+    after = None
+
+    while True:
+        remaining = tokens.filter(**_get_token_range(after, None))
+        last = list(remaining[size - 1:size])
+
+        if not last:
+            if remaining.exists():
+                bounds.append((after, None))
+
+            return bounds
+
+        bounds.append((after, last[0]))
+        after = last[0]
 
-    # Mark the notification as delivered
-    notification.state = MassNotification.STATE.DELIVERED
-    notification.delivery_date = timezone.now()
-    notification.save()
+
+def _get_token_range(after, last):
+    kwargs = {}
+
+    if after is not None:
+        kwargs['device_user_token__gt'] = after
+
+    if last is not None:
+        kwargs['device_user_token__lte'] = last
+
+    return kwargs
+
+
+def _finish_mass_notification(notification_id):
+    """
+    Marks the given mass notification as delivered once all its chunks are
+    processed.
+    """
+    from .models import MassNotification
+
+    MassNotification.objects.filter(
+        id=notification_id,
+        state=MassNotification.STATE.SENDING,
+        processed_chunks__gte=F('total_chunks')
+    ).update(
+        state=MassNotification.STATE.DELIVERED,
+        delivery_date=timezone.now()
+    )
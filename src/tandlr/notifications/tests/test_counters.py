@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+
+from tandlr.notifications import counters
+from tandlr.notifications.models import (
+    Notification,
+    UnreadNotificationCounter
+)
+from tandlr.users.models import User
+
+
+class UnreadCountersTestCase(TestCase):
+    """
+    Tests for ```tandlr.notifications.counters```.
+    """
+    def setUp(self):
+        self.receiver = User.objects.create_user(
+            username='student',
+            email='student@example.com',
+            password='secret'
+        )
+
+    def create_notification(self, **kwargs):
+        return Notification(
+            receiver=self.receiver,
+            target_action='accepted',
+            body='Notification',
+            **kwargs
+        )
+
+    def get_count(self):
+        return counters.get_counts([self.receiver.id])[self.receiver.id]
+
+    def test_created_notifications(self):
+        self.create_notification().save()
+        Notification.objects.bulk_create([
+            self.create_notification(),
+            self.create_notification(),
+            self.create_notification(is_read=True)
+        ])
+
+        self.assertEqual(self.get_count(), 3)
+
+    def test_mark_as_read(self):
+        Notification.objects.bulk_create([
+            self.create_notification() for _ in range(3)
+        ])
+        notification = Notification.objects.first()
+
+        notifications = Notification.objects.filter(pk=notification.pk)
+        self.assertEqual(
+            counters.mark_as_read(self.receiver.id, notifications),
+            1
+        )
+        self.assertEqual(
+            counters.mark_as_read(self.receiver.id, notifications),
+            0
+        )
+        self.assertEqual(self.get_count(), 2)
+
+        counters.mark_as_read(
+            self.receiver.id,
+            self.receiver.notifications.all()
+        )
+        self.assertEqual(self.get_count(), 0)
+
+    def test_reconcile(self):
+        Notification.objects.bulk_create([
+            self.create_notification() for _ in range(2)
+        ])
+
+        # The notifications updated outside of the counters.
+        Notification.objects.update(is_read=True)
+        self.assertEqual(self.get_count(), 2)
+
+        self.assertEqual(counters.reconcile(), 1)
+        self.assertEqual(self.get_count(), 0)
+
+        # The missing counters are created.
+        UnreadNotificationCounter.objects.all().delete()
+        Notification.objects.update(is_read=False)
+
+        self.assertEqual(counters.reconcile(), 1)
+        self.assertEqual(
+            UnreadNotificationCounter.objects.get().count,
+            2
+        )
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+import socket
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from tandlr.notifications import dispatch
+from tandlr.notifications.models import Notification
+from tandlr.notifications.push.apple import pool
+from tandlr.notifications.push.apple.fake import FakeGateway
+from tandlr.users.models import DeviceUser, User
+
+
+class DispatchTestCase(TestCase):
+    """
+    Tests for ```tandlr.notifications.dispatch```, unless a test registers
+    a device, the receiver has none, so nothing is pushed to the APNs.
+    """
+    def setUp(self):
+        cache.clear()
+
+        self.receiver = User.objects.create_user(
+            username='student',
+            email='student@example.com',
+            password='secret'
+        )
+
+    def create_notifications(self, count, target_action='accepted'):
+        Notification.objects.bulk_create([
+            Notification(
+                receiver=self.receiver,
+                target_action=target_action,
+                body='Notification {}'.format(index)
+            )
+            for index in range(count)
+        ])
+
+        return list(
+            Notification.objects.filter(
+                target_action=target_action
+            ).order_by(
+                'id'
+            ).values_list(
+                'id',
+                flat=True
+            )
+        )
+
+    def test_claim(self):
+        notification_ids = self.create_notifications(3)
+
+        self.assertEqual(dispatch.claim(2), notification_ids[:2])
+        self.assertEqual(dispatch.claim(2), notification_ids[2:])
+        self.assertEqual(dispatch.claim(2), [])
+
+    def test_claim_filters(self):
+        accepted_ids = self.create_notifications(2)
+        rejected_ids = self.create_notifications(2, 'rejected')
+
+        self.assertEqual(
+            dispatch.claim(target_action='rejected'),
+            rejected_ids
+        )
+        self.assertEqual(dispatch.claim(), accepted_ids)
+
+    def test_release(self):
+        notification_ids = self.create_notifications(3)
+        claimed_ids = dispatch.claim()
+
+        Notification.objects.filter(
+            id=claimed_ids[0]
+        ).update(
+            was_delivered=True
+        )
+
+        # The delivered notifications are left claimed.
+        self.assertEqual(dispatch.release(claimed_ids), 2)
+        self.assertEqual(dispatch.claim(), notification_ids[1:])
+
+    def test_coalesce(self):
+        now = timezone.now()
+
+        def create(count):
+            Notification.objects.bulk_create([
+                Notification(
+                    receiver=self.receiver,
+                    target=self.receiver,
+                    target_action='message',
+                    body='Message {}'.format(index)
+                )
+                for index in range(count)
+            ])
+
+            return list(
+                Notification.objects.filter(
+                    id__in=dispatch.claim()
+                ).order_by(
+                    'id'
+                )
+            )
+
+        # The first notification is pushed right away.
+        notifications = create(1)
+        pushes, held = dispatch.coalesce(notifications, now)
+
+        self.assertEqual(pushes, [(notifications[0], [notifications[0].id])])
+        self.assertEqual(held, {})
+
+        # The following ones are held until the window closes.
+        notifications = create(2)
+        pushes, held = dispatch.coalesce(
+            notifications,
+            now + timedelta(seconds=10)
+        )
+
+        self.assertEqual(pushes, [])
+        self.assertEqual(
+            held,
+            {
+                now + timedelta(seconds=30): [
+                    notification.id for notification in notifications
+                ]
+            }
+        )
+
+        # And then pushed together with the latest body.
+        pushes, held = dispatch.coalesce(
+            notifications,
+            now + timedelta(seconds=30)
+        )
+
+        self.assertEqual(
+            pushes,
+            [
+                (
+                    notifications[-1],
+                    [notification.id for notification in notifications]
+                )
+            ]
+        )
+
+    def record_web_notifications(self):
+        """
+        Returns the list of the ids of the notifications sent to the
+        browsers from now on.
+        """
+        sent_ids = []
+        send_web_notification = dispatch.send_web_notification
+
+        def record(notification):
+            sent_ids.append(notification.id)
+
+        dispatch.send_web_notification = record
+        self.addCleanup(
+            setattr,
+            dispatch,
+            'send_web_notification',
+            send_web_notification
+        )
+
+        return sent_ids
+
+    def connect_to(self, gateway):
+        """
+        Makes the pushes use a pool of connections to the given gateway.
+        """
+        pool._pool = pool.ConnectionPool(
+            lambda: pool.GatewayConnection(gateway.address, plaintext=True),
+            1,
+            300
+        )
+
+    def test_web_notifications_are_not_coalesced(self):
+        now = timezone.now()
+        sent_ids = self.record_web_notifications()
+
+        def create(count):
+            Notification.objects.bulk_create([
+                Notification(
+                    receiver=self.receiver,
+                    target=self.receiver,
+                    target_action='message',
+                    body='Message {}'.format(index)
+                )
+                for index in range(count)
+            ])
+
+            return dispatch.claim()
+
+        first_ids = create(1)
+        self.assertEqual(dispatch.dispatch(first_ids, now), 1)
+
+        # The held notifications are sent to the browsers right away.
+        held_ids = create(2)
+        self.assertEqual(
+            dispatch.dispatch(held_ids, now + timedelta(seconds=10)),
+            0
+        )
+        self.assertEqual(sent_ids, first_ids + held_ids)
+
+        # And only once, when their mobile push is sent.
+        self.assertEqual(
+            dispatch.dispatch(held_ids, now + timedelta(seconds=30)),
+            2
+        )
+        self.assertEqual(sent_ids, first_ids + held_ids)
+
+    def test_failed_push_is_retried_without_web_notifications(self):
+        sent_ids = self.record_web_notifications()
+        token = '{:064x}'.format(1)
+
+        DeviceUser.objects.create(
+            user=self.receiver,
+            device_user_token=token,
+            device_os='iOS'
+        )
+
+        gateway = FakeGateway()
+        gateway.stop()
+        self.connect_to(gateway)
+        self.addCleanup(setattr, pool, '_pool', None)
+
+        notification_ids = self.create_notifications(1)
+        dispatch.claim()
+
+        # The gateway is down, the notification is left pending.
+        with self.assertRaises(socket.error):
+            dispatch.dispatch(notification_ids)
+
+        self.assertEqual(sent_ids, notification_ids)
+        self.assertEqual(dispatch.claim(), notification_ids)
+
+        gateway = FakeGateway().start()
+        self.addCleanup(gateway.stop)
+        self.connect_to(gateway)
+
+        # The push is sent again, the web notification isn't.
+        self.assertEqual(dispatch.dispatch(notification_ids), 1)
+        self.assertEqual(gateway.wait(1), [token])
+        self.assertEqual(sent_ids, notification_ids)
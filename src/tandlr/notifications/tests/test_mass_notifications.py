@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from tandlr.notifications import tasks
+from tandlr.notifications.models import MassNotification
+from tandlr.notifications.push.apple import pool
+from tandlr.notifications.push.apple.fake import FakeGateway
+from tandlr.notifications.tasks import (
+    get_mass_notification_bounds,
+    get_mass_notification_devices
+)
+from tandlr.users.models import DeviceUser, User
+
+
+class MassNotificationTestCase(TestCase):
+    """
+    Tests for the chunks of the mass notifications.
+    """
+    def setUp(self):
+        for index in range(5):
+            user = User.objects.create_user(
+                username='student{}'.format(index),
+                email='student{}@example.com'.format(index),
+                password='secret'
+            )
+
+            DeviceUser.objects.create(
+                user=user,
+                device_user_token='token{}'.format(index),
+                device_os='iOS'
+            )
+
+        # The tokens shared by several users are notified once.
+        DeviceUser.objects.create(
+            user=user,
+            device_user_token='token0',
+            device_os='iOS'
+        )
+
+        # Only the iOS devices are notified.
+        DeviceUser.objects.create(
+            user=user,
+            device_user_token='token9',
+            device_os='Android'
+        )
+
+    def test_bounds(self):
+        devices = get_mass_notification_devices(
+            MassNotification(body='Hello')
+        )
+
+        self.assertEqual(
+            get_mass_notification_bounds(devices, 2),
+            [(None, 'token1'), ('token1', 'token3'), ('token3', None)]
+        )
+        self.assertEqual(
+            get_mass_notification_bounds(devices, 5),
+            [(None, 'token4')]
+        )
+        self.assertEqual(
+            get_mass_notification_bounds(devices.none(), 5),
+            []
+        )
+
+
+@override_settings(MASS_NOTIFICATION_CHUNK_SIZE=2)
+class MassNotificationDeliveryTestCase(TestCase):
+    """
+    Tests for the delivery of the mass notifications in chunks, the pushes
+    are written to the fake gateway.
+    """
+    def setUp(self):
+        self.tokens = []
+
+        for index in range(5):
+            user = User.objects.create_user(
+                username='student{}'.format(index),
+                email='student{}@example.com'.format(index),
+                password='secret'
+            )
+            token = '{:064x}'.format(index)
+
+            DeviceUser.objects.create(
+                user=user,
+                device_user_token=token,
+                device_os='iOS'
+            )
+            self.tokens.append(token)
+
+        self.gateway = FakeGateway().start()
+        self.connect_to(self.gateway.address)
+
+        self.notification = MassNotification.objects.create(
+            body='Hello',
+            delivery_date=timezone.now()
+        )
+
+    def tearDown(self):
+        pool.get_pool().close()
+        pool._pool = None
+        self.gateway.stop()
+
+    def connect_to(self, address):
+        """
+        Makes the pushes of the tasks use a pool of connections to the given
+        address.
+        """
+        pool._pool = pool.ConnectionPool(
+            lambda: pool.GatewayConnection(address, plaintext=True),
+            1,
+            300
+        )
+
+    def get_notification(self):
+        return MassNotification.objects.get(pk=self.notification.pk)
+
+    def send_chunks(self, **options):
+        bounds = get_mass_notification_bounds(
+            get_mass_notification_devices(self.notification),
+            settings.MASS_NOTIFICATION_CHUNK_SIZE
+        )
+
+        for after, last in bounds:
+            tasks.send_mass_push_notification_chunk.apply(
+                (self.notification.pk, after, last),
+                **options
+            )
+
+    def test_chunks_and_progress(self):
+        tasks.send_mass_push_notification(self.notification.pk)
+
+        notification = self.get_notification()
+        self.assertEqual(notification.state, MassNotification.STATE.SENDING)
+        self.assertEqual(notification.total_devices, 5)
+        self.assertEqual(notification.total_chunks, 3)
+        self.assertEqual(notification.progress, 0)
+
+        # A notification delivered twice by the broker is sent once.
+        MassNotification.objects.filter(
+            pk=self.notification.pk
+        ).update(
+            total_chunks=0
+        )
+        tasks.send_mass_push_notification(self.notification.pk)
+        self.assertEqual(self.get_notification().total_chunks, 0)
+
+        MassNotification.objects.filter(
+            pk=self.notification.pk
+        ).update(
+            total_chunks=3
+        )
+
+        self.send_chunks()
+
+        notification = self.get_notification()
+        self.assertEqual(notification.state, MassNotification.STATE.DELIVERED)
+        self.assertEqual(notification.processed_chunks, 3)
+        self.assertEqual(notification.sent_devices, 5)
+        self.assertEqual(notification.failed_devices, 0)
+        self.assertEqual(notification.progress, 100)
+
+        self.assertEqual(sorted(self.gateway.wait(5)), self.tokens)
+
+    def test_failed_chunks_are_counted(self):
+        tasks.send_mass_push_notification(self.notification.pk)
+
+        # The gateway is down and the chunks ran out of retries.
+        self.gateway.stop()
+        self.connect_to(self.gateway.address)
+        self.send_chunks(retries=settings.MASS_NOTIFICATION_RETRIES)
+
+        notification = self.get_notification()
+        self.assertEqual(notification.state, MassNotification.STATE.DELIVERED)
+        self.assertEqual(notification.processed_chunks, 3)
+        self.assertEqual(notification.sent_devices, 0)
+        self.assertEqual(notification.failed_devices, 5)
+        self.assertEqual(notification.progress, 100)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+
+from tandlr.notifications.push.apple.fake import FakeGateway
+from tandlr.notifications.push.apple.pool import (
+    ConnectionPool,
+    GatewayConnection
+)
+from tandlr.notifications.push.apple.tasks import get_frame
+
+
+class ConnectionPoolTestCase(SimpleTestCase):
+    """
+    Tests for ```tandlr.notifications.push.apple.pool``` against the fake
+    gateway.
+    """
+    def setUp(self):
+        self.gateway = FakeGateway().start()
+        self.pool = ConnectionPool(
+            lambda: GatewayConnection(self.gateway.address, plaintext=True),
+            1,
+            300
+        )
+
+    def tearDown(self):
+        self.pool.close()
+        self.gateway.stop()
+
+    def push(self, index):
+        token = '{:064x}'.format(index)
+
+        self.pool.write(get_frame([{'token': token, 'alert': 'Hello'}]))
+
+        return token
+
+    def test_reuses_connection(self):
+        tokens = [self.push(index) for index in range(3)]
+
+        self.assertEqual(self.gateway.wait(3), tokens)
+        self.assertEqual(self.gateway.connections, 1)
+
+    def test_reconnects(self):
+        tokens = [self.push(0)]
+        self.gateway.wait(1)
+
+        # The gateway closes the connection after an error response.
+        self.gateway.disconnect()
+        tokens.append(self.push(1))
+
+        self.assertEqual(self.gateway.wait(2), tokens)
+        self.assertEqual(self.gateway.connections, 2)
+
+    def test_rotates_idle_connection(self):
+        tokens = [self.push(0)]
+        self.pool.connections[0].used_at -= 301
+        tokens.append(self.push(1))
+
+        self.assertEqual(self.gateway.wait(2), tokens)
+        self.assertEqual(self.gateway.connections, 2)
+        self.assertEqual(len(self.pool.connections), 1)
+
+    def test_requires_certificate(self):
+        # Only the connections to the fake gateway are left unencrypted.
+        with self.assertRaises(ImproperlyConfigured):
+            GatewayConnection(self.gateway.address, cert_file='')
+
+        self.assertEqual(self.gateway.connections, 0)
@@ -1,10 +1,8 @@
 # -*- coding: utf-8 -*-
-from django.utils import timezone
-
 from rest_framework import decorators, viewsets
 from rest_framework.response import Response
 
-from . import serializers
+from . import counters, serializers
 from .models import Notification
 
 
@@ -37,14 +35,38 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
         produces:
             - application/json
         """
-        notifications = self.get_queryset()
-        count = notifications.filter(is_read=False).update(
-            is_read=True,
-            last_modified=timezone.now()
-        )
+        count = counters.mark_as_read(request.user.id, self.get_queryset())
 
         return Response({'updated_items': count})
 
+    @decorators.list_route(methods=['get'])
+    def unread_count(self, request):
+        """
+        Returns the number of unread notifications.
+        ---
+
+        omit_serializer: true
+
+        type:
+            unread_count:
+                type: int
+                required: true
+
+        responseMessages:
+            - code: 200
+              message: OK
+            - code: 500
+              message: INTERNAL SERVER ERROR
+
+        consumes:
+            - application/json
+        produces:
+            - application/json
+        """
+        count = counters.get_counts([request.user.id])[request.user.id]
+
+        return Response({'unread_count': count})
+
     @decorators.detail_route(methods=['post'])
     def mark_as_read(self, request, pk=None):
         """
@@ -67,8 +89,11 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
             - application/json
         """
         notification = self.get_object()
-        notification.is_read = True
-        notification.save()
+        counters.mark_as_read(
+            request.user.id,
+            Notification.objects.filter(pk=notification.pk)
+        )
+        notification.refresh_from_db()
 
         serializer = self.get_serializer(notification)
         return Response(serializer.data)
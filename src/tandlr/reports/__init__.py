@@ -3,6 +3,8 @@ from __future__ import absolute_import
 
 from datetime import timedelta
 
+from celery.schedules import crontab
+
 from django.conf import settings
 
 unpaid_session_sales = {
@@ -13,10 +15,24 @@ unpaid_session_sales = {
     }
 }
 
+unmet_searches_digest = {
+    # Executes every UNMET_SEARCHES_DIGEST_HOURS hours, once the last hour
+    # of the period is over
+    'unmet_searches_digest': {
+        'task': 'tandlr.reports.tasks.unmet_searches_digest',
+        'schedule': crontab(
+            minute=5,
+            hour='*/{}'.format(settings.UNMET_SEARCHES_DIGEST_HOURS)
+        ),
+    }
+}
+
 if not settings.CELERYBEAT_SCHEDULE and settings.PRODUCTION:
 
     settings.CELERYBEAT_SCHEDULE = unpaid_session_sales
+    settings.CELERYBEAT_SCHEDULE.update(unmet_searches_digest)
 
 elif settings.CELERYBEAT_SCHEDULE and settings.PRODUCTION:
 
     settings.CELERYBEAT_SCHEDULE.update(unpaid_session_sales)
+    settings.CELERYBEAT_SCHEDULE.update(unmet_searches_digest)
@@ -14,7 +14,8 @@ from tandlr.reports.models import (
     SessionRegistered,
     SessionSale,
     TopStudentUser,
-    TopTeacherUser
+    TopTeacherUser,
+    UnmetSearch
 )
 from tandlr.scheduled_classes.models import ClassBill
 from tandlr.users.models import UserSummary
@@ -416,3 +417,32 @@ class ReportSessionSales(admin.ModelAdmin):
             created_at__gte=(timezone.now() - timedelta(days=30)),
             was_paid=True
         )
+
+
+@admin.register(UnmetSearch)
+class UnmetSearchAdmin(admin.ModelAdmin):
+
+    list_select_related = [
+        'university',
+        'subject',
+        'student'
+    ]
+
+    list_display = [
+        'hour',
+        'university',
+        'subject',
+        'student',
+        'scheduling_datetime',
+        'duration'
+    ]
+
+    list_filter = [
+        'university',
+        'subject'
+    ]
+
+    actions = [export_as_csv]
+
+    def get_readonly_fields(self, request, obj=None):
+        return [f.name for f in self.model._meta.fields]
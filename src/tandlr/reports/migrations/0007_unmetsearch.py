@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalogues', '0001_initial'),
+        ('scheduled_classes', '0015_auto_20161018_1200'),
+        ('reports', '0006_auto_20160818_1947'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnmetSearch',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('hour', models.DateTimeField(help_text='Hour (UTC) on which the search was made.', db_index=True)),
+                ('scheduling_datetime', models.DateTimeField(help_text='Local datetime requested by the student.')),
+                ('duration', models.PositiveIntegerField(help_text='Requested duration in minutes.')),
+                ('student', models.ForeignKey(related_name='unmet_searches', to=settings.AUTH_USER_MODEL)),
+                ('subject', models.ForeignKey(related_name='unmet_searches', to='scheduled_classes.Subject')),
+                ('university', models.ForeignKey(related_name='unmet_searches', to='catalogues.University')),
+            ],
+            options={
+                'db_table': 'unmet_search',
+                'verbose_name': 'Search without results',
+                'verbose_name_plural': 'Searches without results',
+            },
+        ),
+    ]
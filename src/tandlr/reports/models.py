@@ -1,10 +1,12 @@
 # -*- coding: utf-8 -*-
 from django.db import models
 
+from tandlr.catalogues.models import University
 from tandlr.notifications.models import Notification
 from tandlr.scheduled_classes.models import (
     Class,
-    ClassBill
+    ClassBill,
+    Subject
 )
 from tandlr.users.models import User
 
@@ -162,3 +164,37 @@ class SessionSale(BaseConfigurationReport, ClassBill):
         'teacher',
         'subtotal'
     ]
+
+
+class UnmetSearch(models.Model):
+    """
+    Append only log of the scheduled session searches without results, it
+    is summarized by the ```unmet_searches_digest``` task.
+    """
+    hour = models.DateTimeField(
+        db_index=True,
+        help_text='Hour (UTC) on which the search was made.'
+    )
+    university = models.ForeignKey(
+        University,
+        related_name='unmet_searches'
+    )
+    subject = models.ForeignKey(
+        Subject,
+        related_name='unmet_searches'
+    )
+    student = models.ForeignKey(
+        User,
+        related_name='unmet_searches'
+    )
+    scheduling_datetime = models.DateTimeField(
+        help_text='Local datetime requested by the student.'
+    )
+    duration = models.PositiveIntegerField(
+        help_text='Requested duration in minutes.'
+    )
+
+    class Meta:
+        db_table = 'unmet_search'
+        verbose_name = 'Search without results'
+        verbose_name_plural = 'Searches without results'
@@ -8,6 +8,7 @@ from datetime import timedelta
 
 from django.conf import settings
 from django.core.mail import EmailMultiAlternatives
+from django.db.models import Count
 from django.template.loader import render_to_string
 from django.utils import timezone
 
@@ -16,6 +17,7 @@ from pyexcel.cookbook import merge_all_to_a_book
 import unicodecsv
 
 from tandlr.celery import app
+from tandlr.reports.models import UnmetSearch
 from tandlr.users.models import Teacher
 
 
@@ -218,3 +220,63 @@ def unpaid_session_sales():
     msg_report.attach_file(first_report_filename_xlsx)
     msg_report.attach_file(second_report_filename_xlsx)
     msg_report.send()
+
+
+@app.task
+def unmet_searches_digest():
+    """
+    Sends one email to the admins with the searches without results of the
+    last UNMET_SEARCHES_DIGEST_HOURS hours, grouped by university, subject
+    and hour.
+    """
+    end = timezone.now().replace(minute=0, second=0, microsecond=0)
+    start = end - timedelta(hours=settings.UNMET_SEARCHES_DIGEST_HOURS)
+
+    rows = list(
+        UnmetSearch.objects.filter(
+            hour__gte=start,
+            hour__lt=end
+        ).values(
+            'hour',
+            'university__name',
+            'subject__name'
+        ).annotate(
+            searches=Count('id'),
+            students=Count('student', distinct=True)
+        ).order_by(
+            'hour',
+            'university__name',
+            'subject__name'
+        )
+    )
+
+    if not rows:
+        return
+
+    email_context = {
+        'start': start,
+        'end': end,
+        'rows': rows,
+        'total': sum(row['searches'] for row in rows)
+    }
+
+    template_names = (
+        'email/reports/unmet_searches_subject.txt',
+        'email/reports/unmet_searches.txt',
+        'email/reports/unmet_searches.html'
+    )
+
+    subject, body, html = map(
+        lambda t: render_to_string(t, email_context),
+        template_names
+    )
+
+    message = EmailMultiAlternatives(
+        subject=''.join(subject.splitlines()),
+        body=body,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=settings.REPORT_EMAILS,
+        bcc=settings.BCC_REPORT_EMAILS
+    )
+    message.attach_alternative(html, 'text/html')
+    message.send()
@@ -3,6 +3,8 @@ from __future__ import absolute_import
 
 from datetime import timedelta
 
+from celery.schedules import crontab
+
 from django.conf import settings
 
 
@@ -13,11 +15,42 @@ if not settings.CELERYBEAT_SCHEDULE:
 
     settings.CELERYBEAT_SCHEDULE = {
         #
-        # Excecutes every 4 hours the tasks to check the sessions
+        # Applies the time driven transitions of the sessions missed by the
+        # session timers every hour
+        #
+        'sweep_sessions': {
+            'task': 'tandlr.scheduled_classes.tasks.sweep_sessions',
+            'schedule': timedelta(hours=1)
+        },
+        #
+        # Fires every minute the session timers that are already due
+        #
+        'fire_due_session_timers': {
+            'task': 'tandlr.scheduled_classes.tasks.fire_due_session_timers',
+            'schedule': timedelta(minutes=1)
+        },
+        #
+        # Sends every minute the reminders of the sessions that start soon
+        #
+        'send_session_reminders': {
+            'task': 'tandlr.scheduled_classes.tasks.send_session_reminders',
+            'schedule': timedelta(minutes=1)
+        },
+        #
+        # Retries every minute the refunds of the cancelled sessions that
+        # are due
+        #
+        'process_refunds': {
+            'task': 'tandlr.stripe.tasks.process_refunds',
+            'schedule': timedelta(minutes=1)
+        },
+        #
+        # Rolls forward the availability calendar of the teachers every night
         #
-        'check_sessions': {
-            'task': 'tandlr.scheduled_classes.tasks.check_sessions',
-            'schedule': timedelta(hours=4)
+        'roll_forward_teacher_availability': {
+            'task': 'tandlr.scheduled_classes.tasks'
+                    '.roll_forward_teacher_availability',
+            'schedule': crontab(minute=30, hour=0)
         }
 
     }
@@ -27,11 +60,46 @@ elif settings.CELERYBEAT_SCHEDULE:
     settings.CELERYBEAT_SCHEDULE.update(
         {
             #
-            # Excecutes every 4 hours the tasks to check the sessions
+            # Applies the time driven transitions of the sessions missed by
+            # the session timers every hour
+            #
+            'sweep_sessions': {
+                'task': 'tandlr.scheduled_classes.tasks.sweep_sessions',
+                'schedule': timedelta(hours=1)
+            },
+            #
+            # Fires every minute the session timers that are already due
+            #
+            'fire_due_session_timers': {
+                'task': 'tandlr.scheduled_classes.tasks'
+                        '.fire_due_session_timers',
+                'schedule': timedelta(minutes=1)
+            },
+            #
+            # Sends every minute the reminders of the sessions that start
+            # soon
+            #
+            'send_session_reminders': {
+                'task': 'tandlr.scheduled_classes.tasks'
+                        '.send_session_reminders',
+                'schedule': timedelta(minutes=1)
+            },
+            #
+            # Retries every minute the refunds of the cancelled sessions
+            # that are due
+            #
+            'process_refunds': {
+                'task': 'tandlr.stripe.tasks.process_refunds',
+                'schedule': timedelta(minutes=1)
+            },
+            #
+            # Rolls forward the availability calendar of the teachers every
+            # night
             #
-            'check_sessions': {
-                'task': 'tandlr.scheduled_classes.tasks.check_sessions',
-                'schedule': timedelta(hours=4)
+            'roll_forward_teacher_availability': {
+                'task': 'tandlr.scheduled_classes.tasks'
+                        '.roll_forward_teacher_availability',
+                'schedule': crontab(minute=30, hour=0)
             }
         }
     )
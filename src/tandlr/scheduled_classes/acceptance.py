@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""
+Acceptance of the sessions.
+
+When the teacher accepts a session the request only commits the new status
+(accepted, with the ```pending_payment``` acceptance status) and enqueues
+the acceptance pipeline (see ```get_pipeline``` in
+```tandlr.scheduled_classes.tasks```). Every stage of the pipeline is a task
+that moves the acceptance status one step:
+
+    - charge: pending_payment -> paid (or payment_failed, and the session is
+      cancelled).
+    - bill: paid -> billed.
+    - chat: billed -> chat_opened.
+    - notify: chat_opened -> confirmed.
+
+A stage locks the session and only runs when the session is in its own
+step, and its changes and the new step are committed together, so a stage
+that is retried or delivered twice does nothing the second time. The charge
+is the exception: Stripe is called before locking the session, with an
+idempotency key, so Stripe never charges a session twice either.
+
+Every step is published to the participants in the ```notifications```
+channel groups, so the clients can follow the acceptance in real time.
+"""
+import json
+from datetime import timedelta
+from decimal import Decimal
+
+from channels import Group
+
+from django.db import transaction
+from django.template.loader import render_to_string
+
+from tandlr.balances.models import Balance
+from tandlr.chat.models import Chat
+from tandlr.notifications.models import Notification
+from tandlr.scheduled_classes.lifecycle import ACCEPTED, CANCELLED
+from tandlr.scheduled_classes.models import Class, ClassBill
+from tandlr.scheduled_classes.utils import calculate_price_per_extrension_class
+from tandlr.stripe.models import StripeCharge
+from tandlr.stripe.utils import generate_charge_description, make_stripe_charge
+
+
+#
+# Minimum amount that Stripe can charge.
+#
+MINIMUM_CHARGE = Decimal('0.50')
+
+
+def get_amounts(session):
+    """
+    Returns the subtotal of the given session and the total charged to the
+    student once the discount of its promotion code is applied.
+    """
+    subtotal = calculate_price_per_extrension_class(
+        session.subject.price_per_hour,
+        session.class_time
+    )
+
+    if session.promo_code is None:
+        return subtotal, subtotal
+
+    if int(session.promo_code.discount) >= 100:
+        #
+        # The sessions with a discount of 100 percent aren't charged.
+        #
+        return subtotal, Decimal('0')
+
+    discounts = subtotal * (session.promo_code.discount / Decimal('100.0'))
+
+    return subtotal, max(subtotal - discounts, MINIMUM_CHARGE)
+
+
+def accept(session):
+    """
+    Commits the acceptance of the given session, the pipeline must be
+    enqueued once the transaction is committed.
+    """
+    session.class_status_id = ACCEPTED
+    session.acceptance_status = Class.PENDING_PAYMENT
+    session.save()
+
+    publish(session)
+
+
+def lock(session_id, acceptance_status):
+    """
+    Returns the given session locked if it's accepted and in the given step
+    of its acceptance, otherwise None.
+    """
+    return Class.objects.select_for_update().filter(
+        pk=session_id,
+        class_status_id=ACCEPTED,
+        acceptance_status=acceptance_status
+    ).first()
+
+
+def charge(session_id, raise_transient=True):
+    """
+    Charges the given session to the student. If the charge is declined the
+    session is cancelled.
+
+    The connection and rate limit errors of Stripe are raised, so the stage
+    can be retried, unless raise_transient is False (the last retry).
+
+    Stripe is called outside of the transaction, so the session isn't locked
+    while waiting for it. The result is committed only if the session is
+    still waiting for the payment, and a session is never charged twice:
+    the charge of a previous try is reused, and a concurrent try gets the
+    same charge from Stripe by its idempotency key.
+    """
+    session = Class.objects.filter(
+        pk=session_id,
+        class_status_id=ACCEPTED,
+        acceptance_status=Class.PENDING_PAYMENT
+    ).first()
+
+    if session is None:
+        return
+
+    failure = None
+    _, total = get_amounts(session)
+
+    charged = StripeCharge.objects.filter(
+        related_class=session,
+        paid=True
+    ).exists()
+
+    if total > 0 and not charged:
+        response = make_stripe_charge(
+            session.id,
+            int(total * 100),
+            'usd',
+            generate_charge_description(session, total),
+            session.student.customer_id,
+            None,
+            idempotency_key='session-{}-charge'.format(session.id),
+            raise_transient=raise_transient
+        )
+
+        if not response['success']:
+            failure = response['response']
+
+    with transaction.atomic():
+        session = lock(session_id, Class.PENDING_PAYMENT)
+
+        if session is None:
+            return
+
+        if failure is None:
+            session.acceptance_status = Class.PAID
+            session.save(update_fields=['acceptance_status'])
+        else:
+            session.class_status_id = CANCELLED
+            session.acceptance_status = Class.PAYMENT_FAILED
+            session.save()
+
+    if failure is not None:
+        notify_payment_error(session)
+
+    publish(session)
+
+
+def bill(session_id):
+    """
+    Creates the bill of the given paid session in the balance of the
+    teacher.
+    """
+    with transaction.atomic():
+        session = lock(session_id, Class.PAID)
+
+        if session is None:
+            return
+
+        subtotal, _ = get_amounts(session)
+
+        stripe_charge = StripeCharge.objects.filter(
+            related_class=session,
+            paid=True
+        ).order_by(
+            '-id'
+        ).first()
+
+        bill = ClassBill.objects.create(
+            promo_code=session.promo_code,
+            hourly_price=session.subject.price_per_hour,
+            number_of_hours=session.class_time,
+            subtotal=subtotal,
+            session=session,
+            charge_id=stripe_charge.charge_id if stripe_charge else None
+        )
+
+        balance, _ = Balance.objects.get_or_create(
+            teacher=session.teacher
+        )
+        balance.bills.add(bill)
+        balance.save()
+
+        session.acceptance_status = Class.BILLED
+        session.save(update_fields=['acceptance_status'])
+
+    publish(session)
+
+
+def open_chat(session_id):
+    """
+    Opens the chat of the given billed session.
+    """
+    with transaction.atomic():
+        session = lock(session_id, Class.BILLED)
+
+        if session is None:
+            return
+
+        Chat.objects.get_or_create(
+            teacher=session.teacher,
+            student=session.student,
+            session=session
+        )
+
+        session.acceptance_status = Class.CHAT_OPENED
+        session.save(update_fields=['acceptance_status'])
+
+    publish(session)
+
+
+def notify(session_id):
+    """
+    Confirms the acceptance of the given session to the student.
+    """
+    with transaction.atomic():
+        session = lock(session_id, Class.CHAT_OPENED)
+
+        if session is None:
+            return
+
+        session.acceptance_status = Class.CONFIRMED
+        session.save(update_fields=['acceptance_status'])
+
+    #
+    # The notification and the email are sent once the step is committed,
+    # so they are never sent twice.
+    #
+    context = get_context(session)
+
+    subject = render_to_string(
+        'email/booking/booking_confirmed_student_subject.txt',
+        context
+    ).strip()
+    body = render_to_string(
+        'email/booking/booking_confirmed_student.txt',
+        context
+    )
+    html = render_to_string(
+        'email/booking/booking_confirmed_student.html',
+        context
+    )
+
+    Notification.objects.create(
+        receiver=session.student,
+        sender=session.teacher,
+        target_action='accepted',
+        target=session,
+        body=subject
+    )
+
+    session.student.email_user(subject, body, html=html)
+
+    publish(session)
+
+
+def notify_payment_error(session):
+    """
+    Notifies the student, and the teacher of the meeting now sessions, that
+    the charge of the given session failed.
+    """
+    context = get_context(session)
+    action = 'payment error'
+
+    subject = render_to_string(
+        'email/booking/booking_error_payment_stripe_subject.txt',
+        context
+    ).strip()
+
+    receivers = [(session.student, session.teacher, 'student')]
+
+    if session.meeting_now:
+        receivers.append((session.teacher, session.student, 'teacher'))
+
+    for receiver, sender, role in receivers:
+        body = render_to_string(
+            'email/booking/booking_error_payment_stripe_{}.txt'.format(role),
+            context
+        )
+        html = render_to_string(
+            'email/booking/booking_error_payment_stripe_{}.html'.format(role),
+            context
+        )
+
+        receiver.email_user(subject, body, html=html)
+
+        Notification.objects.create(
+            receiver=receiver,
+            sender=sender,
+            target_action=action,
+            target=session,
+            body=subject
+        )
+
+
+def publish(session):
+    """
+    Sends the acceptance status of the given session to the channels of its
+    participants.
+    """
+    message = json.dumps({
+        'target_id': str(session.id),
+        'target_type': Class._meta.model_name,
+        'target_action': session.acceptance_status
+    })
+
+    for user_id in (session.teacher_id, session.student_id):
+        Group('notifications' + str(user_id)).send({'text': message})
+
+
+def get_context(session):
+    return {
+        'booking': session,
+        'fixed_date_time': (
+            session.class_start_date +
+            timedelta(hours=session.time_zone_conf)
+        )
+    }
@@ -3,26 +3,23 @@
 viewsets to manage session in tandlr.
 """
 from datetime import timedelta
-from decimal import Decimal
 
-from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.shortcuts import get_object_or_404
 from django.template.loader import render_to_string
 from django.utils import timezone
 
 from rest_framework import status
+from rest_framework.decorators import list_route
 from rest_framework.response import Response
 
-import stripe
-
-
 from tandlr.api.v2.routers import router
 from tandlr.balances.models import Balance
-from tandlr.chat.models import Chat
 from tandlr.core.api import mixins, viewsets
 from tandlr.core.api.viewsets.nested import NestedViewset
 from tandlr.notifications.models import Notification
-from tandlr.scheduled_classes import serializers
+from tandlr.scheduled_classes import acceptance, serializers
+from tandlr.scheduled_classes.conflicts import get_integrity_conflict
 from tandlr.scheduled_classes.models import (
     Class,
     ClassBill,
@@ -35,14 +32,44 @@ from tandlr.scheduled_classes.permissions import (
     LessonPermission,
     SessionPermission
 )
+from tandlr.scheduled_classes.tasks import get_acceptance_pipeline
 
-from tandlr.scheduled_classes.utils import calculate_price_per_extrension_class
-from tandlr.stripe.models import StripeCard
+from tandlr.scheduled_classes.utils import (
+    calculate_price_per_extrension_class,
+    get_month_range
+)
+from tandlr.stripe import refunds
 from tandlr.stripe.serializers import StripeChargeSerializer
+from tandlr.stripe.tasks import process_refunds
 from tandlr.stripe.utils import (
     generate_charge_description,
     make_stripe_charge
 )
+from tandlr.stripe.validity import has_valid_card
+
+
+class SessionConflictMixin(object):
+    """
+    Answers the updates of the sessions that overlap another busy session
+    of the teacher or the student with a 400, instead of the
+    ```IntegrityError``` raised by the exclusion constraints.
+    """
+    def partial_update(self, request, *args, **kwargs):
+        try:
+            return super(SessionConflictMixin, self).partial_update(
+                request, *args, **kwargs)
+        except IntegrityError as error:
+            conflict = get_integrity_conflict(error)
+
+            if conflict is None:
+                raise
+
+            return Response(
+                {
+                    "non_field_errors": [conflict]
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
 
 class SlotViewSet(
@@ -187,12 +214,14 @@ class SlotViewSet(
 class LessonViewSet(
         mixins.CreateModelMixin,
         mixins.RetrieveModelMixin,
+        SessionConflictMixin,
         mixins.PartialUpdateModelMixin,
         mixins.ListModelMixin,
         viewsets.GenericViewSet):
 
     serializer_class = serializers.LessonV2Serializer
     create_serializer_class = serializers.LessonV2Serializer
+    recurring_serializer_class = serializers.RecurringLessonV2Serializer
     update_serializer_class = serializers.LessonV2Serializer
     list_serializer_class = serializers.LessonListV2Serializer
     retrieve_serializer_class = serializers.LessonListV2Serializer
@@ -220,37 +249,12 @@ class LessonViewSet(
         produces:
             - application/json
         """
-        stripe.api_key = settings.STRIPE_PRIVATE_KEY
-
         #
         # Don't allow the user create a lesson if the user doesn't have an
-        # associated card
-
-        local_cards = StripeCard.objects.filter(
-            customer__user=request.user
-        )
-
-        associated_card = None
-        for card in local_cards:
-            try:
-                if card.card_id and card.customer.customer_id:
-                    customer = stripe.Customer.retrieve(
-                        card.customer.customer_id
-                    )
-                    associated_card = customer.sources.retrieve(card.card_id)
-                    if associated_card:
-                        #
-                        # If one card is found, leave the loop
-                        #
-                        break
-            except stripe.InvalidRequestError:
-                #
-                # A user can have multiple cards associated. If one of them
-                # doesn't work try another
-                #
-                continue
-
-        if not associated_card:
+        # associated card. The validity of the cards is cached, Stripe is
+        # only called when the cache is stale.
+        #
+        if not has_valid_card(request.user):
             #
             # If not valid associated card was found return an error
             #
@@ -272,7 +276,84 @@ class LessonViewSet(
         if class_status != 2 and class_status != 3:
             request.data['class_status'] = 2
 
-        return super(LessonViewSet, self).create(request, *args, **kwargs)
+        try:
+            return super(LessonViewSet, self).create(request, *args, **kwargs)
+        except IntegrityError as error:
+            #
+            # A concurrent request booked the teacher or the student at the
+            # same time after the validation of this one.
+            #
+            conflict = get_integrity_conflict(error)
+
+            if conflict is None:
+                raise
+
+            return Response(
+                {
+                    "non_field_errors": [conflict]
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+    @list_route(methods=['post'])
+    def recurring(self, request, *args, **kwargs):
+        """
+        Allows the student book all the occurrences of a recurrence rule with
+        a single request. The sessions are created as scheduled.
+        ---
+        request_serializer: serializers.RecurringLessonV2Serializer
+        response_serializer: serializers.LessonListV2Serializer
+
+        responseMessages:
+            - code: 201
+              message: CREATED
+            - code: 400
+              message: BAD REQUEST
+            - code: 500
+              message: INTERNAL SERVER ERROR
+
+        consumes:
+            - application/json
+        produces:
+            - application/json
+        """
+        #
+        # The card is verified once for all the sessions.
+        #
+        if not has_valid_card(request.user):
+            return Response(
+                {
+                    "detail": "The student doesn't have a valid card"
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = self.get_serializer(data=request.data, action='recurring')
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            sessions = serializer.save()
+        except IntegrityError as error:
+            #
+            # A concurrent request booked one of the occurrences after the
+            # validation of this one.
+            #
+            conflict = get_integrity_conflict(error)
+
+            if conflict is None:
+                raise
+
+            return Response(
+                {
+                    "non_field_errors": [conflict]
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(
+            serializers.LessonListV2Serializer(sessions, many=True).data,
+            status=status.HTTP_201_CREATED
+        )
 
     def partial_update(self, request, *args, **kwargs):
         """
@@ -297,12 +378,6 @@ class LessonViewSet(
         produces:
             - application/json
         """
-        #
-        # If the lesson starts in more than 24 hours make the a complete refund
-        # of the charge made previously
-        #
-        stripe.api_key = settings.STRIPE_PRIVATE_KEY
-
         session = get_object_or_404(Class, pk=kwargs['pk'])
 
         serializer = self.get_serializer(
@@ -318,13 +393,6 @@ class LessonViewSet(
                 now = timezone.localtime(timezone.now())
 
                 if class_status == 7 and session.class_status_id == 3:
-                    #
-                    # There are two rules for refunding. If the time between
-                    # the user cancelling the class and the start of the class
-                    # is greater than 24 hours, then refund all the money,
-                    # otherwise don't refund anything
-                    #
-
                     #
                     # Eliminate the promotion code so the user can use it in
                     # other class
@@ -332,39 +400,14 @@ class LessonViewSet(
                     session.promo_code = None
                     session.save()
 
-                    for bill in session.bills.all():
-                        bill.promo_code = None
-                        bill.save()
-
-                    if (
-                        (not session.meeting_now) and
-                        session.class_start_date - now > timedelta(days=1)
-                    ):
-                        for bill in session.bills.all():
-                            if bill.charge_id:
-                                stripe.Refund.create(
-                                    charge=bill.charge_id
-                                )
+                    session.bills.update(promo_code=None)
+
                     #
-                    # In the second rule if the class is of type meeting_now
-                    # and the user is cancelling the class before it starts,
-                    # only charge 5 dollars and refund the rest.
+                    # The refunds are only recorded here, they are made in
+                    # Stripe by the refund processor.
                     #
-                    elif (
-                        session.meeting_now and
-                        now < session.class_start_date
-                    ):
-                        for bill in session.bills.all():
-                            #
-                            # When a session is created with a 100% promo code,
-                            # bills are created without a charge_id, so there's
-                            # no need to refund that bill (charge).
-                            #
-                            if bill.charge_id:
-                                stripe.Refund.create(
-                                    charge=bill.charge_id,
-                                    amount=int((bill.subtotal * 100) - 500)
-                                )
+                    if refunds.record_cancellation(session, now):
+                        process_refunds.delay()
             else:
                 return Response(
                     {
@@ -542,9 +585,10 @@ class LessonViewSet(
         )
 
         if month:
+            start_date, end_date = get_month_range(year, month)
             lessons = lessons.filter(
-                class_start_date__month=month,
-                class_start_date__year=year
+                class_start_date__gte=start_date,
+                class_start_date__lt=end_date
             )
 
         if status:
@@ -553,11 +597,16 @@ class LessonViewSet(
                 class_status__in=status_ids
             )
 
-        return lessons.order_by('class_status__order')
+        #
+        # The status order is copied in the session, so the list is read in
+        # order from the (student, status_order, class_start_date) index.
+        #
+        return lessons.order_by('status_order', 'class_start_date')
 
 
 class SessionViewSet(
         mixins.RetrieveModelMixin,
+        SessionConflictMixin,
         mixins.PartialUpdateModelMixin,
         mixins.ListModelMixin,
         viewsets.GenericViewSet):
@@ -634,267 +683,36 @@ class SessionViewSet(
                         )
 
                     #
-                    # Price per hour of the subject
-                    #
-                    subtotal = calculate_price_per_extrension_class(
-                        session.subject.price_per_hour,
-                        session.class_time
-                    )
-
-                    discounts = 0
-                    total = subtotal
-
-                    if (
-                        session.promo_code is not None and
-                        int(session.promo_code.discount) < 100
-                    ):
-                        discounts = (
-                            subtotal *
-                            (session.promo_code.discount / Decimal('100.0'))
-                        )
-                        #
-                        # If the amount is bigger that 50 cents charge the
-                        # discount, otherwise charge 50 cents
-                        #
-                        if subtotal - discounts < 0.50:
-                            total = 50.0 / 100.0
-                        else:
-                            total = subtotal - discounts
-                    elif (
-                        session.promo_code is not None and
-                        int(session.promo_code.discount) >= 100
-                    ):
-                        #
-                        # If the discount of the promocode if 100 percent
-                        # charge only 50 cents to the user
-                        #
-                        total = 0.0
-
-                    balance, _ = Balance.objects.get_or_create(
-                        teacher=session.teacher
-                    )
-
-                    stripe_charge_response = None
-                    if total > 0:
-                        #
-                        # Description used in the stripe charge.
-                        #
-                        charge_description = generate_charge_description(
-                            session,
-                            total
-                        )
-
-                        #
-                        # Trying to make the charge to the student.
-                        #
-                        stripe_charge_response = make_stripe_charge(
-                            session.id,  # class_id
-                            int(total * 100),  # total
-                            'usd',  # currency
-                            charge_description,  # description
-                            session.student.customer_id,  # customer
-                            None  # card_token
-                        )
-
-                    Chat.objects.get_or_create(
-                        teacher=session.teacher,
-                        student=session.student,
-                        session=session
-                    )
-
-                    #
-                    # If the creation of the charge was successful.
-                    #
-                    if (
-                        stripe_charge_response and
-                        stripe_charge_response['success']
-                    ):
-
-                        bill = ClassBill.objects.create(
-                            promo_code=session.promo_code,
-                            hourly_price=session.subject.price_per_hour,
-                            number_of_hours=session.class_time,
-                            subtotal=subtotal,
-                            session=session,
-                            charge_id=(
-                                stripe_charge_response['response'].charge_id
-                            )
-                        )
-
-                        balance.bills.add(bill)
-                        balance.save()
-
-                        created_charge = StripeChargeSerializer(
-                            stripe_charge_response['response']
-                        )
-
-                        #
-                        # If a charge was created, then will be returned.
-                        #
-                        serializer.save()
-
-                        return Response(
-                            created_charge.data,
-                            status=status.HTTP_200_OK
-                        )
-                    #
-                    # If the coupon used has a 100 percent discount, then
-                    # the charge never goes through Stripe. In that case return
+                    # Only the acceptance is committed here, the charge, the
+                    # bill, the chat and the notifications are made by the
+                    # acceptance pipeline. The clients follow its progress
+                    # with the acceptance status of the session.
                     #
-                    #
-                    elif total == 0:
-                        bill = ClassBill.objects.create(
-                            promo_code=session.promo_code,
-                            hourly_price=session.subject.price_per_hour,
-                            number_of_hours=session.class_time,
-                            subtotal=subtotal,
-                            session=session
-                        )
-
-                        balance.bills.add(bill)
-                        balance.save()
-
-                        created_class = serializers.ClassDetailV2Serializer(
-                            session
-                        )
-
-                        #
-                        # If a charge was created, then will be returned.
-                        #
-                        serializer.save()
-
-                        return Response(
-                            created_class.data,
-                            status=status.HTTP_201_CREATED
-                        )
-
-                    else:
-                        #
-                        # Changing the state of class to cancelled.
-                        #
-                        session.class_status_id = 7
-                        session.save()
-
-                        fixed_date_time = (
-                            session.class_start_date +
-                            timedelta(hours=session.time_zone_conf)
-                        )
-
-                        context = {
-                            'booking': session,
-                            'request': request,
-                            'fixed_date_time': fixed_date_time
-                        }
-
-                        subject_template = (
-                            'email/booking/'
-                            'booking_error_payment_stripe_subject.txt'
-                        )
-
-                        subject = render_to_string(
-                            subject_template,
-                            context
-                        ).strip()
-
-                        #
-                        # Defining notification receivers.
-                        #
-                        teacher = session.teacher
-                        student = session.student
-                        action = 'payment error'
-
-                        #
-                        # Templtes to send student's notification & email.
-                        #
-                        body_template_student = (
-                            'email/booking/'
-                            'booking_error_payment_stripe_student.txt'
-                        )
-
-                        html_template_student = (
-                            'email/booking/'
-                            'booking_error_payment_stripe_student.html'
-                        )
-
-                        body_student = render_to_string(
-                            body_template_student,
-                            context
-                        )
-
-                        html_student = render_to_string(
-                            html_template_student,
-                            context
-                        )
-
-                        #
-                        # Send email to student for stripe payment error
-                        #
-                        student.email_user(
-                            subject,
-                            body_student,
-                            html=html_student
-                        )
-
-                        Notification.objects.create(
-                            receiver=student,
-                            sender=teacher,
-                            target_action=action,
-                            target=session,
-                            body=subject
+                    with transaction.atomic():
+                        session = get_object_or_404(
+                            Class.objects.select_for_update(),
+                            pk=kwargs['pk']
                         )
 
-                        if session.meeting_now:
-                            #
-                            # Notifications and emails should be sent to
-                            # the teacher only if the current session is
-                            # "meeting now".
-                            #
-
-                            #
-                            # Templtes to send teacher's notification & email.
-                            #
-                            body_template_teacher = (
-                                'email/booking/'
-                                'booking_error_payment_stripe_teacher.txt'
-                            )
-
-                            html_template_teacher = (
-                                'email/booking/'
-                                'booking_error_payment_stripe_teacher.html'
-                            )
-
-                            body_teacher = render_to_string(
-                                body_template_teacher,
-                                context
-                            )
-                            html_teacher = render_to_string(
-                                html_template_teacher,
-                                context
+                        if session.class_status_id != 2:
+                            return Response(
+                                {
+                                    'detail': (
+                                        'the session has been accepted '
+                                        'previously'
+                                    )
+                                },
+                                status=status.HTTP_400_BAD_REQUEST
                             )
 
-                            #
-                            # Send email to teacher for stripe payment error
-                            #
-                            teacher.email_user(
-                                subject,
-                                body_teacher,
-                                html=html_teacher
-                            )
+                        acceptance.accept(session)
 
-                            Notification.objects.create(
-                                receiver=teacher,
-                                sender=student,
-                                target_action=action,
-                                target=session,
-                                body=subject
-                            )
+                    get_acceptance_pipeline(session.pk).delay()
 
-                        return Response(
-                            stripe_charge_response['response'],
-                            status=(
-                                status.HTTP_400_BAD_REQUEST
-                            )
-                        )
+                    return Response(
+                        serializers.SessionListV2Serializer(session).data,
+                        status=status.HTTP_202_ACCEPTED
+                    )
                 elif class_status == 1:
                     #
                     # When the teacher reject the session
@@ -905,9 +723,7 @@ class SessionViewSet(
                     # again
                     #
                     session.promo_code = None
-                    for bill in session.bills.all():
-                        bill.promo_code = None
-                        bill.save()
+                    session.bills.update(promo_code=None)
 
                     session.save()
 
@@ -1131,9 +947,10 @@ class SessionViewSet(
         )
 
         if month:
+            start_date, end_date = get_month_range(year, month)
             sessions = sessions.filter(
-                class_start_date__month=month,
-                class_start_date__year=year
+                class_start_date__gte=start_date,
+                class_start_date__lt=end_date
             )
 
         if status:
@@ -1142,7 +959,11 @@ class SessionViewSet(
                 class_status__in=status_ids
             )
 
-        return sessions.order_by('class_status__order')
+        #
+        # The status order is copied in the session, so the list is read in
+        # order from the (teacher, status_order, class_start_date) index.
+        #
+        return sessions.order_by('status_order', 'class_start_date')
 
 
 class LessonExtensionViewSet(
@@ -1,8 +1,83 @@
 # -*- coding: utf-8 -*-
 from django.apps import AppConfig
+from django.db.models.signals import (
+    post_delete,
+    post_init,
+    post_save,
+    pre_save
+)
 from django.utils.translation import ugettext_lazy as _
 
 
 class ScheduledClassesConfig(AppConfig):
     name = 'tandlr.scheduled_classes'
     verbose_name = _('scheduled classes')
+
+    def ready(self):
+        """
+        Registers the signals that will be handled by this module.
+        """
+        #
+        # The signals use the celery tasks, which need the models loaded.
+        #
+        from . import signals
+
+        slot_model = self.get_model('Slot')
+        class_model = self.get_model('Class')
+
+        post_save.connect(
+            signals.refresh_availability_on_slot_change,
+            sender=slot_model
+        )
+        post_delete.connect(
+            signals.refresh_availability_on_slot_change,
+            sender=slot_model
+        )
+
+        for model in (slot_model, self.get_model('SubjectTeacher')):
+            post_init.connect(
+                signals.remember_search_state,
+                sender=model
+            )
+            post_save.connect(
+                signals.invalidate_searches_on_teacher_change,
+                sender=model
+            )
+            post_delete.connect(
+                signals.invalidate_searches_on_teacher_delete,
+                sender=model
+            )
+        subject_teacher_model = self.get_model('SubjectTeacher')
+        post_init.connect(
+            signals.remember_candidate_teacher,
+            sender=subject_teacher_model
+        )
+        post_save.connect(
+            signals.update_candidates_on_subject_change,
+            sender=subject_teacher_model
+        )
+        post_delete.connect(
+            signals.update_candidates_on_subject_delete,
+            sender=subject_teacher_model
+        )
+
+        pre_save.connect(
+            signals.remember_stored_class_state,
+            sender=class_model
+        )
+        post_save.connect(
+            signals.refresh_availability_on_class_change,
+            sender=class_model
+        )
+        post_delete.connect(
+            signals.refresh_availability_on_class_delete,
+            sender=class_model
+        )
+        post_save.connect(
+            signals.schedule_timers_on_class_change,
+            sender=class_model
+        )
+        post_save.connect(
+            signals.update_status_order_on_status_change,
+            sender=self.get_model('ClassStatus')
+        )
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+Availability engine for the teachers in tandlr.
+
+The availability of a teacher is defined by his slots minus the sessions that
+are already booked on them. Instead of asking the database for every
+(day, slot) pair, the engine loads the candidate slots and the booked
+sessions of the whole search window in bulk and computes the free intervals
+of every teacher in memory.
+
+All the datetimes handled by the engine are naive "wall clock" datetimes,
+because the slots are stored as wall clock times. The booked sessions are
+moved to the wall clock of the user that booked them with their
+```time_zone_conf```, the same basis as the materialized calendar (see
+```tandlr.scheduled_classes.freebusy```), so both give the same results.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from tandlr.scheduled_classes.models import Class, Slot
+
+
+#
+# Sessions that keep the teacher busy:
+#
+#   id | name       |
+#   -----------------
+#    2 | Scheduled  |
+#    3 | Acepted    |
+#    4 | On course  |
+#    6 | Pending    |
+#
+BUSY_CLASS_STATUS = [2, 3, 4, 6]
+
+#
+# The sessions can't last more than one day (```Class.class_time``` is a
+# time), it gives the lower bound of the start date in the overlap lookups.
+#
+MAX_SESSION_DURATION = timedelta(days=1)
+
+#
+# The search window covers the given date plus the next 7 days.
+#
+SEARCH_WINDOW_DAYS = 8
+
+#
+# Max number of teachers suggested by the search.
+#
+MAX_SUGGESTED_TEACHERS = 3
+
+
+def merge_intervals(intervals):
+    """
+    Returns the given (start, end) intervals sorted and merged, so none of
+    the returned intervals overlap.
+    """
+    merged = []
+
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+
+    return merged
+
+
+def subtract_intervals(interval, busy_intervals):
+    """
+    Returns the list of free (start, end) intervals that remain of the given
+    interval once the busy intervals are removed from it.
+
+    The busy intervals must be sorted and merged (see ```merge_intervals```).
+    """
+    start, end = interval
+    free = []
+
+    for busy_start, busy_end in busy_intervals:
+        if busy_end <= start:
+            continue
+
+        if busy_start >= end:
+            break
+
+        if busy_start > start:
+            free.append((start, busy_start))
+
+        start = max(start, busy_end)
+
+        if start >= end:
+            break
+
+    if start < end:
+        free.append((start, end))
+
+    return free
+
+
+def first_free_start(free_intervals, duration):
+    """
+    Returns the start of the first free interval where a session of the
+    given duration (timedelta) fits, or None if there isn't any.
+    """
+    for start, end in free_intervals:
+        if end - start >= duration:
+            return start
+
+    return None
+
+
+def slot_applies_to(slot, day):
+    """
+    Tells whether the given slot is defined for the given date.
+    """
+    return slot.applies_to(day)
+
+
+def slot_interval(slot, day):
+    """
+    Returns the (start, end) wall clock interval of the slot on the given
+    date.
+    """
+    return (
+        datetime.combine(day, slot.start_time),
+        datetime.combine(day, slot.end_time)
+    )
+
+
+def get_busy_intervals(teacher_ids, window_start, window_end):
+    """
+    Returns a dictionary with the merged busy intervals of every given teacher
+    inside the wall clock window, using a single query.
+
+    The sessions are stored in UTC, every one is moved to the wall clock of
+    the user that booked it with its ```time_zone_conf``` (hours). The time
+    zones are at most one day apart, so the window is widened by one day.
+    """
+    margin = timedelta(days=1)
+
+    sessions = Class.objects.filter(
+        teacher_id__in=teacher_ids,
+        class_status_id__in=BUSY_CLASS_STATUS,
+        class_start_date__lt=_to_utc(window_end, margin),
+        class_end_date__gt=_to_utc(window_start, -margin)
+    ).values_list(
+        'teacher_id',
+        'class_start_date',
+        'class_end_date',
+        'time_zone_conf'
+    )
+
+    busy = defaultdict(list)
+
+    for teacher_id, start_date, end_date, time_zone_conf in sessions:
+        offset = timedelta(hours=time_zone_conf)
+        busy[teacher_id].append((
+            (start_date + offset).replace(tzinfo=None),
+            (end_date + offset).replace(tzinfo=None)
+        ))
+
+    return dict(
+        (teacher_id, merge_intervals(intervals))
+        for teacher_id, intervals in busy.items()
+    )
+
+
+def get_busy_teachers_ids(start_datetime, end_datetime):
+    """
+    Returns the ids of the teachers that have a session overlapping the given
+    (UTC) range.
+
+    Both bounds of the start date are given, so the lookup is a range scan
+    over the ```(class_start_date, class_end_date)``` index instead of a
+    scan of the whole table.
+    """
+    return Class.objects.filter(
+        class_status_id__in=BUSY_CLASS_STATUS,
+        class_start_date__gt=start_datetime - MAX_SESSION_DURATION,
+        class_start_date__lt=end_datetime,
+        class_end_date__gt=start_datetime
+    ).values_list(
+        'teacher_id',
+        flat=True
+    )
+
+
+def get_teachers_filter(user, subject_id, teacher_ids=None):
+    """
+    Returns the lookups of the teachers that impart the given subject in the
+    user's university. The joins are skipped when the ids of those teachers
+    are known (see ```tandlr.users.candidates```).
+    """
+    if teacher_ids is not None:
+        return {'teacher_id__in': teacher_ids}
+
+    return {
+        'teacher__university_id': user.university_id,
+        'teacher__subject_teacher__subject_id': subject_id
+    }
+
+
+def find_available_teachers(user, subject_id, local_start_datetime, duration,
+                            excluded_users_ids=(), days=SEARCH_WINDOW_DAYS,
+                            limit=MAX_SUGGESTED_TEACHERS, teacher_ids=None):
+    """
+    Returns the first teachers that impart the given subject in the user's
+    university and have a free gap of the given duration in the search
+    window that starts on the given local datetime.
+
+    Each result is a dictionary with the slot, the wall clock date on which
+    the session can start and the teacher, the same shape expected by the
+    ```SearchFutureTeacherV2Serializer```.
+
+    The cost of the search is two queries no matter the number of slots:
+    one to load the candidate slots (with their teachers and subject
+    mapping) and another one to load the booked sessions of the window.
+
+    teacher_ids, if given, are the candidate teachers of the search and
+    replace the university and subject joins.
+    """
+    local_start_datetime = local_start_datetime.replace(
+        tzinfo=None,
+        second=0,
+        microsecond=0
+    )
+    first_day = local_start_datetime.date()
+    last_day = first_day + timedelta(days=days - 1)
+
+    excluded_users_ids = set(excluded_users_ids)
+    excluded_users_ids.add(user.id)
+
+    slots = list(
+        Slot.objects.filter(
+            Q(is_unique=False) |
+            Q(date__gte=first_day, date__lte=last_day),
+            **get_teachers_filter(user, subject_id, teacher_ids)
+        ).exclude(
+            teacher_id__in=excluded_users_ids
+        ).select_related(
+            'teacher'
+        ).order_by(
+            'id'
+        )
+    )
+
+    if not slots:
+        return []
+
+    busy = get_busy_intervals(
+        set(slot.teacher_id for slot in slots),
+        datetime.combine(first_day, datetime.min.time()),
+        datetime.combine(last_day + timedelta(days=1), datetime.min.time())
+    )
+
+    available_dates = []
+    available_teachers_ids = set()
+
+    for offset in range(days):
+        current_day = first_day + timedelta(days=offset)
+
+        for slot in slots:
+            if slot.teacher_id in available_teachers_ids:
+                continue
+
+            if not slot_applies_to(slot, current_day):
+                continue
+
+            start, end = slot_interval(slot, current_day)
+
+            # Never suggest a date before the requested one.
+            start = max(start, local_start_datetime)
+
+            if end - start < duration:
+                continue
+
+            free_start = first_free_start(
+                subtract_intervals(
+                    (start, end),
+                    busy.get(slot.teacher_id, [])
+                ),
+                duration
+            )
+
+            if free_start is None:
+                continue
+
+            available_dates.append({
+                'slot': slot,
+                'date': free_start,
+                'teacher': slot.teacher
+            })
+            available_teachers_ids.add(slot.teacher_id)
+
+            if len(available_dates) >= limit:
+                return available_dates
+
+    return available_dates
+
+
+def _to_utc(local_datetime, margin):
+    """
+    Returns the given naive wall clock datetime as an aware UTC datetime,
+    moved by the given margin.
+    """
+    return timezone.make_aware(local_datetime + margin, timezone.utc)
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Booking conflicts of the sessions.
+
+A teacher can't give, and a student can't take, two sessions at the same
+time. The overlaps are only looked up among the sessions of the
+participants of the new session, never among all the sessions.
+
+In PostgreSQL the rule is also enforced by the ```class_teacher_no_overlap```
+and ```class_student_no_overlap``` exclusion constraints (see the migration
+```scheduled_classes.0016_class_no_overlap```), so two concurrent bookings
+can't both pass the check. Their GiST indexes over
+```tstzrange(class_start_date, class_end_date)``` serve the lookups too. In
+the other databases the lookups use the ```(teacher, class_start_date,
+class_end_date)``` and ```(student, class_start_date, class_end_date)```
+indexes.
+"""
+from django.db import connection
+from django.db.models import Q
+
+from tandlr.scheduled_classes.availability import (
+    BUSY_CLASS_STATUS,
+    MAX_SESSION_DURATION
+)
+from tandlr.scheduled_classes.models import Class
+
+
+#
+# Names of the exclusion constraints, they must match the ones of the
+# migration ```scheduled_classes.0016_class_no_overlap```.
+#
+TEACHER_CONSTRAINT = 'class_teacher_no_overlap'
+
+STUDENT_CONSTRAINT = 'class_student_no_overlap'
+
+#
+# Condition of the exclusion constraints, the lookups must repeat it to use
+# their indexes.
+#
+RANGE_CONDITION = (
+    'tstzrange("class"."class_start_date", "class"."class_end_date") && '
+    'tstzrange(%s, %s)'
+)
+
+TEACHER_CONFLICT = 'The teacher has lessons scheduled in this time'
+
+STUDENT_CONFLICT = 'The student has lessons scheduled in this time'
+
+
+def get_overlapping_sessions(start_datetime, end_datetime, exclude_pk=None,
+                             **participant):
+    """
+    Returns the busy sessions of the given participant (teacher_id=... or
+    student_id=...) that overlap the given range.
+    """
+    queryset = Class.objects.filter(
+        class_status_id__in=BUSY_CLASS_STATUS,
+        **participant
+    )
+
+    if connection.vendor == 'postgresql':
+        queryset = queryset.extra(
+            where=[RANGE_CONDITION],
+            params=[start_datetime, end_datetime]
+        )
+    else:
+        #
+        # The start date is bounded on both sides, so the lookup is a range
+        # scan of the index of the participant.
+        #
+        queryset = queryset.filter(
+            class_start_date__gt=start_datetime - MAX_SESSION_DURATION,
+            class_start_date__lt=end_datetime,
+            class_end_date__gt=start_datetime
+        )
+
+    if exclude_pk is not None:
+        queryset = queryset.exclude(pk=exclude_pk)
+
+    return queryset
+
+
+def get_conflict(teacher_id, student_id, start_datetime, end_datetime,
+                 exclude_pk=None):
+    """
+    Returns the message of the conflict of the given session, or None if
+    both the teacher and the student are free.
+    """
+    if get_overlapping_sessions(
+        start_datetime,
+        end_datetime,
+        exclude_pk=exclude_pk,
+        teacher_id=teacher_id
+    ).exists():
+        return TEACHER_CONFLICT
+
+    if get_overlapping_sessions(
+        start_datetime,
+        end_datetime,
+        exclude_pk=exclude_pk,
+        student_id=student_id
+    ).exists():
+        return STUDENT_CONFLICT
+
+    return None
+
+
+def get_conflicts(teacher_id, student_id, ranges):
+    """
+    Returns the (start, end, message) of the given (start, end) ranges that
+    overlap a busy session of the teacher or the student.
+
+    The busy sessions of both participants that overlap any of the ranges
+    are read with a single query, bounded by the first and the last range.
+    """
+    if not ranges:
+        return []
+
+    overlaps = Q()
+
+    for start_datetime, end_datetime in ranges:
+        overlaps |= Q(
+            class_start_date__lt=end_datetime,
+            class_end_date__gt=start_datetime
+        )
+
+    sessions = list(
+        Class.objects.filter(
+            Q(teacher_id=teacher_id) | Q(student_id=student_id),
+            class_status_id__in=BUSY_CLASS_STATUS,
+            class_start_date__gt=(
+                min(start for start, _ in ranges) - MAX_SESSION_DURATION
+            ),
+            class_start_date__lt=max(end for _, end in ranges)
+        ).filter(
+            overlaps
+        ).values_list(
+            'class_start_date',
+            'class_end_date',
+            'teacher_id'
+        )
+    )
+
+    conflicts = []
+
+    for start_datetime, end_datetime in ranges:
+        for session_start, session_end, session_teacher_id in sessions:
+            if session_start < end_datetime and session_end > start_datetime:
+                conflicts.append((
+                    start_datetime,
+                    end_datetime,
+                    TEACHER_CONFLICT if session_teacher_id == teacher_id
+                    else STUDENT_CONFLICT
+                ))
+                break
+
+    return conflicts
+
+
+def get_integrity_conflict(error):
+    """
+    Returns the message of the conflict of the given ```IntegrityError```,
+    or None if it wasn't raised by the exclusion constraints.
+    """
+    message = str(error)
+
+    if TEACHER_CONSTRAINT in message:
+        return TEACHER_CONFLICT
+
+    if STUDENT_CONSTRAINT in message:
+        return STUDENT_CONFLICT
+
+    return None
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+Materialized free/busy calendar of the teachers.
+
+The free intervals of every teacher for the next weeks are stored in the
+```TeacherAvailability``` table, so the search endpoints can answer the
+availability of the teachers with a single indexed range query instead of
+expanding the slots and subtracting the sessions on every request.
+
+The calendar is refreshed per teacher when one of his slots or sessions
+changes (see ```tandlr.scheduled_classes.signals```) and it is rolled
+forward every night by the ```roll_forward_teacher_availability``` task.
+
+Slots are defined as wall clock times, so the occurrences are stored as wall
+clock datetimes too (with UTC as tzinfo, the same way the search endpoints
+build the local datetime of the user) and the booked sessions are moved to
+the wall clock of the user that booked them with their ```time_zone_conf```.
+"""
+import calendar
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from tandlr.scheduled_classes.availability import (
+    MAX_SUGGESTED_TEACHERS,
+    SEARCH_WINDOW_DAYS,
+    get_busy_intervals,
+    get_teachers_filter,
+    slot_applies_to,
+    slot_interval,
+    subtract_intervals
+)
+from tandlr.scheduled_classes.models import (
+    Class,
+    Slot,
+    TeacherAvailability
+)
+
+
+#
+# Number of teachers refreshed at once by the nightly roll forward.
+#
+ROLL_FORWARD_CHUNK_SIZE = 200
+
+
+def get_horizon():
+    """
+    Returns the (first_day, last_day) dates covered by the calendar.
+
+    The calendar starts one day before today because the wall clock of the
+    users can be up to one day behind UTC.
+    """
+    first_day = timezone.now().date() - timedelta(days=1)
+    last_day = first_day + timedelta(
+        weeks=getattr(settings, 'TEACHER_AVAILABILITY_WEEKS', 4)
+    )
+
+    return first_day, last_day
+
+
+def covers(start_date, end_date):
+    """
+    Tells whether the given wall clock range is inside the materialized
+    calendar.
+    """
+    first_day, last_day = get_horizon()
+
+    return first_day < start_date.date() and end_date.date() <= last_day
+
+
+def to_wall_clock(value):
+    """
+    Returns the given naive wall clock datetime as the aware value stored in
+    the calendar.
+    """
+    return timezone.make_aware(value, timezone.utc)
+
+
+def get_session_state(session):
+    """
+    Returns the values of the given session that affect the calendar of its
+    teacher, comparable with the ones read from the database.
+    """
+    return (
+        session.class_status_id,
+        _timestamp(session.class_start_date),
+        _timestamp(session.class_end_date)
+    )
+
+
+def get_stored_session_state(session_id):
+    """
+    Returns the committed state of the given session, None if it doesn't
+    exist.
+    """
+    session = Class.objects.filter(pk=session_id).only(
+        'class_status',
+        'class_start_date',
+        'class_end_date'
+    ).first()
+
+    return get_session_state(session) if session is not None else None
+
+
+def build_teacher_availability(teacher_ids, first_day, last_day):
+    """
+    Returns the unsaved ```TeacherAvailability``` occurrences of the given
+    teachers between the given dates.
+    """
+    slots = list(
+        Slot.objects.filter(
+            Q(is_unique=False) |
+            Q(date__gte=first_day, date__lte=last_day),
+            teacher_id__in=teacher_ids
+        )
+    )
+
+    if not slots:
+        return []
+
+    busy = get_busy_intervals(
+        teacher_ids,
+        datetime.combine(first_day, datetime.min.time()),
+        datetime.combine(last_day + timedelta(days=1), datetime.min.time())
+    )
+    occurrences = []
+    current_day = first_day
+
+    while current_day <= last_day:
+        for slot in slots:
+            if not slot_applies_to(slot, current_day):
+                continue
+
+            free_intervals = subtract_intervals(
+                slot_interval(slot, current_day),
+                busy.get(slot.teacher_id, [])
+            )
+
+            for start, end in free_intervals:
+                occurrences.append(
+                    TeacherAvailability(
+                        teacher_id=slot.teacher_id,
+                        slot=slot,
+                        start_date=to_wall_clock(start),
+                        end_date=to_wall_clock(end)
+                    )
+                )
+
+        current_day += timedelta(days=1)
+
+    return occurrences
+
+
+@transaction.atomic
+def refresh_teacher_availability(teacher_ids):
+    """
+    Rebuilds the calendar of the given teachers.
+    """
+    first_day, last_day = get_horizon()
+
+    TeacherAvailability.objects.filter(teacher_id__in=teacher_ids).delete()
+    TeacherAvailability.objects.bulk_create(
+        build_teacher_availability(teacher_ids, first_day, last_day),
+        batch_size=500
+    )
+
+
+def roll_forward():
+    """
+    Removes the past occurrences and extends the calendar of every teacher
+    with slots up to the new horizon.
+    """
+    first_day, _ = get_horizon()
+
+    TeacherAvailability.objects.filter(
+        end_date__lt=to_wall_clock(
+            datetime.combine(first_day, datetime.min.time())
+        )
+    ).delete()
+
+    teacher_ids = list(
+        Slot.objects.order_by(
+            'teacher_id'
+        ).values_list(
+            'teacher_id',
+            flat=True
+        ).distinct()
+    )
+
+    for index in range(0, len(teacher_ids), ROLL_FORWARD_CHUNK_SIZE):
+        refresh_teacher_availability(
+            teacher_ids[index:index + ROLL_FORWARD_CHUNK_SIZE]
+        )
+
+
+def available_teachers_ids(start_date, end_date):
+    """
+    Returns the ids of the teachers that are free during the whole given wall
+    clock range.
+    """
+    return TeacherAvailability.objects.filter(
+        start_date__lte=start_date,
+        end_date__gte=end_date
+    ).values_list(
+        'teacher_id',
+        flat=True
+    )
+
+
+def find_available_occurrences(user, subject_id, local_start_datetime,
+                               duration, excluded_users_ids=(),
+                               days=SEARCH_WINDOW_DAYS,
+                               limit=MAX_SUGGESTED_TEACHERS,
+                               teacher_ids=None):
+    """
+    Calendar based version of ```tandlr.scheduled_classes.availability
+    .find_available_teachers```, it returns the same results with a single
+    range query over the materialized calendar.
+    """
+    local_start_datetime = local_start_datetime.replace(
+        second=0,
+        microsecond=0
+    )
+    window_end = to_wall_clock(
+        datetime.combine(
+            local_start_datetime.date() + timedelta(days=days),
+            datetime.min.time()
+        )
+    )
+
+    excluded_users_ids = set(excluded_users_ids)
+    excluded_users_ids.add(user.id)
+
+    occurrences = TeacherAvailability.objects.filter(
+        start_date__lt=window_end,
+        end_date__gte=local_start_datetime + duration,
+        **get_teachers_filter(user, subject_id, teacher_ids)
+    ).filter(
+        end_date__gte=F('start_date') + duration
+    ).exclude(
+        teacher_id__in=excluded_users_ids
+    ).select_related(
+        'slot',
+        'teacher'
+    ).order_by(
+        'start_date',
+        'slot_id'
+    )
+
+    available_dates = []
+    available_teachers_ids = set()
+
+    for occurrence in occurrences.iterator():
+        if occurrence.teacher_id in available_teachers_ids:
+            continue
+
+        start = max(occurrence.start_date, local_start_datetime)
+
+        if occurrence.end_date - start < duration:
+            continue
+
+        available_dates.append({
+            'slot': occurrence.slot,
+            'date': start.replace(tzinfo=None),
+            'teacher': occurrence.teacher
+        })
+        available_teachers_ids.add(occurrence.teacher_id)
+
+        if len(available_dates) >= limit:
+            break
+
+    return available_dates
+
+
+def _timestamp(value):
+    if value is None:
+        return None
+
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, timezone.get_default_timezone())
+
+    return calendar.timegm(value.utctimetuple())
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+Time driven transitions of the sessions.
+
+The sweeper moves the sessions whose time passed to their final status:
+
+    - On course (4) sessions that started SESSION_AUTO_FINISH_HOURS ago are
+      ended (5).
+    - Scheduled (2) and pending (6) sessions that nobody answered before
+      their start are rejected (1).
+    - The extensions that are still open in ended, rejected or cancelled
+      sessions are finished.
+
+Every transition is applied in chunks of SESSION_SWEEP_CHUNK_SIZE sessions,
+each chunk is a transaction that locks its sessions and moves them with a
+single ```UPDATE```. The sessions that were moved don't match the scan
+anymore, so a sweep that was interrupted resumes where it stopped on the
+next run. The scans use the ```(class_status, class_start_date)``` index.
+
+The notifications of every chunk are created in bulk and pushed by a single
+```tandlr.notifications.tasks.send_push_notification_batch``` task.
+
+The ```UPDATE``` skips the signals of the sessions, so every chunk rebuilds
+the materialized calendars of its teachers (see
+```tandlr.scheduled_classes.freebusy```) and invalidates their cached
+searches once it's committed.
+
+The same transitions are applied at their exact deadline by the session
+timers (see ```tandlr.scheduled_classes.timers```), the sweeper only
+catches the sessions that the timers missed.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from tandlr.notifications.models import Notification
+from tandlr.notifications.tasks import send_push_notification_batch
+from tandlr.scheduled_classes import freebusy
+from tandlr.scheduled_classes.models import (
+    Class,
+    RequestClassExtensionTime,
+    get_status_order
+)
+from tandlr.users.models import UserSummary
+from tandlr.users.search_cache import bump_users_versions
+
+
+REJECTED = 1
+SCHEDULED = 2
+ACCEPTED = 3
+ON_COURSE = 4
+ENDED = 5
+PENDING = 6
+CANCELLED = 7
+
+#
+# Status of the sessions whose extensions can't be open.
+#
+CLOSED_CLASS_STATUS = [REJECTED, ENDED, CANCELLED]
+
+
+def transition(from_status, to_status, start_before, notify=None):
+    """
+    Moves the sessions in the given status that started before the given
+    datetime to the new status, chunk by chunk.
+
+    Returns the number of moved sessions.
+    """
+    moved = 0
+
+    while True:
+        session_ids = move_sessions(
+            Class.objects.filter(
+                class_status_id__in=from_status,
+                class_start_date__lte=start_before
+            ),
+            to_status,
+            notify=notify
+        )
+
+        if not session_ids:
+            return moved
+
+        moved += len(session_ids)
+
+
+def move_sessions(sessions, to_status, notify=None):
+    """
+    Moves a chunk of the given sessions queryset to the new status in a
+    transaction, and returns the ids of the moved sessions.
+
+    The ids are given to the notify function inside the transaction, it
+    returns the action of the notifications that it created, which are
+    pushed once the transaction is committed.
+    """
+    action = None
+
+    with transaction.atomic():
+        chunk = list(
+            sessions.select_for_update().order_by(
+                'class_start_date',
+                'id'
+            ).values_list(
+                'id',
+                'teacher_id'
+            )[:settings.SESSION_SWEEP_CHUNK_SIZE]
+        )
+
+        if not chunk:
+            return []
+
+        session_ids = [session_id for session_id, _ in chunk]
+
+        Class.objects.filter(
+            id__in=session_ids
+        ).update(
+            class_status_id=to_status,
+            status_order=get_status_order(to_status)
+        )
+
+        if notify is not None:
+            action = notify(session_ids)
+
+    teacher_ids = sorted(set(teacher_id for _, teacher_id in chunk))
+    freebusy.refresh_teacher_availability(teacher_ids)
+    bump_users_versions(teacher_ids)
+
+    if action is not None:
+        send_push_notification_batch.delay(
+            ContentType.objects.get_for_model(Class).pk,
+            session_ids,
+            action
+        )
+
+    return session_ids
+
+
+def close_extensions(session_ids=None):
+    """
+    Finishes the open extensions of the closed sessions, or of the given
+    sessions. Returns the number of finished extensions.
+    """
+    closed = 0
+
+    while True:
+        extensions = RequestClassExtensionTime.objects.filter(
+            finished=False
+        )
+
+        if session_ids is not None:
+            extensions = extensions.filter(class_request_id__in=session_ids)
+        else:
+            extensions = extensions.filter(
+                class_request__class_status_id__in=CLOSED_CLASS_STATUS
+            )
+
+        extension_ids = list(
+            extensions.order_by('id').values_list(
+                'id',
+                flat=True
+            )[:settings.SESSION_SWEEP_CHUNK_SIZE]
+        )
+
+        if not extension_ids:
+            return closed
+
+        closed += RequestClassExtensionTime.objects.filter(
+            id__in=extension_ids
+        ).update(
+            finished=True
+        )
+
+
+def notify_ended(session_ids):
+    """
+    Closes the extensions of the given ended sessions, counts them in the
+    summaries of their participants and notifies the students.
+    """
+    close_extensions(session_ids)
+
+    sessions = list(
+        Class.objects.filter(
+            id__in=session_ids
+        ).values_list(
+            'id',
+            'teacher_id',
+            'student_id'
+        )
+    )
+
+    _increment_summaries(
+        'sessions_as_teacher',
+        Counter(teacher_id for _, teacher_id, _ in sessions)
+    )
+    _increment_summaries(
+        'lessons_as_student',
+        Counter(student_id for _, _, student_id in sessions)
+    )
+
+    return _notify_students(
+        sessions,
+        'ended',
+        'email/booking/booking_finished_student_subject.txt'
+    )
+
+
+def notify_expired(session_ids):
+    """
+    Notifies the students of the given sessions that expired without an
+    answer.
+    """
+    sessions = Class.objects.filter(
+        id__in=session_ids
+    ).values_list(
+        'id',
+        'teacher_id',
+        'student_id'
+    )
+
+    return _notify_students(
+        sessions,
+        'rejected',
+        'email/booking/booking_expired_student_subject.txt'
+    )
+
+
+def sweep(now=None):
+    """
+    Applies all the time driven transitions, returns the number of sessions
+    or extensions changed by each one.
+    """
+    now = now or timezone.now()
+
+    return {
+        'ended': transition(
+            [ON_COURSE],
+            ENDED,
+            now - timedelta(hours=settings.SESSION_AUTO_FINISH_HOURS),
+            notify=notify_ended
+        ),
+        'expired': transition(
+            [SCHEDULED, PENDING],
+            REJECTED,
+            now,
+            notify=notify_expired
+        ),
+        'extensions': close_extensions()
+    }
+
+
+def _increment_summaries(field, counts):
+    #
+    # One UPDATE for all the users with the same number of sessions in the
+    # chunk.
+    #
+    users_by_count = {}
+
+    for user_id, count in counts.items():
+        users_by_count.setdefault(count, []).append(user_id)
+
+    for count, user_ids in users_by_count.items():
+        UserSummary.objects.filter(
+            user_id__in=user_ids
+        ).update(
+            **{field: F(field) + count}
+        )
+
+
+def _notify_students(sessions, action, subject_template):
+    sessions = list(sessions)
+
+    body = render_to_string(subject_template, {}).strip()
+    target_type = ContentType.objects.get_for_model(Class)
+
+    Notification.objects.bulk_create([
+        Notification(
+            receiver_id=student_id,
+            sender_id=teacher_id,
+            target_type=target_type,
+            target_id=session_id,
+            target_action=action,
+            body=body
+        )
+        for session_id, teacher_id, student_id in sessions
+    ])
+
+    return action
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Compares the busy teachers lookup of the search endpoint before and after
+the overlap query, over a seeded ```class``` table.
+
+The sessions are seeded inside a transaction that is rolled back at the end,
+so the command can be run against a copy of any database:
+
+    ./manage.py benchmark_busy_teachers --sessions 1000000
+"""
+import random
+import time as timer
+from datetime import datetime, time, timedelta
+
+from django.contrib.gis.geos import GEOSGeometry
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from tandlr.catalogues.models import University
+from tandlr.scheduled_classes.availability import get_busy_teachers_ids
+from tandlr.scheduled_classes.models import Class, Subject
+from tandlr.users.models import User
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the busy teachers lookup of the teachers search.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sessions',
+            type=int,
+            default=1000000,
+            help='Number of seeded sessions.'
+        )
+        parser.add_argument(
+            '--teachers',
+            type=int,
+            default=1000,
+            help='Number of seeded teachers.'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Number of times each query is executed.'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.seed(options['sessions'], options['teachers'])
+                self.benchmark(options['repeat'])
+                raise Rollback()
+        except Rollback:
+            self.stdout.write('Seeded sessions rolled back.')
+
+    def seed(self, sessions, teachers):
+        university = University.objects.create(
+            name='Benchmark university',
+            initial='BU'
+        )
+        subject = Subject.objects.create(
+            name='Benchmark subject',
+            university=university
+        )
+        student = User.objects.create_user(
+            email='benchmark-student@tandlr.com',
+            username='benchmark-student',
+            university=university
+        )
+        teacher_ids = [
+            User.objects.create_user(
+                email='benchmark-teacher-{}@tandlr.com'.format(index),
+                username='benchmark-teacher-{}'.format(index),
+                is_teacher=True,
+                university=university
+            ).id
+            for index in range(teachers)
+        ]
+
+        location = GEOSGeometry('SRID=4326;POINT(0 0)')
+        first_date = timezone.now().replace(
+            minute=0,
+            second=0,
+            microsecond=0
+        ) - timedelta(days=365)
+
+        batch = []
+
+        for index in range(sessions):
+            start_date = first_date + timedelta(
+                minutes=30 * random.randint(0, 2 * 24 * 730)
+            )
+            batch.append(
+                Class(
+                    teacher_id=random.choice(teacher_ids),
+                    student=student,
+                    subject=subject,
+                    class_start_date=start_date,
+                    class_end_date=start_date + timedelta(hours=1),
+                    class_time=time(1, 0),
+                    class_status_id=random.randint(1, 7),
+                    location=location,
+                    time_zone_conf=0,
+                    participants=1
+                )
+            )
+
+            if len(batch) == 10000:
+                Class.objects.bulk_create(batch)
+                batch = []
+
+        Class.objects.bulk_create(batch)
+
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('ANALYZE class')
+
+        self.stdout.write('Seeded {} sessions.'.format(sessions))
+
+    def benchmark(self, repeat):
+        start_datetime = timezone.make_aware(
+            datetime.combine(
+                timezone.now().date() + timedelta(days=7),
+                time(10, 0)
+            ),
+            timezone.utc
+        )
+        end_datetime = start_datetime + timedelta(hours=1)
+
+        before = Class.objects.filter(
+            class_start_date__year=start_datetime.year,
+            class_start_date__month=start_datetime.month,
+            class_start_date__day=start_datetime.day,
+            class_start_date__hour=start_datetime.hour,
+            class_start_date__minute=start_datetime.minute
+        ).values_list(
+            'teacher__id',
+            flat=True
+        )
+        after = get_busy_teachers_ids(start_datetime, end_datetime)
+
+        for name, queryset in (('before', before), ('after', after)):
+            timings = []
+
+            for _ in range(repeat):
+                started = timer.time()
+                count = len(list(queryset.all()))
+                timings.append(timer.time() - started)
+
+            self.stdout.write(
+                '{}: {} teachers, best {:.2f} ms, mean {:.2f} ms'.format(
+                    name,
+                    count,
+                    min(timings) * 1000,
+                    sum(timings) / len(timings) * 1000
+                )
+            )
+
+            if connection.vendor == 'postgresql':
+                sql, params = queryset.query.sql_with_params()
+
+                with connection.cursor() as cursor:
+                    cursor.execute('EXPLAIN ANALYZE ' + sql, params)
+
+                    for row in cursor.fetchall():
+                        self.stdout.write('    {}'.format(row[0]))
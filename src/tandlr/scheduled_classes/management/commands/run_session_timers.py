@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+"""
+Worker that fires the session timers on time, see
+```tandlr.scheduled_classes.timers```:
+
+    ./manage.py run_session_timers
+
+Only one worker should run at the same time, although the timers are never
+fired twice.
+"""
+from django.core.management.base import BaseCommand
+
+from tandlr.scheduled_classes.timers import TimerWorker
+
+
+class Command(BaseCommand):
+    help = 'Fires the session timers when they are due.'
+
+    def handle(self, *args, **options):
+        TimerWorker().run()
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('scheduled_classes', '0013_auto_20160818_1947'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeacherAvailability',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('start_date', models.DateTimeField(verbose_name='start date')),
+                ('end_date', models.DateTimeField(verbose_name='end date')),
+                ('slot', models.ForeignKey(related_name='occurrences', to='scheduled_classes.Slot')),
+                ('teacher', models.ForeignKey(related_name='availability', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'teacher_availability',
+                'verbose_name': 'teacher availability',
+                'verbose_name_plural': 'teachers availability',
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='teacheravailability',
+            index_together=set([('start_date', 'end_date'), ('teacher', 'start_date')]),
+        ),
+    ]
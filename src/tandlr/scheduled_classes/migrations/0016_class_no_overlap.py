@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import sys
+
+from django.conf import settings
+from django.db import migrations
+
+
+#
+# A teacher or a student can't have two busy sessions (scheduled, accepted,
+# on course or pending) at the same time, see
+# ```tandlr.scheduled_classes.conflicts```.
+#
+CREATE_CONSTRAINT = (
+    'ALTER TABLE "class" ADD CONSTRAINT {name} '
+    'EXCLUDE USING GIST ('
+    '"{column}" WITH =, '
+    'tstzrange("class_start_date", "class_end_date") WITH &&'
+    ') WHERE ("class_status_id" IN (2, 3, 4, 6))'
+)
+
+DROP_CONSTRAINT = 'ALTER TABLE "class" DROP CONSTRAINT IF EXISTS {name}'
+
+CONSTRAINTS = (
+    ('class_teacher_no_overlap', 'teacher_id'),
+    ('class_student_no_overlap', 'student_id'),
+)
+
+
+#
+# Pairs of busy sessions of the same teacher or student that overlap, the
+# oldest one first.
+#
+SELECT_OVERLAPS = (
+    'SELECT a.id, a.class_status_id, b.id, b.class_status_id '
+    'FROM "class" a JOIN "class" b ON ('
+    'a."{column}" = b."{column}" AND a.id < b.id AND '
+    'tstzrange(a.class_start_date, a.class_end_date) && '
+    'tstzrange(b.class_start_date, b.class_end_date)'
+    ') WHERE a.class_status_id IN (2, 3, 4, 6) '
+    'AND b.class_status_id IN (2, 3, 4, 6) '
+    'ORDER BY a.id, b.id'
+)
+
+CANCEL_SESSIONS = (
+    'UPDATE "class" SET class_status_id = 7 WHERE id = ANY(%s)'
+)
+
+SCHEDULED = 2
+
+
+def resolve_overlaps(cursor):
+    """
+    Cancels the requests (scheduled sessions not accepted by the teacher
+    yet) that overlap another busy session, the newest request of every
+    pair. The overlaps of sessions that were already accepted can't be
+    solved here, the migration fails with their ids so they are solved by
+    hand before running it again.
+    """
+    cancelled = []
+
+    while True:
+        to_cancel = set()
+        unresolved = []
+
+        for _, column in CONSTRAINTS:
+            cursor.execute(SELECT_OVERLAPS.format(column=column))
+
+            for first_id, first_status, second_id, second_status in (
+                cursor.fetchall()
+            ):
+                if first_id in to_cancel or second_id in to_cancel:
+                    continue
+
+                if second_status == SCHEDULED:
+                    to_cancel.add(second_id)
+                elif first_status == SCHEDULED:
+                    to_cancel.add(first_id)
+                else:
+                    unresolved.append((first_id, second_id))
+
+        if not to_cancel:
+            break
+
+        cursor.execute(CANCEL_SESSIONS, [sorted(to_cancel)])
+        cancelled.extend(sorted(to_cancel))
+
+    if cancelled:
+        sys.stdout.write(
+            '\n  Cancelled the overlapping requests: {0}'.format(
+                ', '.join(str(session_id) for session_id in cancelled)
+            )
+        )
+
+    if unresolved:
+        raise RuntimeError(
+            'These accepted sessions overlap, solve them before adding the '
+            'constraints: {0}'.format(
+                ', '.join(
+                    '{0} and {1}'.format(*pair) for pair in unresolved
+                )
+            )
+        )
+
+
+def create_constraints(apps, schema_editor):
+    # Exclusion constraints are only available in PostgreSQL.
+    if schema_editor.connection.vendor == 'postgresql':
+        with schema_editor.connection.cursor() as cursor:
+            resolve_overlaps(cursor)
+
+        # The equality of the ids in a GiST index needs btree_gist.
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+
+        for name, column in CONSTRAINTS:
+            schema_editor.execute(
+                CREATE_CONSTRAINT.format(name=name, column=column)
+            )
+
+
+def drop_constraints(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for name, _ in CONSTRAINTS:
+            schema_editor.execute(DROP_CONSTRAINT.format(name=name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('scheduled_classes', '0015_auto_20161018_1200'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='class',
+            index_together=set([('teacher', 'class_start_date', 'class_end_date'), ('student', 'class_start_date', 'class_end_date'), ('class_start_date', 'class_end_date')]),
+        ),
+        migrations.RunPython(create_constraints, drop_constraints),
+    ]
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+WEEK_DAYS = [
+    'monday', 'tuesday', 'wednesday', 'thursday',
+    'friday', 'saturday', 'sunday'
+]
+
+
+def fill_week_days(apps, schema_editor):
+    """
+    Computes the week days bitmask and the minutes of the existing slots,
+    the same way ```Slot.save``` does.
+    """
+    Slot = apps.get_model('scheduled_classes', 'Slot')
+
+    for slot in Slot.objects.iterator():
+        if slot.is_unique:
+            week_days = 0
+        else:
+            week_days = sum(
+                1 << week_day
+                for week_day, day in enumerate(WEEK_DAYS)
+                if getattr(slot, day)
+            )
+
+        Slot.objects.filter(pk=slot.pk).update(
+            week_days=week_days,
+            start_minute=slot.start_time.hour * 60 + slot.start_time.minute,
+            end_minute=slot.end_time.hour * 60 + slot.end_time.minute
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('scheduled_classes', '0016_class_no_overlap'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='slot',
+            name='end_minute',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='slot',
+            name='start_minute',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='slot',
+            name='week_days',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AlterIndexTogether(
+            name='slot',
+            index_together=set([('teacher', 'start_minute', 'end_minute'), ('start_minute', 'end_minute')]),
+        ),
+        migrations.RunPython(fill_week_days, migrations.RunPython.noop),
+    ]
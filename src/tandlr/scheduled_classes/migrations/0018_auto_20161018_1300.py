@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('scheduled_classes', '0017_slot_week_days'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='class',
+            index_together=set([('teacher', 'class_start_date', 'class_end_date'), ('student', 'class_start_date', 'class_end_date'), ('class_start_date', 'class_end_date'), ('class_status', 'class_start_date')]),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduled_classes', '0018_auto_20161018_1300'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionTimer',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('event', models.CharField(max_length=20, choices=[('expire', 'expire unanswered request'), ('auto_close', 'end session on course'), ('chat_expiry', 'close chat')])),
+                ('due_date', models.DateTimeField(db_index=True)),
+                ('session', models.ForeignKey(related_name='timers', to='scheduled_classes.Class')),
+            ],
+            options={
+                'db_table': 'session_timer',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='sessiontimer',
+            unique_together=set([('session', 'event')]),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('scheduled_classes', '0019_sessiontimer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionReminder',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+                ('receiver', models.ForeignKey(related_name='session_reminders', to=settings.AUTH_USER_MODEL)),
+                ('session', models.ForeignKey(related_name='reminders', to='scheduled_classes.Class')),
+            ],
+            options={
+                'db_table': 'session_reminder',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='sessionreminder',
+            unique_together=set([('session', 'receiver')]),
+        ),
+    ]
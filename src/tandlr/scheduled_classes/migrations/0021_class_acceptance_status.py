@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduled_classes', '0020_sessionreminder'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='class',
+            name='acceptance_status',
+            field=models.CharField(blank=True, max_length=20, null=True, verbose_name='acceptance status', choices=[('pending_payment', 'pending payment'), ('paid', 'paid'), ('billed', 'billed'), ('chat_opened', 'chat opened'), ('confirmed', 'confirmed'), ('payment_failed', 'payment failed')]),
+        ),
+    ]
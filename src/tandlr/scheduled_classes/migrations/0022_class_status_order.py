@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def fill_status_order(apps, schema_editor):
+    """
+    Copies the order of every status to its sessions, one UPDATE per status.
+    """
+    Class = apps.get_model('scheduled_classes', 'Class')
+    ClassStatus = apps.get_model('scheduled_classes', 'ClassStatus')
+
+    for status_id, order in ClassStatus.objects.values_list('id', 'order'):
+        Class.objects.filter(
+            class_status_id=status_id
+        ).update(
+            status_order=order
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduled_classes', '0021_class_acceptance_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='class',
+            name='status_order',
+            field=models.PositiveIntegerField(default=0, verbose_name='status order', editable=False),
+        ),
+        migrations.RunPython(fill_status_order, migrations.RunPython.noop),
+        migrations.AlterIndexTogether(
+            name='class',
+            index_together=set([('teacher', 'class_start_date', 'class_end_date'), ('student', 'class_start_date', 'class_end_date'), ('class_start_date', 'class_end_date'), ('class_status', 'class_start_date'), ('student', 'status_order', 'class_start_date'), ('teacher', 'status_order', 'class_start_date')]),
+        ),
+    ]
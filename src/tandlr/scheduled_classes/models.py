@@ -5,7 +5,8 @@ from decimal import Decimal
 from django.conf import settings
 from django.contrib.gis.db import models as gismodels
 from django.core import validators
-from django.db import models
+from django.db import connection, models
+from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
 from tandlr.balances.models import Balance
@@ -118,10 +119,69 @@ class ClassStatus(models.Model):
         verbose_name_plural = u'class status'
 
 
+#
+# Orders of the class statuses by their id, read once by every process. The
+# process that saves a status clears them, the other ones read them again
+# after STATUS_ORDERS_TIMEOUT seconds.
+#
+STATUS_ORDERS_TIMEOUT = 300
+
+_status_orders = {}
+
+
+def get_status_order(status_id):
+    """
+    Returns the order of the given class status.
+    """
+    now = timezone.now()
+
+    if (
+        status_id not in _status_orders.get('orders', {}) or
+        (now - _status_orders['loaded_at']).total_seconds() >
+        STATUS_ORDERS_TIMEOUT
+    ):
+        _status_orders.update(
+            orders=dict(ClassStatus.objects.values_list('id', 'order')),
+            loaded_at=now
+        )
+
+    try:
+        return _status_orders['orders'][status_id]
+    except KeyError:
+        raise ClassStatus.DoesNotExist
+
+
+def clear_status_orders():
+    """
+    Forgets the orders of the class statuses of this process.
+    """
+    _status_orders.clear()
+
+
 class Class(models.Model):
     """
     Mapping table class in Tandlr.
     """
+    #
+    # Stages of the acceptance of the session, see
+    # ```tandlr.scheduled_classes.acceptance```.
+    #
+    PENDING_PAYMENT = 'pending_payment'
+    PAID = 'paid'
+    BILLED = 'billed'
+    CHAT_OPENED = 'chat_opened'
+    CONFIRMED = 'confirmed'
+    PAYMENT_FAILED = 'payment_failed'
+
+    ACCEPTANCE_CHOICES = (
+        (PENDING_PAYMENT, _('pending payment')),
+        (PAID, _('paid')),
+        (BILLED, _('billed')),
+        (CHAT_OPENED, _('chat opened')),
+        (CONFIRMED, _('confirmed')),
+        (PAYMENT_FAILED, _('payment failed')),
+    )
+
     teacher = models.ForeignKey(
         User,
         null=False,
@@ -190,12 +250,65 @@ class Class(models.Model):
         verbose_name='meeting now'
     )
 
+    acceptance_status = models.CharField(
+        max_length=20,
+        blank=True,
+        null=True,
+        choices=ACCEPTANCE_CHOICES,
+        verbose_name='acceptance status'
+    )
+
+    #
+    # Copy of the order of the status, so the lists of the sessions are
+    # sorted by an index of this table.
+    #
+    status_order = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='status order'
+    )
+
     objects = gismodels.GeoManager()
 
     class Meta:
         db_table = 'class'
         verbose_name = 'session'
         verbose_name_plural = 'sessions'
+        index_together = [
+            #
+            # Overlap lookups of the sessions of some teachers.
+            #
+            ('teacher', 'class_start_date', 'class_end_date'),
+            #
+            # Overlap lookups of the sessions of a student.
+            #
+            ('student', 'class_start_date', 'class_end_date'),
+            #
+            # Overlap lookups of the sessions of all the teachers.
+            #
+            ('class_start_date', 'class_end_date'),
+            #
+            # Scans of the lifecycle sweeper.
+            #
+            ('class_status', 'class_start_date'),
+            #
+            # Lists of the lessons of a student and the sessions of a
+            # teacher.
+            #
+            ('student', 'status_order', 'class_start_date'),
+            ('teacher', 'status_order', 'class_start_date'),
+        ]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+
+        if update_fields is None:
+            self.status_order = get_status_order(self.class_status_id)
+        elif set(update_fields) & set(['class_status', 'class_status_id']):
+            self.status_order = get_status_order(self.class_status_id)
+            kwargs['update_fields'] = list(update_fields) + ['status_order']
+
+        super(Class, self).save(*args, **kwargs)
 
     def __unicode__(self):
         return u'{0} - {1}'.format(
@@ -367,6 +480,153 @@ class RequestClassExtensionTime(models.Model):
         )
 
 
+class SessionTimer(models.Model):
+    """
+    Pending deadline of a session, see ```tandlr.scheduled_classes.timers```.
+
+    The timers are deleted when they are fired or cancelled, so the table
+    only holds the future events.
+    """
+    EXPIRE = 'expire'
+    AUTO_CLOSE = 'auto_close'
+    CHAT_EXPIRY = 'chat_expiry'
+
+    EVENT_CHOICES = (
+        (EXPIRE, _('expire unanswered request')),
+        (AUTO_CLOSE, _('end session on course')),
+        (CHAT_EXPIRY, _('close chat')),
+    )
+
+    session = models.ForeignKey(
+        Class,
+        related_name='timers'
+    )
+
+    event = models.CharField(
+        max_length=20,
+        choices=EVENT_CHOICES
+    )
+
+    due_date = models.DateTimeField(
+        db_index=True
+    )
+
+    class Meta:
+        db_table = 'session_timer'
+        unique_together = ('session', 'event')
+
+    def __unicode__(self):
+        return u'{0} - {1} - {2}'.format(
+            self.session_id,
+            self.event,
+            self.due_date
+        )
+
+
+class SessionReminder(models.Model):
+    """
+    Marks that the reminder of a session was sent to one of its
+    participants, see ```tandlr.scheduled_classes.reminders```.
+    """
+    session = models.ForeignKey(
+        Class,
+        related_name='reminders'
+    )
+
+    receiver = models.ForeignKey(
+        User,
+        related_name='session_reminders'
+    )
+
+    created_date = models.DateTimeField(
+        auto_now_add=True
+    )
+
+    class Meta:
+        db_table = 'session_reminder'
+        unique_together = ('session', 'receiver')
+
+
+#
+# Days of the recurring slots, in the order of ```date.weekday()```. Every
+# day is a bit of ```Slot.week_days```, monday is the lowest one.
+#
+WEEK_DAYS = [
+    'monday', 'tuesday', 'wednesday', 'thursday',
+    'friday', 'saturday', 'sunday'
+]
+
+
+def week_day_bit(week_day):
+    """
+    Returns the bit of the given day (0 is monday) in ```Slot.week_days```.
+    """
+    return 1 << week_day
+
+
+def minute_of_day(value):
+    return value.hour * 60 + value.minute
+
+
+class SlotQuerySet(models.QuerySet):
+    """
+    Lookups of the slots by their ```week_days``` bitmask and their
+    ```start_minute``` and ```end_minute``` integers.
+    """
+
+    def on_week_days(self, week_days):
+        """
+        Returns the recurring slots defined for any of the days of the given
+        bitmask.
+        """
+        return self.extra(
+            where=['{0} & %s != 0'.format(self._column('week_days'))],
+            params=[week_days]
+        )
+
+    def on_date(self, date):
+        """
+        Returns the unique slots of the given date and the recurring slots of
+        its week day.
+        """
+        return self.extra(
+            where=[
+                '({0} AND {1} = %s) OR (NOT {0} AND {2} & %s != 0)'.format(
+                    self._column('is_unique'),
+                    self._column('date'),
+                    self._column('week_days')
+                )
+            ],
+            params=[date, week_day_bit(date.weekday())]
+        )
+
+    def overlapping(self, start_minute, end_minute):
+        """
+        Returns the slots whose time overlaps the given minutes of the day.
+        """
+        return self.filter(
+            start_minute__lt=end_minute,
+            end_minute__gt=start_minute
+        )
+
+    def covering(self, start_minute, end_minute):
+        """
+        Returns the slots whose time contains the given minutes of the day.
+        """
+        return self.filter(
+            start_minute__lte=start_minute,
+            end_minute__gte=end_minute
+        )
+
+    def _column(self, name):
+        quote_name = connection.ops.quote_name
+
+        return '{0}.{1}'.format(
+            quote_name(self.model._meta.db_table),
+            quote_name(self.model._meta.get_field(name).column)
+        )
+
+
 class Slot(models.Model):
     teacher = models.ForeignKey(
         User,
@@ -392,6 +652,58 @@ class Slot(models.Model):
     saturday = models.BooleanField(default=False)
     sunday = models.BooleanField(default=False)
 
+    #
+    # Indexed copies of the days and times above, they are computed on
+    # save, see ```SlotQuerySet```.
+    #
+    week_days = models.PositiveSmallIntegerField(default=0)
+    start_minute = models.PositiveSmallIntegerField(default=0)
+    end_minute = models.PositiveSmallIntegerField(default=0)
+
+    objects = SlotQuerySet.as_manager()
+
+    class Meta:
+        index_together = [
+            #
+            # Overlap lookups of the slots of a teacher.
+            #
+            ('teacher', 'start_minute', 'end_minute'),
+            #
+            # Lookups of the slots of all the teachers that cover a time.
+            #
+            ('start_minute', 'end_minute'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.week_days = self.get_week_days()
+        self.start_minute = minute_of_day(self.start_time)
+        self.end_minute = minute_of_day(self.end_time)
+
+        super(Slot, self).save(*args, **kwargs)
+
+    def get_week_days(self):
+        """
+        Returns the bitmask of the days of the recurring slot, the unique
+        slots don't have days.
+        """
+        if self.is_unique:
+            return 0
+
+        return sum(
+            week_day_bit(week_day)
+            for week_day, day in enumerate(WEEK_DAYS)
+            if getattr(self, day)
+        )
+
+    def applies_to(self, date):
+        """
+        Tells whether the slot is defined for the given date.
+        """
+        if self.is_unique:
+            return self.date == date
+
+        return bool(self.week_days & week_day_bit(date.weekday()))
+
     def __unicode__(self):
 
         days = [
@@ -430,3 +742,45 @@ class Slot(models.Model):
             )
             return teacher_availability
 
+
+class TeacherAvailability(models.Model):
+    """
+    Materialized free interval of a teacher.
+
+    Every row is a concrete occurrence of a slot minus the sessions booked on
+    it, for the next weeks (see ```tandlr.scheduled_classes.freebusy```). The
+    dates are stored as wall clock times, the same way slots are defined.
+    """
+    teacher = models.ForeignKey(
+        User,
+        related_name='availability'
+    )
+
+    slot = models.ForeignKey(
+        Slot,
+        related_name='occurrences'
+    )
+
+    start_date = models.DateTimeField(
+        verbose_name=_('start date')
+    )
+
+    end_date = models.DateTimeField(
+        verbose_name=_('end date')
+    )
+
+    class Meta:
+        db_table = 'teacher_availability'
+        verbose_name = _('teacher availability')
+        verbose_name_plural = _('teachers availability')
+        index_together = [
+            ('start_date', 'end_date'),
+            ('teacher', 'start_date'),
+        ]
+
+    def __unicode__(self):
+        return u'{0}: {1} - {2}'.format(
+            self.teacher_id,
+            self.start_date,
+            self.end_date
+        )
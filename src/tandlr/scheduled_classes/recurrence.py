@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Recurring bookings of the lessons.
+
+A student books all the occurrences of a recurrence rule (every day or
+every n weeks, a number of times or until a date) with a single request:
+
+    - The occurrences are checked against the sessions of the teacher and
+      the student with a single query (see
+      ```tandlr.scheduled_classes.conflicts.get_conflicts```).
+    - The sessions are created with a single ```INSERT```, their timers with
+      another one, and the calendar of the teacher is refreshed once.
+    - The teacher gets one notification and one email for all of them.
+
+The recurring sessions are always created as scheduled, the teacher accepts
+every one of them. The promotion code, if any, is only applied to the first
+occurrence.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from tandlr.notifications.models import Notification
+from tandlr.reports.models import SessionSummary
+from tandlr.scheduled_classes import tasks, timers
+from tandlr.scheduled_classes.lifecycle import SCHEDULED
+from tandlr.scheduled_classes.models import Class, get_status_order
+from tandlr.users.search_cache import bump_user_version
+
+
+DAILY = 'daily'
+WEEKLY = 'weekly'
+
+FREQUENCY_CHOICES = (
+    (DAILY, 'daily'),
+    (WEEKLY, 'weekly'),
+)
+
+FREQUENCY_DELTAS = {
+    DAILY: timedelta(days=1),
+    WEEKLY: timedelta(weeks=1),
+}
+
+
+def get_occurrences(start_datetime, end_datetime, frequency, interval=1,
+                    count=None, until=None):
+    """
+    Returns the (start, end) of the occurrences of the given session, at
+    most RECURRING_LESSONS_MAX_OCCURRENCES.
+    """
+    step = FREQUENCY_DELTAS[frequency] * interval
+    limit = settings.RECURRING_LESSONS_MAX_OCCURRENCES
+
+    if count is not None:
+        limit = min(count, limit)
+
+    occurrences = []
+
+    while len(occurrences) < limit:
+        if until is not None and start_datetime > until:
+            break
+
+        occurrences.append((start_datetime, end_datetime))
+
+        start_datetime += step
+        end_datetime += step
+
+    return occurrences
+
+
+def book(validated_data, occurrences, request=None):
+    """
+    Creates the sessions of the given occurrences and notifies the teacher,
+    returns the sessions ordered by their start.
+
+    The exclusion constraints of the sessions reject the booking if a
+    concurrent request booked any of the occurrences.
+    """
+    promo_code = validated_data.pop('promo_code', None)
+    validated_data['class_status_id'] = SCHEDULED
+    validated_data.pop('class_status', None)
+
+    #
+    # The sessions aren't saved one by one, so their status order is set
+    # here.
+    #
+    validated_data['status_order'] = get_status_order(SCHEDULED)
+
+    sessions = []
+
+    for position, (start_datetime, end_datetime) in enumerate(occurrences):
+        session = Class(**validated_data)
+        session.class_start_date = start_datetime
+        session.class_end_date = end_datetime
+        session.promo_code = promo_code if position == 0 else None
+        sessions.append(session)
+
+    teacher = sessions[0].teacher
+
+    with transaction.atomic():
+        Class.objects.bulk_create(sessions)
+
+        #
+        # The ids of the new sessions aren't returned by bulk_create.
+        #
+        sessions = list(
+            Class.objects.filter(
+                teacher=teacher,
+                student=sessions[0].student,
+                class_status_id=SCHEDULED,
+                class_start_date__in=[start for start, _ in occurrences]
+            ).select_related(
+                'teacher',
+                'student',
+                'subject',
+                'class_status'
+            ).order_by(
+                'class_start_date'
+            )
+        )
+
+        timers.schedule_new(sessions)
+
+    tasks.refresh_teacher_availability.delay(teacher.id)
+    bump_user_version(teacher.id)
+
+    _count_sessions(len(sessions))
+    _notify_teacher(sessions, request)
+
+    return sessions
+
+
+def _count_sessions(count):
+    #
+    # Summary of the created sessions for the reports.
+    #
+    now = timezone.now().replace(minute=0, second=0, microsecond=0)
+
+    session_summary, created = SessionSummary.objects.get_or_create(
+        created_datetime=now,
+        defaults={'count': count}
+    )
+
+    if not created:
+        SessionSummary.objects.filter(
+            pk=session_summary.pk
+        ).update(
+            count=F('count') + count
+        )
+
+
+def _notify_teacher(sessions, request):
+    session = sessions[0]
+
+    context = {
+        'booking': session,
+        'bookings': sessions,
+        'request': request,
+        'fixed_date_time': (
+            session.class_start_date + timedelta(hours=session.time_zone_conf)
+        )
+    }
+
+    subject = render_to_string(
+        'email/booking/booking_recurring_created_teacher_subject.txt',
+        context
+    ).strip()
+    body = render_to_string(
+        'email/booking/booking_recurring_created_teacher.txt',
+        context
+    )
+    html = render_to_string(
+        'email/booking/booking_recurring_created_teacher.html',
+        context
+    )
+
+    Notification.objects.create(
+        receiver=session.teacher,
+        sender=session.student,
+        target_action=session.class_status.name.lower(),
+        target=session,
+        body=subject
+    )
+
+    session.teacher.email_user(subject, body, html=html)
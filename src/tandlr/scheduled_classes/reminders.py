@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Reminders of the upcoming sessions.
+
+The participants of the accepted sessions that start in the next
+SESSION_REMINDER_MINUTES get a notification, unless they disabled
+```UserSettings.session_reminder```.
+
+The sessions are read in chunks of SESSION_REMINDER_CHUNK_SIZE with a range
+query over the ```(class_status, class_start_date)``` index, paginated by
+(start date, id). For every chunk the settings of the participants are
+loaded with a single query and the ```SessionReminder``` markers and the
+notifications are created in bulk in the same transaction. A reminder that
+already has its marker is never sent again, and when two nodes send the
+same chunk at the same time the unique marker makes one of them roll back
+and skip it.
+
+The notifications of every chunk are pushed by a single
+```tandlr.notifications.tasks.send_push_notification_batch``` task.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from tandlr.notifications.models import Notification
+from tandlr.notifications.tasks import send_push_notification_batch
+from tandlr.scheduled_classes.lifecycle import ACCEPTED
+from tandlr.scheduled_classes.models import Class, SessionReminder
+from tandlr.users.models import UserSettings
+
+
+ACTION = 'reminder'
+
+
+def send_reminders(now=None):
+    """
+    Sends the reminders of the sessions that start soon, returns the number
+    of reminders sent.
+    """
+    now = now or timezone.now()
+    window_end = now + timedelta(minutes=settings.SESSION_REMINDER_MINUTES)
+    chunk_size = settings.SESSION_REMINDER_CHUNK_SIZE
+    last = None
+    sent = 0
+
+    while True:
+        sessions = Class.objects.filter(
+            class_status_id=ACCEPTED,
+            class_start_date__gt=now,
+            class_start_date__lte=window_end
+        )
+
+        if last is not None:
+            sessions = sessions.filter(
+                Q(class_start_date__gt=last[0]) |
+                Q(class_start_date=last[0], id__gt=last[1])
+            )
+
+        sessions = list(
+            sessions.order_by(
+                'class_start_date',
+                'id'
+            ).values_list(
+                'class_start_date',
+                'id',
+                'teacher_id',
+                'student_id'
+            )[:chunk_size]
+        )
+
+        if not sessions:
+            return sent
+
+        sent += send_chunk(
+            [session[1:] for session in sessions]
+        )
+
+        last = sessions[-1][:2]
+
+
+def send_chunk(sessions):
+    """
+    Sends the reminders of the given (id, teacher id, student id) sessions
+    that weren't sent yet. Returns the number of reminders sent.
+    """
+    session_ids = [session_id for session_id, _, _ in sessions]
+
+    try:
+        with transaction.atomic():
+            reminded = set(
+                SessionReminder.objects.filter(
+                    session_id__in=session_ids
+                ).values_list(
+                    'session_id',
+                    'receiver_id'
+                )
+            )
+
+            participants = set()
+
+            for session_id, teacher_id, student_id in sessions:
+                participants.add(teacher_id)
+                participants.add(student_id)
+
+            enabled = set(
+                UserSettings.objects.filter(
+                    user_id__in=participants,
+                    session_reminder=True
+                ).values_list(
+                    'user_id',
+                    flat=True
+                )
+            )
+
+            reminders = [
+                (session_id, receiver_id, sender_id)
+                for session_id, teacher_id, student_id in sessions
+                for receiver_id, sender_id in (
+                    (teacher_id, student_id),
+                    (student_id, teacher_id)
+                )
+                if receiver_id in enabled and
+                (session_id, receiver_id) not in reminded
+            ]
+
+            if not reminders:
+                return 0
+
+            SessionReminder.objects.bulk_create([
+                SessionReminder(session_id=session_id, receiver_id=receiver_id)
+                for session_id, receiver_id, _ in reminders
+            ])
+
+            body = render_to_string(
+                'email/booking/booking_reminder_subject.txt',
+                {}
+            ).strip()
+            target_type = ContentType.objects.get_for_model(Class)
+
+            Notification.objects.bulk_create([
+                Notification(
+                    receiver_id=receiver_id,
+                    sender_id=sender_id,
+                    target_type=target_type,
+                    target_id=session_id,
+                    target_action=ACTION,
+                    body=body
+                )
+                for session_id, receiver_id, sender_id in reminders
+            ])
+
+    except IntegrityError:
+        #
+        # Another node sent the reminders of this chunk at the same time.
+        #
+        return 0
+
+    send_push_notification_batch.delay(
+        target_type.pk,
+        sorted(set(session_id for session_id, _, _ in reminders)),
+        ACTION
+    )
+
+    return len(reminders)
@@ -3,7 +3,7 @@ from datetime import datetime, timedelta
 from decimal import Decimal
 
 from django.contrib.gis.geos import GEOSGeometry
-from django.db.models import Q
+from django.db import transaction
 from django.template.loader import render_to_string
 from django.utils import timezone
 
@@ -17,6 +17,8 @@ from tandlr.promotions.models import PromotionCode
 from tandlr.promotions.serializers import PromotionCodeV2Serializer
 from tandlr.reports.models import SessionSummary
 
+from tandlr.scheduled_classes import recurrence
+from tandlr.scheduled_classes.conflicts import get_conflict, get_conflicts
 from tandlr.scheduled_classes.utils import calculate_price_per_extrension_class
 from tandlr.stripe.utils import (
     generate_charge_description,
@@ -37,7 +39,9 @@ from .models import (
     RequestClassExtensionTime,
     Slot,
     Subject,
-    SubjectTeacher
+    SubjectTeacher,
+    minute_of_day,
+    week_day_bit
 )
 
 
@@ -581,38 +585,19 @@ class SessionBaseV2Serializer(ModelSerializer):
         """
         if self.context['view'].action == 'create':
             #
-            # Take only the sessions with status:
+            # Neither the teacher nor the student can have another busy
+            # session at the same time, see
+            # ```tandlr.scheduled_classes.conflicts```.
             #
-            #   id | name       |
-            #   -----------------
-            #    2 | Scheduled  |
-            #    3 | Acepted    |
-            #    4 | On course  |
-            #    6 | Pending    |
-            #
-            start_date = data['class_start_date']
-            end_date = data['class_end_date']
-
-            classes_at_same_time = Class.objects.filter(
-                (
-                    Q(class_start_date__gte=start_date) &
-                    Q(class_start_date__lt=end_date)
-                ) |
-                (
-                    Q(class_end_date__gt=start_date) &
-                    Q(class_end_date__lte=end_date)
-                ) |
-                (
-                    Q(class_start_date__lte=start_date) &
-                    Q(class_end_date__gte=end_date)
-                ),
-                class_status_id__in=[2, 3, 4, 6],
-            ).count()
-
-            if classes_at_same_time > 0:
-                raise serializers.ValidationError(
-                    'The student has lessons scheduled in this time'
-                )
+            conflict = get_conflict(
+                data['teacher'].id,
+                data['student'].id,
+                data['class_start_date'],
+                data['class_end_date']
+            )
+
+            if conflict is not None:
+                raise serializers.ValidationError(conflict)
 
         # If is an "on demand" session, validates if teacher is available .
         if 'meeting now' in data and data['meeting_now']:
@@ -756,7 +741,14 @@ class LessonV2Serializer(SessionBaseV2Serializer):
         fixed_date_time = (
             session.class_start_date + timedelta(hours=session.time_zone_conf)
         )
-        session.save()
+
+        #
+        # The exclusion constraints reject a session booked at the same time
+        # by a concurrent request, the savepoint keeps the transaction usable
+        # after the error.
+        #
+        with transaction.atomic():
+            session.save()
 
         #
         # If the status given is equals to 2 means that the lesson was created
@@ -1058,6 +1050,90 @@ class LessonV2Serializer(SessionBaseV2Serializer):
         return session
 
 
+class RecurringLessonV2Serializer(LessonV2Serializer):
+    """
+    Books all the occurrences of a recurrence rule, see
+    ```tandlr.scheduled_classes.recurrence```.
+    """
+    frequency = serializers.ChoiceField(
+        choices=recurrence.FREQUENCY_CHOICES,
+        write_only=True
+    )
+    interval = serializers.IntegerField(
+        min_value=1,
+        default=1,
+        write_only=True
+    )
+    count = serializers.IntegerField(
+        min_value=1,
+        required=False,
+        write_only=True
+    )
+    until = serializers.DateTimeField(
+        required=False,
+        write_only=True
+    )
+
+    class Meta(LessonV2Serializer.Meta):
+        fields = LessonV2Serializer.Meta.fields + (
+            'frequency',
+            'interval',
+            'count',
+            'until'
+        )
+
+    def validate(self, data):
+        data = super(RecurringLessonV2Serializer, self).validate(data)
+
+        if 'count' not in data and 'until' not in data:
+            raise serializers.ValidationError(
+                'The count or the until date of the recurrence is required'
+            )
+
+        occurrences = recurrence.get_occurrences(
+            data['class_start_date'],
+            data['class_end_date'],
+            data.pop('frequency'),
+            interval=data.pop('interval'),
+            count=data.pop('count', None),
+            until=data.pop('until', None)
+        )
+
+        if not occurrences:
+            raise serializers.ValidationError(
+                'The until date of the recurrence is before the start of '
+                'the session'
+            )
+
+        #
+        # All the occurrences are checked with a single query.
+        #
+        conflicts = get_conflicts(
+            data['teacher'].id,
+            data['student'].id,
+            occurrences
+        )
+
+        if conflicts:
+            raise serializers.ValidationError([
+                u'{0}: {1}'.format(start_datetime.isoformat(), message)
+                for start_datetime, _, message in conflicts
+            ])
+
+        data['occurrences'] = occurrences
+
+        return data
+
+    def create(self, validated_data):
+        occurrences = validated_data.pop('occurrences')
+
+        return recurrence.book(
+            validated_data,
+            occurrences,
+            request=self.context.get('request')
+        )
+
+
 class SessionV2Serializer(SessionBaseV2Serializer):
 
     def update(self, instance, validated_data):
@@ -1199,7 +1275,8 @@ class LessonListV2Serializer(ModelSerializer):
             'participants',
             'latitude',
             'longitude',
-            'meeting_now'
+            'meeting_now',
+            'acceptance_status'
         )
 
     def get_latitude(self, instance):
@@ -1241,6 +1318,7 @@ class SessionListV2Serializer(ModelSerializer):
             'participants',
             'latitude',
             'longitude',
+            'acceptance_status',
         )
 
 
@@ -1456,21 +1534,19 @@ class SlotV2Serializer(ModelSerializer):
 
         # Validating that the slot is not overlaping with another one.
         request = self.context['request']
-        time_overlaped_slots = Slot.objects.filter(
-            (Q(start_time__gte=start_time) & Q(start_time__lt=end_time)) |
-            (Q(end_time__gt=start_time) & Q(end_time__lte=end_time)) |
-            (Q(start_time__lte=start_time) & Q(end_time__gte=end_time)),
+        overlaped_slots = Slot.objects.filter(
             teacher=request.user
+        ).overlapping(
+            minute_of_day(start_time),
+            minute_of_day(end_time)
         )
 
         # Excluding current instance in the overlaped query (when updating).
         if self.instance:
-            time_overlaped_slots = time_overlaped_slots.exclude(
+            overlaped_slots = overlaped_slots.exclude(
                 id=self.instance.id
             )
 
-        conditions = []
-        q_conditions = Q()
         if is_unique:
             # When slot is unique, date should be provided.
             if date is None:
@@ -1480,49 +1556,23 @@ class SlotV2Serializer(ModelSerializer):
 
             # Validation that checks if date already exists, or the
             # week day overlaps with another date.
-            week_days = [
-                'monday', 'tuesday', 'wednesday', 'thursday',
-                'friday', 'saturday', 'sunday'
-            ]
-            week_day = date.weekday()
-
-            # Appending equivalent week day of given date.
-            conditions.append({week_days[week_day]: True})
-            # Appending specific date.
-            conditions.append({'date': date})
-
-            for condition in conditions:
-                q_conditions |= Q(**condition)
-
-            overlaped_slots_count = time_overlaped_slots.filter(
-                q_conditions
-            ).count()
+            overlaped_slots = overlaped_slots.on_date(date)
         else:
             # Validation that checks if the time of the given week days
             # don't overlaps with another slots.
+            week_days = sum(
+                week_day_bit(week_day)
+                for week_day, selected in enumerate([
+                    monday, tuesday, wednesday, thursday, friday, saturday,
+                    sunday
+                ])
+                if selected
+            )
+
+            if week_days:
+                overlaped_slots = overlaped_slots.on_week_days(week_days)
 
-            # Appending conditional week days that will be used to the filter.
-            if monday:
-                conditions.append({'monday': True})
-            if tuesday:
-                conditions.append({'tuesday': True})
-            if wednesday:
-                conditions.append({'wednesday': True})
-            if thursday:
-                conditions.append({'thursday': True})
-            if friday:
-                conditions.append({'friday': True})
-            if saturday:
-                conditions.append({'saturday': True})
-            if sunday:
-                conditions.append({'sunday': True})
-
-            for condition in conditions:
-                q_conditions |= Q(**condition)
-
-            overlaped_slots_count = time_overlaped_slots.filter(
-                q_conditions
-            ).count()
+        overlaped_slots_count = overlaped_slots.count()
 
         if overlaped_slots_count > 0:
             raise serializers.ValidationError(
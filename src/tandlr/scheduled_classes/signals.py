@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+from tandlr.users.candidates import get_index
+from tandlr.users.search_cache import bump_user_version
+
+from . import freebusy, tasks, timers
+from .models import Class, clear_status_orders
+
+
+def remember_stored_class_state(sender, instance, **kwargs):
+    """
+    Keeps the stored values of the session that affect the availability of
+    the teacher and its timers, to know after the save if they were changed.
+    They are only read when an existing session is saved, not every time a
+    session is loaded.
+    """
+    instance._stored_state = (
+        freebusy.get_stored_session_state(instance.pk)
+        if instance.pk is not None else None
+    )
+
+
+def _class_state_changed(instance, created):
+    return created or (
+        getattr(instance, '_stored_state', None) !=
+        freebusy.get_session_state(instance)
+    )
+
+
+def refresh_availability_on_slot_change(sender, instance, **kwargs):
+    """
+    Rebuilds the materialized calendar of the teacher when one of his slots
+    is saved or deleted.
+    """
+    tasks.refresh_teacher_availability.delay(instance.teacher_id)
+
+
+def refresh_availability_on_class_change(sender, instance, created,
+                                         **kwargs):
+    """
+    Rebuilds the materialized calendar of the teacher and invalidates the
+    cached searches when a session is booked or its status or dates change.
+    """
+    if _class_state_changed(instance, created):
+        tasks.refresh_teacher_availability.delay(
+            instance.teacher_id,
+            instance.pk,
+            freebusy.get_session_state(instance)
+        )
+        bump_user_version(instance.teacher_id)
+
+
+def refresh_availability_on_class_delete(sender, instance, **kwargs):
+    """
+    Rebuilds the materialized calendar of the teacher and invalidates the
+    cached searches when a session is deleted.
+    """
+    tasks.refresh_teacher_availability.delay(
+        instance.teacher_id,
+        instance.pk,
+        None
+    )
+    bump_user_version(instance.teacher_id)
+
+
+#
+# Fields of the slots and subjects of the teachers that feed the searches.
+#
+SEARCH_FIELDS = {
+    'slot': (
+        'teacher_id',
+        'start_time',
+        'end_time',
+        'is_unique',
+        'date',
+        'monday',
+        'tuesday',
+        'wednesday',
+        'thursday',
+        'friday',
+        'saturday',
+        'sunday',
+    ),
+    'subjectteacher': ('teacher_id', 'subject_id', 'status'),
+}
+
+
+def _search_state(instance):
+    return tuple(
+        getattr(instance, field)
+        for field in SEARCH_FIELDS[instance._meta.model_name]
+    )
+
+
+def remember_search_state(sender, instance, **kwargs):
+    """
+    Keeps the values of the slot or subject of the teacher that feed the
+    searches, to know later if they were changed.
+    """
+    instance._search_state = _search_state(instance)
+
+
+def invalidate_searches_on_teacher_change(sender, instance, created,
+                                          **kwargs):
+    """
+    Invalidates the cached searches of the university of the teacher when
+    one of his slots or subjects is created or the values that feed the
+    searches change. A slot or subject moved to another teacher invalidates
+    the searches of both teachers.
+    """
+    initial_state = getattr(instance, '_search_state', None)
+    state = _search_state(instance)
+
+    if created or initial_state != state:
+        bump_user_version(instance.teacher_id)
+
+        if initial_state is not None and (
+            initial_state[0] != instance.teacher_id
+        ):
+            bump_user_version(initial_state[0])
+
+    instance._search_state = state
+
+
+def invalidate_searches_on_teacher_delete(sender, instance, **kwargs):
+    """
+    Invalidates the cached searches of the university of the teacher when
+    one of his slots or subjects is deleted.
+    """
+    bump_user_version(instance.teacher_id)
+
+
+def remember_candidate_teacher(sender, instance, **kwargs):
+    """
+    Keeps the teacher of the subject, to know later if it was changed.
+    """
+    instance._candidate_teacher_id = instance.teacher_id
+
+
+def update_candidates_on_subject_change(sender, instance, **kwargs):
+    """
+    Updates the candidates of the teacher of the saved subject, and of its
+    previous teacher if it was moved.
+    """
+    teacher_ids = set([instance.teacher_id])
+    initial_teacher_id = getattr(instance, '_candidate_teacher_id', None)
+
+    if initial_teacher_id is not None:
+        teacher_ids.add(initial_teacher_id)
+
+    get_index().mark_changed(*teacher_ids)
+
+    instance._candidate_teacher_id = instance.teacher_id
+
+
+def update_candidates_on_subject_delete(sender, instance, **kwargs):
+    """
+    Removes the teacher from the candidates of the subject that he doesn't
+    impart anymore.
+    """
+    get_index().mark_changed(instance.teacher_id)
+
+
+def schedule_timers_on_class_change(sender, instance, created, **kwargs):
+    """
+    Replaces the timers of the session when it's booked or its status or
+    dates change, see ```tandlr.scheduled_classes.timers```.
+    """
+    if _class_state_changed(instance, created):
+        timers.schedule(instance)
+
+
+def update_status_order_on_status_change(sender, instance, **kwargs):
+    """
+    Copies the new order of the status to its sessions, and makes this
+    process read the orders of the statuses again.
+    """
+    clear_status_orders()
+
+    Class.objects.filter(
+        class_status=instance
+    ).exclude(
+        status_order=instance.order
+    ).update(
+        status_order=instance.order
+    )
@@ -1,24 +1,136 @@
 # -*- coding: utf-8 -*-
-from datetime import timedelta
+from celery import chain, task
 
-from celery import task
+from django.conf import settings
 
-from django.utils import timezone
+import stripe
 
-from tandlr.scheduled_classes.models import Class
+from tandlr.scheduled_classes import (
+    acceptance,
+    freebusy,
+    lifecycle,
+    reminders,
+    timers
+)
+from tandlr.users.search_cache import bump_user_version
 
 
 @task
-def check_sessions():
+def sweep_sessions():
     """
-    Reviews all the sessions in state "on course" (4) and the one that haven't
-    been closed in the last 4 hours are moved into state "finish" (5)
+    Applies the time driven transitions of the sessions: ends the sessions
+    on course for too long, rejects the requests that expired without an
+    answer and finishes their open extensions, see
+    ```tandlr.scheduled_classes.lifecycle```. It catches the sessions that
+    the session timers missed.
     """
-    now = timezone.localtime(timezone.now())
+    return lifecycle.sweep()
 
-    for session in Class.objects.filter(
-        class_status_id=4,
-        class_start_date__lte=(now - timedelta(hours=4))
+
+@task
+def fire_due_session_timers():
+    """
+    Fires the session timers that are already due, the ones that the
+    ```run_session_timers``` worker didn't fire on time.
+    """
+    return timers.fire_due()
+
+
+@task
+def send_session_reminders():
+    """
+    Reminds the participants of the accepted sessions that start soon, see
+    ```tandlr.scheduled_classes.reminders```.
+    """
+    return reminders.send_reminders()
+
+
+@task(bind=True, max_retries=10, default_retry_delay=1)
+def refresh_teacher_availability(self, teacher_id, session_id=None,
+                                 session_state=None):
+    """
+    Rebuilds the materialized availability calendar of the given teacher and
+    invalidates the cached searches computed with the previous one.
+
+    When a change of a session enqueues the refresh, the change may not be
+    committed yet: the task is retried until the session has the given state
+    in the database (None once it's deleted). If it never does, the change
+    was rolled back and the calendar is rebuilt anyway.
+    """
+    if (
+        session_id is not None and
+        self.request.retries < self.max_retries and
+        freebusy.get_stored_session_state(session_id) != session_state
     ):
-        session.class_status_id = 5
-        session.save()
+        raise self.retry()
+
+    freebusy.refresh_teacher_availability([teacher_id])
+    bump_user_version(teacher_id)
+
+
+@task
+def roll_forward_teacher_availability():
+    """
+    Removes the past occurrences of the availability calendar and extends it
+    up to the configured horizon.
+    """
+    freebusy.roll_forward()
+
+
+@task(
+    bind=True,
+    max_retries=settings.SESSION_ACCEPTANCE_RETRIES,
+    default_retry_delay=settings.SESSION_ACCEPTANCE_RETRY_DELAY
+)
+def charge_session(self, session_id):
+    """
+    Charges an accepted session, the connection and rate limit errors of
+    Stripe are retried with the same idempotency key.
+    """
+    try:
+        acceptance.charge(
+            session_id,
+            raise_transient=self.request.retries < self.max_retries
+        )
+    except (
+        stripe.error.APIConnectionError,
+        stripe.error.RateLimitError
+    ) as error:
+        raise self.retry(exc=error)
+
+
+@task
+def bill_session(session_id):
+    """
+    Bills a paid session to the balance of its teacher.
+    """
+    acceptance.bill(session_id)
+
+
+@task
+def open_session_chat(session_id):
+    """
+    Opens the chat of a billed session.
+    """
+    acceptance.open_chat(session_id)
+
+
+@task
+def notify_session_accepted(session_id):
+    """
+    Notifies the student that the session was accepted and paid.
+    """
+    acceptance.notify(session_id)
+
+
+def get_acceptance_pipeline(session_id):
+    """
+    Returns the stages of the acceptance of the given session, see
+    ```tandlr.scheduled_classes.acceptance```.
+    """
+    return chain(
+        charge_session.si(session_id),
+        bill_session.si(session_id),
+        open_session_chat.si(session_id),
+        notify_session_accepted.si(session_id)
+    )
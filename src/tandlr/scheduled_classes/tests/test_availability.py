@@ -0,0 +1,580 @@
+# -*- coding: utf-8 -*-
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.gis.geos import GEOSGeometry
+from django.core import mail
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from tandlr.catalogues.models import University
+from tandlr.notifications.models import Notification
+from tandlr.promotions.models import PromotionCode
+from tandlr.scheduled_classes import (
+    availability,
+    conflicts,
+    freebusy,
+    recurrence
+)
+from tandlr.scheduled_classes.models import (
+    Class,
+    SessionTimer,
+    Slot,
+    Subject,
+    SubjectTeacher,
+    TeacherAvailability
+)
+from tandlr.users.models import User
+
+
+class IntervalsTestCase(SimpleTestCase):
+    """
+    Tests for the interval arithmetic of the availability engine.
+    """
+    def test_merge_intervals(self):
+        self.assertEqual(
+            availability.merge_intervals([(5, 7), (1, 3), (2, 4), (7, 8)]),
+            [(1, 4), (5, 8)]
+        )
+
+    def test_subtract_intervals(self):
+        self.assertEqual(
+            availability.subtract_intervals((0, 10), [(2, 3), (5, 6)]),
+            [(0, 2), (3, 5), (6, 10)]
+        )
+        self.assertEqual(
+            availability.subtract_intervals((0, 10), [(-5, 4), (8, 12)]),
+            [(4, 8)]
+        )
+        self.assertEqual(
+            availability.subtract_intervals((0, 10), [(0, 10)]),
+            []
+        )
+
+    def test_first_free_start(self):
+        free = [
+            (datetime(2016, 9, 5, 8), datetime(2016, 9, 5, 8, 30)),
+            (datetime(2016, 9, 5, 10), datetime(2016, 9, 5, 12)),
+        ]
+
+        self.assertEqual(
+            availability.first_free_start(free, timedelta(hours=1)),
+            datetime(2016, 9, 5, 10)
+        )
+        self.assertIsNone(
+            availability.first_free_start(free, timedelta(hours=3))
+        )
+
+
+class AvailabilityTestMixin(object):
+    """
+    Builds the university, subject and student used by the availability
+    tests.
+    """
+    fixtures = ['class_status']
+
+    def setUp(self):
+        self.university = University.objects.create(
+            name='University',
+            initial='U'
+        )
+        self.subject = Subject.objects.create(
+            name='Math',
+            university=self.university
+        )
+        self.student = User.objects.create_user(
+            username='student',
+            email='student@example.com',
+            password='secret',
+            university=self.university
+        )
+
+        # Monday.
+        self.local_start = datetime(2030, 9, 2, 9, 0)
+        self.duration = timedelta(hours=1)
+
+    def create_teacher(self, username):
+        teacher = User.objects.create_user(
+            username=username,
+            email='{}@example.com'.format(username),
+            password='secret',
+            is_teacher=True,
+            university=self.university
+        )
+        SubjectTeacher.objects.create(teacher=teacher, subject=self.subject)
+
+        return teacher
+
+    def find(self):
+        return availability.find_available_teachers(
+            self.student,
+            self.subject.id,
+            self.local_start,
+            self.duration
+        )
+
+
+class FindAvailableTeachersTestCase(AvailabilityTestMixin, TestCase):
+    """
+    Tests for ```tandlr.scheduled_classes.availability
+    .find_available_teachers```.
+    """
+    def create_slots(self, teacher, count):
+        for index in range(count):
+            Slot.objects.create(
+                teacher=teacher,
+                start_time=time(8, 0),
+                end_time=time(12, 0),
+                is_unique=True,
+                date=date(2030, 9, 2) + timedelta(days=index % 8)
+            )
+
+    def test_returns_first_free_gap_after_requested_date(self):
+        teacher = self.create_teacher('teacher')
+        self.create_slots(teacher, 1)
+
+        Class.objects.create(
+            teacher=teacher,
+            student=self.student,
+            subject=self.subject,
+            class_start_date=timezone.make_aware(
+                datetime(2030, 9, 2, 9, 0), timezone.utc),
+            class_end_date=timezone.make_aware(
+                datetime(2030, 9, 2, 10, 0), timezone.utc),
+            class_time=time(1, 0),
+            class_status_id=3,
+            location=GEOSGeometry('SRID=4326;POINT(0 0)'),
+            time_zone_conf=0,
+            participants=1
+        )
+
+        available_dates = self.find()
+
+        self.assertEqual(len(available_dates), 1)
+        self.assertEqual(available_dates[0]['teacher'], teacher)
+        self.assertEqual(
+            available_dates[0]['date'],
+            datetime(2030, 9, 2, 10, 0)
+        )
+
+    def test_query_count_does_not_depend_on_slots(self):
+        teachers = [
+            self.create_teacher('teacher{}'.format(index))
+            for index in range(3)
+        ]
+
+        for teacher in teachers:
+            self.create_slots(teacher, 2)
+
+        with self.assertNumQueries(2):
+            self.assertEqual(len(self.find()), 3)
+
+        for teacher in teachers:
+            self.create_slots(teacher, 40)
+
+        with self.assertNumQueries(2):
+            self.assertEqual(len(self.find()), 3)
+
+
+class FreeBusyTestCase(AvailabilityTestMixin, TestCase):
+    """
+    Tests for the materialized calendar of
+    ```tandlr.scheduled_classes.freebusy```.
+    """
+    def setUp(self):
+        super(FreeBusyTestCase, self).setUp()
+
+        tomorrow = timezone.now().date() + timedelta(days=1)
+        self.local_start = datetime.combine(tomorrow, time(9, 0))
+
+    def test_calendar_matches_availability_engine(self):
+        teacher = self.create_teacher('teacher')
+        Slot.objects.create(
+            teacher=teacher,
+            start_time=time(8, 0),
+            end_time=time(12, 0),
+            is_unique=True,
+            date=self.local_start.date()
+        )
+        Class.objects.create(
+            teacher=teacher,
+            student=self.student,
+            subject=self.subject,
+            class_start_date=freebusy.to_wall_clock(self.local_start),
+            class_end_date=freebusy.to_wall_clock(
+                self.local_start + self.duration),
+            class_time=time(1, 0),
+            class_status_id=3,
+            location=GEOSGeometry('SRID=4326;POINT(0 0)'),
+            time_zone_conf=0,
+            participants=1
+        )
+
+        freebusy.refresh_teacher_availability([teacher.id])
+
+        self.assertEqual(
+            list(
+                TeacherAvailability.objects.order_by(
+                    'start_date'
+                ).values_list('start_date', 'end_date')
+            ),
+            [
+                (
+                    freebusy.to_wall_clock(
+                        datetime.combine(self.local_start, time(8, 0))),
+                    freebusy.to_wall_clock(self.local_start)
+                ),
+                (
+                    freebusy.to_wall_clock(self.local_start + self.duration),
+                    freebusy.to_wall_clock(
+                        datetime.combine(self.local_start, time(12, 0)))
+                ),
+            ]
+        )
+
+        with self.assertNumQueries(1):
+            occurrences = freebusy.find_available_occurrences(
+                self.student,
+                self.subject.id,
+                freebusy.to_wall_clock(self.local_start),
+                self.duration
+            )
+
+        self.assertEqual(occurrences, self.find())
+
+    def test_stored_session_state(self):
+        teacher = self.create_teacher('teacher')
+        session = Class.objects.create(
+            teacher=teacher,
+            student=self.student,
+            subject=self.subject,
+            class_start_date=freebusy.to_wall_clock(self.local_start),
+            class_end_date=freebusy.to_wall_clock(
+                self.local_start + self.duration),
+            class_time=time(1, 0),
+            class_status_id=3,
+            location=GEOSGeometry('SRID=4326;POINT(0 0)'),
+            time_zone_conf=0,
+            participants=1
+        )
+        session_id = session.id
+
+        self.assertEqual(
+            freebusy.get_stored_session_state(session_id),
+            freebusy.get_session_state(session)
+        )
+
+        session.class_status_id = 7
+
+        self.assertNotEqual(
+            freebusy.get_stored_session_state(session_id),
+            freebusy.get_session_state(session)
+        )
+
+        session.delete()
+
+        self.assertIsNone(freebusy.get_stored_session_state(session_id))
+
+        # The sessions without dates, like the one of the admin add form.
+        self.assertEqual(freebusy.get_session_state(Class())[1:], (None, None))
+
+
+class BusyTeachersTestCase(AvailabilityTestMixin, TestCase):
+    """
+    Tests for ```tandlr.scheduled_classes.availability
+    .get_busy_teachers_ids```.
+    """
+    def test_overlapping_sessions(self):
+        teacher = self.create_teacher('teacher')
+        start_date = timezone.make_aware(
+            datetime(2030, 9, 2, 9, 0), timezone.utc)
+
+        Class.objects.create(
+            teacher=teacher,
+            student=self.student,
+            subject=self.subject,
+            class_start_date=start_date,
+            class_end_date=start_date + timedelta(hours=1),
+            class_time=time(1, 0),
+            class_status_id=3,
+            location=GEOSGeometry('SRID=4326;POINT(0 0)'),
+            time_zone_conf=0,
+            participants=1
+        )
+
+        # Starts in the middle of the session.
+        self.assertEqual(
+            list(
+                availability.get_busy_teachers_ids(
+                    start_date + timedelta(minutes=30),
+                    start_date + timedelta(hours=2)
+                )
+            ),
+            [teacher.id]
+        )
+
+        # Starts when the session ends.
+        self.assertEqual(
+            list(
+                availability.get_busy_teachers_ids(
+                    start_date + timedelta(hours=1),
+                    start_date + timedelta(hours=2)
+                )
+            ),
+            []
+        )
+
+
+class ConflictsTestCase(AvailabilityTestMixin, TestCase):
+    """
+    Tests for ```tandlr.scheduled_classes.conflicts.get_conflict```.
+    """
+    def test_conflicts_of_the_participants(self):
+        teacher = self.create_teacher('teacher')
+        other_teacher = self.create_teacher('other')
+        other_student = User.objects.create_user(
+            username='other_student',
+            email='other_student@example.com',
+            password='secret',
+            university=self.university
+        )
+        start_date = timezone.make_aware(
+            datetime(2030, 9, 2, 9, 0), timezone.utc)
+        end_date = start_date + timedelta(hours=1)
+
+        Class.objects.create(
+            teacher=teacher,
+            student=self.student,
+            subject=self.subject,
+            class_start_date=start_date,
+            class_end_date=end_date,
+            class_time=time(1, 0),
+            class_status_id=3,
+            location=GEOSGeometry('SRID=4326;POINT(0 0)'),
+            time_zone_conf=0,
+            participants=1
+        )
+
+        self.assertEqual(
+            conflicts.get_conflict(
+                teacher.id,
+                other_student.id,
+                start_date + timedelta(minutes=30),
+                end_date + timedelta(minutes=30)
+            ),
+            conflicts.TEACHER_CONFLICT
+        )
+        self.assertEqual(
+            conflicts.get_conflict(
+                other_teacher.id,
+                self.student.id,
+                start_date,
+                end_date
+            ),
+            conflicts.STUDENT_CONFLICT
+        )
+
+        # Sessions of other participants don't matter.
+        self.assertIsNone(
+            conflicts.get_conflict(
+                other_teacher.id,
+                other_student.id,
+                start_date,
+                end_date
+            )
+        )
+
+        # Back to back sessions don't overlap.
+        self.assertIsNone(
+            conflicts.get_conflict(
+                teacher.id,
+                self.student.id,
+                end_date,
+                end_date + timedelta(hours=1)
+            )
+        )
+
+    def test_conflicts_of_the_occurrences(self):
+        teacher = self.create_teacher('teacher')
+        start_date = timezone.make_aware(
+            datetime(2030, 9, 2, 9, 0), timezone.utc)
+        end_date = start_date + timedelta(hours=1)
+
+        occurrences = recurrence.get_occurrences(
+            start_date,
+            end_date,
+            recurrence.WEEKLY,
+            count=4
+        )
+
+        self.assertEqual(
+            [start for start, _ in occurrences],
+            [start_date + timedelta(weeks=weeks) for weeks in range(4)]
+        )
+        self.assertEqual(
+            len(
+                recurrence.get_occurrences(
+                    start_date,
+                    end_date,
+                    recurrence.DAILY,
+                    interval=2,
+                    until=start_date + timedelta(days=5)
+                )
+            ),
+            3
+        )
+
+        Class.objects.create(
+            teacher=teacher,
+            student=self.student,
+            subject=self.subject,
+            class_start_date=start_date + timedelta(weeks=2, minutes=30),
+            class_end_date=end_date + timedelta(weeks=2, minutes=30),
+            class_time=time(1, 0),
+            class_status_id=3,
+            location=GEOSGeometry('SRID=4326;POINT(0 0)'),
+            time_zone_conf=0,
+            participants=1
+        )
+
+        self.assertEqual(
+            conflicts.get_conflicts(teacher.id, self.student.id, occurrences),
+            [
+                (
+                    start_date + timedelta(weeks=2),
+                    end_date + timedelta(weeks=2),
+                    conflicts.TEACHER_CONFLICT
+                )
+            ]
+        )
+
+
+class RecurringBookingTestCase(AvailabilityTestMixin, TestCase):
+    """
+    Tests for ```tandlr.scheduled_classes.recurrence.book```.
+    """
+    def test_book(self):
+        teacher = self.create_teacher('teacher')
+        promo_code = PromotionCode.objects.create(
+            code='PROMO',
+            discount=Decimal('20.00'),
+            expiration_date=timezone.now() + timedelta(days=30)
+        )
+        start_date = timezone.now() + timedelta(days=1)
+        occurrences = recurrence.get_occurrences(
+            start_date,
+            start_date + timedelta(hours=1),
+            recurrence.WEEKLY,
+            count=3
+        )
+
+        sessions = recurrence.book(
+            {
+                'teacher': teacher,
+                'student': self.student,
+                'subject': self.subject,
+                'class_start_date': start_date,
+                'class_end_date': start_date + timedelta(hours=1),
+                'class_time': time(1, 0),
+                'location': GEOSGeometry('SRID=4326;POINT(0 0)'),
+                'time_zone_conf': 0,
+                'participants': 1,
+                'promo_code': promo_code
+            },
+            occurrences
+        )
+
+        self.assertEqual(
+            [session.class_start_date for session in sessions],
+            [start for start, _ in occurrences]
+        )
+        self.assertEqual(
+            list(
+                Class.objects.order_by(
+                    'class_start_date'
+                ).values_list(
+                    'id',
+                    'class_status_id',
+                    'promo_code_id'
+                )
+            ),
+            [
+                (sessions[0].id, 2, promo_code.id),
+                (sessions[1].id, 2, None),
+                (sessions[2].id, 2, None)
+            ]
+        )
+        self.assertEqual(
+            sorted(
+                SessionTimer.objects.values_list(
+                    'session_id',
+                    'event',
+                    'due_date'
+                )
+            ),
+            sorted(
+                (session.id, SessionTimer.EXPIRE, session.class_start_date)
+                for session in sessions
+            )
+        )
+
+        # A single notification and email for all the occurrences.
+        notification = Notification.objects.get(receiver=teacher)
+        self.assertEqual(notification.target_id, sessions[0].id)
+        self.assertEqual(len(mail.outbox), 1)
+
+        html, _ = mail.outbox[0].alternatives[0]
+
+        for session in sessions:
+            self.assertIn(
+                session.class_start_date.strftime('%Y-%m-%d %H:%M'),
+                html
+            )
+
+
+class SlotQueriesTestCase(AvailabilityTestMixin, TestCase):
+    """
+    Tests for the week days and minutes lookups of ```Slot```.
+    """
+    def test_day_and_time_lookups(self):
+        teacher = self.create_teacher('teacher')
+        recurring = Slot.objects.create(
+            teacher=teacher,
+            start_time=time(8, 0),
+            end_time=time(12, 30),
+            monday=True,
+            wednesday=True
+        )
+        unique = Slot.objects.create(
+            teacher=teacher,
+            start_time=time(14, 0),
+            end_time=time(15, 0),
+            is_unique=True,
+            date=date(2030, 9, 3)
+        )
+
+        self.assertEqual(recurring.week_days, 0b101)
+        self.assertEqual(
+            (recurring.start_minute, recurring.end_minute),
+            (480, 750)
+        )
+        self.assertEqual(unique.week_days, 0)
+
+        # Monday and tuesday.
+        self.assertEqual(
+            list(Slot.objects.on_date(date(2030, 9, 2))),
+            [recurring]
+        )
+        self.assertEqual(
+            list(Slot.objects.on_date(date(2030, 9, 3))),
+            [unique]
+        )
+
+        self.assertEqual(
+            list(Slot.objects.on_week_days(0b110).covering(540, 600)),
+            [recurring]
+        )
+        self.assertEqual(
+            list(Slot.objects.overlapping(750, 840)),
+            []
+        )
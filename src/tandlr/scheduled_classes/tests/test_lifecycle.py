@@ -0,0 +1,479 @@
+# -*- coding: utf-8 -*-
+import json
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.gis.geos import GEOSGeometry
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+import httpretty
+
+from tandlr.chat.models import Chat
+from tandlr.notifications.models import Notification
+from tandlr.promotions.models import PromotionCode
+from tandlr.scheduled_classes import (
+    acceptance,
+    lifecycle,
+    reminders,
+    tasks,
+    timers
+)
+from tandlr.scheduled_classes.models import (
+    Class,
+    ClassBill,
+    ClassStatus,
+    RequestClassExtensionTime,
+    SessionTimer,
+    Subject,
+    get_status_order
+)
+from tandlr.scheduled_classes.tests.test_availability import (
+    AvailabilityTestMixin
+)
+from tandlr.scheduled_classes.utils import get_month_range
+from tandlr.stripe.models import StripeCard, StripeCharge, StripeCustomer
+from tandlr.stripe.tests.mocks import MockCharge
+from tandlr.users import search_cache
+
+
+@override_settings(SESSION_SWEEP_CHUNK_SIZE=2)
+class SweepTestCase(AvailabilityTestMixin, TestCase):
+    """
+    Tests for ```tandlr.scheduled_classes.lifecycle.sweep```.
+    """
+    def create_session(self, status_id, start_date):
+        return Class.objects.create(
+            teacher=self.teacher,
+            student=self.student,
+            subject=self.subject,
+            class_start_date=start_date,
+            class_end_date=start_date + timedelta(hours=1),
+            class_time=time(1, 0),
+            class_status_id=status_id,
+            location=GEOSGeometry('SRID=4326;POINT(0 0)'),
+            time_zone_conf=0,
+            participants=1
+        )
+
+    def test_sweep(self):
+        self.teacher = self.create_teacher('teacher')
+        now = timezone.now()
+
+        on_course = [
+            self.create_session(4, now - timedelta(hours=hours))
+            for hours in (5, 6, 7)
+        ]
+        recent = self.create_session(4, now - timedelta(hours=1))
+        expired = self.create_session(2, now - timedelta(minutes=10))
+        upcoming = self.create_session(6, now + timedelta(days=1))
+
+        extension = RequestClassExtensionTime.objects.create(
+            class_request=on_course[0],
+            time=time(0, 30),
+            accepted=True
+        )
+
+        lessons_as_student = self.student.user_summary.lessons_as_student
+        version = search_cache.get_version(self.university.id)
+
+        self.assertEqual(
+            lifecycle.sweep(now),
+            {'ended': 3, 'expired': 1, 'extensions': 0}
+        )
+
+        statuses = dict(Class.objects.values_list('id', 'class_status_id'))
+
+        for session in on_course:
+            self.assertEqual(statuses[session.id], 5)
+
+        self.assertEqual(statuses[recent.id], 4)
+        self.assertEqual(statuses[expired.id], 1)
+        self.assertEqual(statuses[upcoming.id], 6)
+
+        # The order of the new status is copied in the sessions.
+        self.assertEqual(
+            dict(Class.objects.values_list('id', 'status_order')),
+            dict(
+                Class.objects.values_list('id', 'class_status__order')
+            )
+        )
+
+        # The moved sessions skip the signals, the searches are invalidated
+        # by the sweeper.
+        self.assertNotEqual(
+            search_cache.get_version(self.university.id),
+            version
+        )
+
+        extension.refresh_from_db()
+        self.assertTrue(extension.finished)
+
+        self.student.user_summary.refresh_from_db()
+        self.assertEqual(
+            self.student.user_summary.lessons_as_student,
+            lessons_as_student + 3
+        )
+
+        self.assertEqual(
+            Notification.objects.filter(
+                receiver=self.student,
+                target_action='ended'
+            ).count(),
+            3
+        )
+
+        # Nothing is left for the next run.
+        self.assertEqual(
+            lifecycle.sweep(now),
+            {'ended': 0, 'expired': 0, 'extensions': 0}
+        )
+
+
+class TimersTestCase(AvailabilityTestMixin, TestCase):
+    """
+    Tests for ```tandlr.scheduled_classes.timers```.
+    """
+    def test_timing_wheel(self):
+        wheel = timers.TimingWheel(1000)
+        wheel.add('second', 1001)
+        wheel.add('hour', 1000 + 3600)
+        wheel.add('overdue', 900)
+
+        self.assertEqual(wheel.advance(1000), ['overdue'])
+        self.assertEqual(wheel.advance(1001), ['second'])
+        self.assertEqual(wheel.advance(1000 + 3599), [])
+        self.assertEqual(wheel.advance(1000 + 3600), ['hour'])
+
+    def test_timers_follow_the_status(self):
+        teacher = self.create_teacher('teacher')
+        start_date = timezone.now() + timedelta(hours=1)
+
+        session = Class.objects.create(
+            teacher=teacher,
+            student=self.student,
+            subject=self.subject,
+            class_start_date=start_date,
+            class_end_date=start_date + timedelta(hours=1),
+            class_time=time(1, 0),
+            class_status_id=2,
+            location=GEOSGeometry('SRID=4326;POINT(0 0)'),
+            time_zone_conf=0,
+            participants=1
+        )
+
+        self.assertEqual(
+            list(session.timers.values_list('event', 'due_date')),
+            [(SessionTimer.EXPIRE, start_date)]
+        )
+
+        # Nothing is due yet.
+        self.assertEqual(timers.fire_due(), 0)
+
+        self.assertEqual(timers.fire_due(start_date), 1)
+        self.assertEqual(
+            Class.objects.get(pk=session.pk).class_status_id,
+            1
+        )
+        self.assertFalse(session.timers.exists())
+
+    def test_timers_follow_the_changes_of_the_session(self):
+        teacher = self.create_teacher('teacher')
+        start_date = timezone.now() + timedelta(hours=1)
+
+        Class.objects.create(
+            teacher=teacher,
+            student=self.student,
+            subject=self.subject,
+            class_start_date=start_date,
+            class_end_date=start_date + timedelta(hours=1),
+            class_time=time(1, 0),
+            class_status_id=2,
+            location=GEOSGeometry('SRID=4326;POINT(0 0)'),
+            time_zone_conf=0,
+            participants=1
+        )
+
+        # The session is loaded again, like the endpoints that change it.
+        session = Class.objects.get()
+        start_date += timedelta(hours=2)
+        session.class_start_date = start_date
+        session.class_end_date = start_date + timedelta(hours=1)
+        session.save()
+
+        self.assertEqual(
+            list(session.timers.values_list('event', 'due_date')),
+            [(SessionTimer.EXPIRE, start_date)]
+        )
+
+        session.class_status_id = 3
+        session.save()
+
+        self.assertEqual(
+            dict(session.timers.values_list('event', 'due_date')),
+            {
+                SessionTimer.AUTO_CLOSE: timers.get_due_date(
+                    session,
+                    SessionTimer.AUTO_CLOSE
+                ),
+                SessionTimer.CHAT_EXPIRY: timers.get_due_date(
+                    session,
+                    SessionTimer.CHAT_EXPIRY
+                ),
+            }
+        )
+
+
+class StatusOrderTestCase(AvailabilityTestMixin, TestCase):
+    """
+    Tests for the orders of the statuses copied in the sessions.
+    """
+    def test_status_orders_are_cached(self):
+        start_date = timezone.now() + timedelta(hours=1)
+        session = Class.objects.create(
+            teacher=self.create_teacher('teacher'),
+            student=self.student,
+            subject=self.subject,
+            class_start_date=start_date,
+            class_end_date=start_date + timedelta(hours=1),
+            class_time=time(1, 0),
+            class_status_id=2,
+            location=GEOSGeometry('SRID=4326;POINT(0 0)'),
+            time_zone_conf=0,
+            participants=1
+        )
+
+        order = ClassStatus.objects.get(pk=3).order
+
+        # The orders were read by the save of the session.
+        with self.assertNumQueries(0):
+            self.assertEqual(get_status_order(3), order)
+
+        # A saved status is read again and copied in its sessions.
+        status = ClassStatus.objects.get(pk=2)
+        status.order = 99
+        status.save()
+
+        self.assertEqual(get_status_order(2), 99)
+        self.assertEqual(
+            Class.objects.get(pk=session.pk).status_order,
+            99
+        )
+
+
+class RemindersTestCase(AvailabilityTestMixin, TestCase):
+    """
+    Tests for ```tandlr.scheduled_classes.reminders.send_reminders```.
+    """
+    def test_reminders_are_sent_once(self):
+        teacher = self.create_teacher('teacher')
+        teacher.settings.session_reminder = False
+        teacher.settings.save()
+
+        now = timezone.now()
+
+        for minutes, status_id in ((30, 3), (45, 2), (90, 3)):
+            start_date = now + timedelta(minutes=minutes)
+            Class.objects.create(
+                teacher=teacher,
+                student=self.student,
+                subject=self.subject,
+                class_start_date=start_date,
+                class_end_date=start_date + timedelta(minutes=10),
+                class_time=time(0, 10),
+                class_status_id=status_id,
+                location=GEOSGeometry('SRID=4326;POINT(0 0)'),
+                time_zone_conf=0,
+                participants=1
+            )
+
+        # Only the student of the accepted session of the next hour.
+        self.assertEqual(reminders.send_reminders(now), 1)
+        self.assertEqual(reminders.send_reminders(now), 0)
+
+        self.assertEqual(
+            Notification.objects.filter(
+                target_action=reminders.ACTION
+            ).values_list(
+                'receiver_id',
+                flat=True
+            ).get(),
+            self.student.id
+        )
+
+
+class AcceptanceTestCase(TestCase):
+    """
+    Tests for ```tandlr.scheduled_classes.acceptance.get_amounts```.
+    """
+    def get_amounts(self, discount=None):
+        session = Class(
+            subject=Subject(price_per_hour=Decimal('10.00')),
+            class_time=time(1, 30)
+        )
+
+        if discount is not None:
+            session.promo_code = PromotionCode(discount=Decimal(discount))
+
+        return acceptance.get_amounts(session)
+
+    def test_get_amounts(self):
+        self.assertEqual(
+            self.get_amounts(),
+            (Decimal('15.00'), Decimal('15.00'))
+        )
+        self.assertEqual(
+            self.get_amounts('20'),
+            (Decimal('15.00'), Decimal('12.00'))
+        )
+        self.assertEqual(
+            self.get_amounts('99'),
+            (Decimal('15.00'), acceptance.MINIMUM_CHARGE)
+        )
+        self.assertEqual(
+            self.get_amounts('100'),
+            (Decimal('15.00'), Decimal('0'))
+        )
+
+
+class AcceptancePipelineTestCase(AvailabilityTestMixin, TestCase):
+    """
+    Tests for the acceptance pipeline of an accepted session, the requests
+    to Stripe are mocked.
+    """
+    def setUp(self):
+        super(AcceptancePipelineTestCase, self).setUp()
+
+        charge = json.loads(MockCharge().getCharge())
+        self.charge_id = charge['id']
+
+        customer = StripeCustomer.objects.create(
+            user=self.student,
+            customer_id=charge['customer'],
+            default_source=charge['source']['id']
+        )
+        StripeCard.objects.create(
+            customer=customer,
+            card_id=charge['source']['id'],
+            exp_month=charge['source']['exp_month'],
+            exp_year=charge['source']['exp_year']
+        )
+
+        start_date = timezone.now() + timedelta(days=1)
+        self.session = Class.objects.create(
+            teacher=self.create_teacher('teacher'),
+            student=self.student,
+            subject=self.subject,
+            class_start_date=start_date,
+            class_end_date=start_date + timedelta(hours=1),
+            class_time=time(1, 0),
+            class_status_id=2,
+            location=GEOSGeometry('SRID=4326;POINT(0 0)'),
+            time_zone_conf=0,
+            participants=1
+        )
+        acceptance.accept(self.session)
+
+    def register_charge(self, body, status):
+        httpretty.register_uri(
+            httpretty.POST,
+            'https://api.stripe.com/v1/charges',
+            body=body,
+            status=status
+        )
+
+    def run_pipeline(self):
+        tasks.get_acceptance_pipeline(self.session.pk).apply()
+
+        return Class.objects.get(pk=self.session.pk)
+
+    def test_chain_order(self):
+        self.assertEqual(
+            [
+                signature.task
+                for signature in tasks.get_acceptance_pipeline(
+                    self.session.pk
+                ).tasks
+            ],
+            [
+                tasks.charge_session.name,
+                tasks.bill_session.name,
+                tasks.open_session_chat.name,
+                tasks.notify_session_accepted.name,
+            ]
+        )
+
+    @httpretty.activate
+    def test_stages_run_once(self):
+        self.register_charge(MockCharge().getCharge(), 200)
+
+        session = self.run_pipeline()
+
+        self.assertEqual(session.acceptance_status, Class.CONFIRMED)
+        self.assertEqual(
+            ClassBill.objects.get(session=session).charge_id,
+            self.charge_id
+        )
+        self.assertTrue(Chat.objects.filter(session=session).exists())
+
+        requests = len(httpretty.HTTPretty.latest_requests)
+
+        # Every stage finds the session past its step.
+        self.run_pipeline()
+
+        self.assertEqual(len(httpretty.HTTPretty.latest_requests), requests)
+        self.assertEqual(
+            StripeCharge.objects.filter(related_class=session).count(),
+            1
+        )
+        self.assertEqual(ClassBill.objects.filter(session=session).count(), 1)
+        self.assertEqual(
+            Notification.objects.filter(
+                receiver=self.student,
+                target_action='accepted'
+            ).count(),
+            1
+        )
+
+    @httpretty.activate
+    def test_payment_failure(self):
+        self.register_charge(
+            json.dumps({
+                'error': {
+                    'type': 'card_error',
+                    'code': 'card_declined',
+                    'message': 'Your card was declined.'
+                }
+            }),
+            402
+        )
+
+        session = self.run_pipeline()
+
+        self.assertEqual(session.class_status_id, lifecycle.CANCELLED)
+        self.assertEqual(session.acceptance_status, Class.PAYMENT_FAILED)
+
+        # The next stages don't run for the cancelled session.
+        self.assertFalse(ClassBill.objects.filter(session=session).exists())
+        self.assertFalse(Chat.objects.filter(session=session).exists())
+        self.assertEqual(
+            Notification.objects.filter(
+                receiver=self.student,
+                target_action='payment error'
+            ).count(),
+            1
+        )
+
+
+class MonthRangeTestCase(SimpleTestCase):
+    """
+    Tests for ```tandlr.scheduled_classes.utils.get_month_range```.
+    """
+    def test_get_month_range(self):
+        self.assertEqual(
+            get_month_range('2016', '12'),
+            (
+                timezone.make_aware(datetime(2016, 12, 1), timezone.utc),
+                timezone.make_aware(datetime(2017, 1, 1), timezone.utc)
+            )
+        )
@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+"""
+Deadlines of the sessions.
+
+When a session is booked, accepted, started, rescheduled or closed its
+pending deadlines are replaced by the ones of its new status
+(```SessionTimer``` rows, indexed by their due date):
+
+    - expire: the scheduled (2) and pending (6) requests are rejected at
+      their start if nobody answered them.
+    - auto_close: the sessions on course (4) are ended
+      SESSION_AUTO_FINISH_HOURS after their start.
+    - chat_expiry: the chat of the accepted, on course and ended sessions
+      is closed one day after their end (see ```Chat.expiration_date```).
+
+The timers are fired by the ```run_session_timers``` command, a worker
+that keeps the timers due in the next SESSION_TIMERS_HORIZON seconds in a
+hierarchical timing wheel, so the database is only read once per horizon
+and every timer is fired on its second. The ```fire_due_session_timers```
+task fires the timers that are already due, in case the worker is down.
+
+A timer is deleted by the transaction that claims it, so it's never fired
+twice.
+"""
+import calendar
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from tandlr.chat.models import Chat
+from tandlr.scheduled_classes import lifecycle
+from tandlr.scheduled_classes.models import Class, SessionTimer
+
+
+#
+# Events of the sessions in every status.
+#
+STATUS_EVENTS = {
+    lifecycle.SCHEDULED: [SessionTimer.EXPIRE],
+    lifecycle.PENDING: [SessionTimer.EXPIRE],
+    lifecycle.ACCEPTED: [SessionTimer.AUTO_CLOSE, SessionTimer.CHAT_EXPIRY],
+    lifecycle.ON_COURSE: [SessionTimer.AUTO_CLOSE, SessionTimer.CHAT_EXPIRY],
+    lifecycle.ENDED: [SessionTimer.CHAT_EXPIRY],
+}
+
+CHAT_LIFETIME = timedelta(days=1)
+
+
+def get_due_date(session, event):
+    if event == SessionTimer.EXPIRE:
+        return session.class_start_date
+
+    if event == SessionTimer.AUTO_CLOSE:
+        return session.class_start_date + timedelta(
+            hours=settings.SESSION_AUTO_FINISH_HOURS
+        )
+
+    return session.class_end_date + CHAT_LIFETIME
+
+
+def schedule(session):
+    """
+    Replaces the timers of the given session by the ones of its status.
+    """
+    events = STATUS_EVENTS.get(session.class_status_id, [])
+
+    with transaction.atomic():
+        SessionTimer.objects.filter(
+            session=session
+        ).exclude(
+            event__in=events
+        ).delete()
+
+        for event in events:
+            SessionTimer.objects.update_or_create(
+                session=session,
+                event=event,
+                defaults={'due_date': get_due_date(session, event)}
+            )
+
+
+def schedule_new(sessions):
+    """
+    Creates the timers of the given sessions, which don't have any yet, with
+    a single query.
+    """
+    SessionTimer.objects.bulk_create([
+        SessionTimer(
+            session_id=session.id,
+            event=event,
+            due_date=get_due_date(session, event)
+        )
+        for session in sessions
+        for event in STATUS_EVENTS.get(session.class_status_id, [])
+    ])
+
+
+def cancel(session_id):
+    """
+    Deletes all the timers of the given session.
+    """
+    SessionTimer.objects.filter(session_id=session_id).delete()
+
+
+def expire_sessions(session_ids):
+    lifecycle.move_sessions(
+        Class.objects.filter(
+            id__in=session_ids,
+            class_status_id__in=[lifecycle.SCHEDULED, lifecycle.PENDING]
+        ),
+        lifecycle.REJECTED,
+        notify=lifecycle.notify_expired
+    )
+
+
+def close_sessions(session_ids):
+    lifecycle.move_sessions(
+        Class.objects.filter(
+            id__in=session_ids,
+            class_status_id=lifecycle.ON_COURSE
+        ),
+        lifecycle.ENDED,
+        notify=lifecycle.notify_ended
+    )
+
+
+def close_chats(session_ids):
+    Chat.objects.filter(
+        session_id__in=session_ids,
+        is_active=True
+    ).update(
+        is_active=False
+    )
+
+
+HANDLERS = {
+    SessionTimer.EXPIRE: expire_sessions,
+    SessionTimer.AUTO_CLOSE: close_sessions,
+    SessionTimer.CHAT_EXPIRY: close_chats,
+}
+
+
+def fire(timer_ids, now=None):
+    """
+    Fires the given timers that are due and deletes them. The handlers get
+    the ids of all the sessions of an event at once.
+
+    Returns the number of fired timers.
+    """
+    now = now or timezone.now()
+    sessions_by_event = defaultdict(list)
+
+    #
+    # The timers are claimed (locked and deleted) first, the handlers run
+    # after the commit with their own transactions, so the tasks that they
+    # enqueue see their changes.
+    #
+    with transaction.atomic():
+        timers = list(
+            SessionTimer.objects.select_for_update().filter(
+                id__in=list(timer_ids),
+                due_date__lte=now
+            ).values_list(
+                'id',
+                'event',
+                'session_id'
+            )
+        )
+
+        SessionTimer.objects.filter(
+            id__in=[timer_id for timer_id, _, _ in timers]
+        ).delete()
+
+    for _, event, session_id in timers:
+        sessions_by_event[event].append(session_id)
+
+    for event, session_ids in sessions_by_event.items():
+        HANDLERS[event](session_ids)
+
+    return len(timers)
+
+
+def fire_due(now=None):
+    """
+    Fires all the timers that are already due, chunk by chunk. Returns the
+    number of fired timers.
+    """
+    now = now or timezone.now()
+    fired = 0
+
+    while True:
+        timer_ids = list(
+            SessionTimer.objects.filter(
+                due_date__lte=now
+            ).order_by(
+                'due_date'
+            ).values_list(
+                'id',
+                flat=True
+            )[:settings.SESSION_SWEEP_CHUNK_SIZE]
+        )
+
+        if not timer_ids:
+            return fired
+
+        fired += fire(timer_ids, now)
+
+
+class TimingWheel(object):
+    """
+    Hierarchical timing wheel of one second ticks.
+
+    The first wheel has a slot per second of the next minute, the second
+    one a slot per minute of the next hour and the last one a slot per hour
+    of the next day. Adding a timer and advancing a tick are constant time:
+    the timers of a slot of an upper wheel are moved to the lower wheels
+    when the time reaches the slot.
+    """
+    WHEELS = (60, 60, 24)
+
+    def __init__(self, now):
+        self.current = int(now)
+        self.wheels = [[[] for _ in range(size)] for size in self.WHEELS]
+        self.spans = []
+        self.overdue = []
+
+        span = 1
+
+        for size in self.WHEELS:
+            self.spans.append(span)
+            span *= size
+
+    def add(self, timer_id, due):
+        """
+        Adds a timer due at the given timestamp.
+        """
+        due = int(due)
+        delay = due - self.current
+
+        if delay <= 0:
+            self.overdue.append(timer_id)
+            return
+
+        for level, size in enumerate(self.WHEELS):
+            span = self.spans[level]
+
+            if delay < span * size:
+                self.wheels[level][(due // span) % size].append(
+                    (timer_id, due)
+                )
+                return
+
+        raise ValueError('The timer is out of the range of the wheel.')
+
+    def advance(self, now):
+        """
+        Advances the wheel up to the given timestamp, returns the ids of the
+        timers that expired.
+        """
+        expired, self.overdue = self.overdue, []
+
+        while self.current < int(now):
+            self.current += 1
+
+            # The upper wheels go first, so a timer can go down several.
+            for level in range(len(self.WHEELS) - 1, 0, -1):
+                span = self.spans[level]
+
+                if self.current % span == 0:
+                    slot = (self.current // span) % self.WHEELS[level]
+                    timers = self.wheels[level][slot]
+                    self.wheels[level][slot] = []
+
+                    for timer_id, due in timers:
+                        self.add(timer_id, due)
+
+            slot = self.current % self.WHEELS[0]
+            expired.extend(timer_id for timer_id, _ in self.wheels[0][slot])
+            self.wheels[0][slot] = []
+
+            expired.extend(self.overdue)
+            self.overdue = []
+
+        return expired
+
+
+class TimerWorker(object):
+    """
+    Fires the session timers on time. The timers due in the next
+    SESSION_TIMERS_HORIZON seconds are loaded in a ```TimingWheel```, every
+    second the expired ones are fired with a single transaction.
+
+    The timers created for a period that was already loaded are fired by
+    the next ```fire_due``` (on the next load or by the periodic task).
+    """
+
+    def __init__(self):
+        self.horizon = timedelta(seconds=settings.SESSION_TIMERS_HORIZON)
+        self.loaded_until = None
+        self.wheel = None
+
+    def load(self, now):
+        until = now + self.horizon
+        timers = SessionTimer.objects.filter(due_date__lt=until)
+
+        if self.loaded_until is not None:
+            timers = timers.filter(due_date__gte=self.loaded_until)
+
+        for timer_id, due_date in timers.values_list('id', 'due_date'):
+            self.wheel.add(timer_id, _timestamp(due_date))
+
+        self.loaded_until = until
+
+    def tick(self, now=None):
+        """
+        Loads the next timers when half of the loaded period has passed and
+        fires the expired ones. Returns the number of fired timers.
+        """
+        now = now or timezone.now()
+        fired = 0
+
+        if self.wheel is None:
+            self.wheel = TimingWheel(_timestamp(now))
+
+        if (
+            self.loaded_until is None or
+            now >= self.loaded_until - self.horizon / 2
+        ):
+            fired += fire_due(now)
+            self.load(now)
+
+        expired = self.wheel.advance(_timestamp(now))
+
+        if expired:
+            fired += fire(expired, now)
+
+        return fired
+
+    def run(self):
+        while True:
+            self.tick()
+            time.sleep(1)
+
+
+def _timestamp(value):
+    return calendar.timegm(value.utctimetuple())
@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
+from datetime import datetime
 from decimal import Decimal as D
 
 from django.conf import settings
+from django.utils import timezone
 
 
 def calculate_price_per_extrension_class(price_per_hour, time):
@@ -15,3 +17,27 @@ def calculate_price_per_extrension_class(price_per_hour, time):
     price = minutes_price + hours_price
 
     return price.quantize(D(settings.MONEY_QUANTIZE_FORMAT))
+
+
+def get_month_range(year, month):
+    """
+    Returns the half open range [start, end) of the given month in the
+    current time zone, so the lookups of the dates of a month use the
+    indexes instead of extracting their month and year.
+    """
+    year = int(year)
+    month = int(month)
+    current_timezone = timezone.get_current_timezone()
+
+    if month == 12:
+        next_year, next_month = year + 1, 1
+    else:
+        next_year, next_month = year, month + 1
+
+    return (
+        timezone.make_aware(datetime(year, month, 1), current_timezone),
+        timezone.make_aware(
+            datetime(next_year, next_month, 1),
+            current_timezone
+        )
+    )
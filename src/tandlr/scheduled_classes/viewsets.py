@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import datetime
 
+from django.db import IntegrityError
 from django.shortcuts import get_object_or_404
 from django.template.loader import render_to_string
 
@@ -13,6 +14,7 @@ from rest_framework import (
 from rest_framework.response import Response
 
 from tandlr.notifications.models import Notification
+from tandlr.scheduled_classes.conflicts import get_integrity_conflict
 from tandlr.scheduled_classes.models import (
     Class,
     ClassStatus,
@@ -36,6 +38,26 @@ from tandlr.stripe.utils import generate_charge_description, make_stripe_charge
 from .utils import calculate_price_per_extrension_class
 
 
+def conflict_response(error):
+    """
+    Returns the response of a session that overlaps another busy session of
+    the teacher or the student, the ```IntegrityError``` raised by the
+    exclusion constraints. It must be called while handling the error, the
+    other errors are raised again.
+    """
+    conflict = get_integrity_conflict(error)
+
+    if conflict is None:
+        raise
+
+    return Response(
+        {
+            'non_field_errors': [conflict]
+        },
+        status=status.HTTP_400_BAD_REQUEST
+    )
+
+
 class SubjectViewSet(viewsets.ModelViewSet):
     serializer_class = SubjectSerializer
     queryset = Subject.objects.all()
@@ -85,9 +107,12 @@ class ClassViewSet(viewsets.ViewSet):
         if serializer.is_valid():
 
             # If is valid request, save.
-            serializer.create(
-                validated_data=serializer.validated_data
-            )
+            try:
+                serializer.create(
+                    validated_data=serializer.validated_data
+                )
+            except IntegrityError as error:
+                return conflict_response(error)
 
             return Response(
                 serializer.data,
@@ -308,7 +333,10 @@ class ClassViewSet(viewsets.ViewSet):
             # End to evaluate if making a stripe charge is needed.
 
             # If it's a valid request, save.
-            serializer.save()
+            try:
+                serializer.save()
+            except IntegrityError as error:
+                return conflict_response(error)
 
             return Response(
                 serializer.data,
@@ -522,7 +550,10 @@ class RequestClassExtensionTimeViewSet(viewsets.ModelViewSet):
             # End to evaluate if making a stripe charge is needed.
 
             # If it's a valid request, save.
-            serializer.save()
+            try:
+                serializer.save()
+            except IntegrityError as error:
+                return conflict_response(error)
 
             return Response(
                 serializer.data,
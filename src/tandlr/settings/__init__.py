@@ -183,6 +183,19 @@ CELERYBEAT_SCHEDULE = {
         'task': 'tandlr.notifications.push.apple.tasks'
                 '.disable_failed_ios_devices',
         'schedule': crontab(minute=0, hour=0)
+    },
+    'flush-presence': {
+        'task': 'tandlr.users.tasks.flush_presence',
+        'schedule': datetime.timedelta(seconds=30)
+    },
+    'dispatch-pending-notifications': {
+        'task': 'tandlr.notifications.tasks.dispatch_pending_notifications',
+        'schedule': datetime.timedelta(minutes=1)
+    },
+    'reconcile-unread-notification-counters': {
+        'task': 'tandlr.notifications.tasks'
+                '.reconcile_unread_notification_counters',
+        'schedule': crontab(minute=30, hour=3)
     }
 }
 
@@ -296,6 +309,35 @@ CORS_ORIGIN_ALLOW_ALL = False
 CORS_ORIGIN_WHITELIST = ()
 
 
+# Cache, shared by all the workers (see tandlr.users.search_cache).
+CACHES = {
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379/1',
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+        }
+    }
+}
+
+#
+# Seconds that the results of the teacher searches are cached, and max
+# seconds that a worker waits for a search computed by another one.
+#
+SEARCH_CACHE_TIMEOUT = 60
+
+SEARCH_CACHE_LOCK_TIMEOUT = 10
+
+#
+# The changes of the candidate index (see tandlr.users.candidates) are kept
+# in the cache for CANDIDATE_INDEX_LOG_TIMEOUT seconds. A process that
+# missed more than CANDIDATE_INDEX_LOG_SIZE changes rebuilds its index.
+#
+CANDIDATE_INDEX_LOG_SIZE = 1000
+
+CANDIDATE_INDEX_LOG_TIMEOUT = 3600
+
+
 # DJANGO CHANNELS CONFIGURATION
 CHANNEL_LAYERS = {
     "default": {
@@ -319,3 +361,158 @@ PRODUCTION = False
 # that are going to be covered by the report
 #
 REPORT_TIMESPAN = 2
+
+#
+# Number of weeks covered by the materialized availability calendar of the
+# teachers (see tandlr.scheduled_classes.freebusy).
+#
+TEACHER_AVAILABILITY_WEEKS = 4
+
+#
+# Default radius (km) and max number of results of the meeting now search of
+# teachers by distance.
+#
+MEETING_NOW_SEARCH_RADIUS = 10
+
+MEETING_NOW_SEARCH_LIMIT = 10
+
+#
+# Hours covered by each digest email of the searches without results, it
+# should divide 24.
+#
+UNMET_SEARCHES_DIGEST_HOURS = 24
+
+#
+# Presence store of the online teachers (see tandlr.users.presence), None
+# disables it and the meeting now searches read the location_user table.
+#
+PRESENCE_BACKEND = 'tandlr.users.presence.RedisPresenceBackend'
+
+# Size (degrees) of the geo buckets of the presence store.
+PRESENCE_BUCKET_SIZE = 0.1
+
+#
+# The position updates that moved less than PRESENCE_MIN_DISTANCE meters in
+# less than PRESENCE_MIN_INTERVAL seconds are dropped.
+#
+PRESENCE_MIN_DISTANCE = 25
+
+PRESENCE_MIN_INTERVAL = 60
+
+# Seconds that a teacher stays online after his last position update.
+PRESENCE_TTL = 900
+
+#
+# Weights of the features of the teachers ranking (see
+# tandlr.users.ranking) and max number of ranked teachers returned by the
+# searches.
+#
+TEACHER_RANKING_WEIGHTS = {
+    'rating': 0.5,
+    'sessions': 0.2,
+    'distance': 0.2,
+    'price': 0.1,
+}
+
+TEACHER_RANKING_LIMIT = 50
+
+#
+# Hours after their start when the sessions still on course are ended, and
+# number of sessions moved by every chunk of the lifecycle sweeper (see
+# tandlr.scheduled_classes.lifecycle).
+#
+SESSION_AUTO_FINISH_HOURS = 4
+
+SESSION_SWEEP_CHUNK_SIZE = 500
+
+#
+# Seconds of session timers loaded at once by the run_session_timers worker
+# (see tandlr.scheduled_classes.timers), at most a day.
+#
+SESSION_TIMERS_HORIZON = 300
+
+#
+# Minutes before their start when the participants of the sessions get their
+# reminder, and number of sessions reminded by every chunk (see
+# tandlr.scheduled_classes.reminders).
+#
+SESSION_REMINDER_MINUTES = 60
+
+SESSION_REMINDER_CHUNK_SIZE = 1000
+
+#
+# Maximum number of lessons booked by a recurring booking, half a year of
+# weekly lessons (see tandlr.scheduled_classes.recurrence).
+#
+RECURRING_LESSONS_MAX_OCCURRENCES = 26
+
+#
+# Retries of the charge of an accepted session when Stripe can't be reached,
+# and seconds between them (see tandlr.scheduled_classes.acceptance).
+#
+SESSION_ACCEPTANCE_RETRIES = 5
+
+SESSION_ACCEPTANCE_RETRY_DELAY = 60
+
+#
+# Hours while the cached validity of a Stripe card is trusted by the bookings
+# (see tandlr.stripe.validity).
+#
+STRIPE_CARD_VALIDITY_HOURS = 24
+
+#
+# Refunds of the cancelled sessions (see tandlr.stripe.refunds): intents
+# claimed by every batch, initial number of concurrent requests to Stripe,
+# attempts of every refund, seconds before the first retry (doubled on every
+# attempt) and seconds before the intents of a dead worker are claimed again.
+#
+STRIPE_REFUND_BATCH_SIZE = 100
+
+STRIPE_REFUND_CONCURRENCY = 4
+
+STRIPE_REFUND_MAX_ATTEMPTS = 5
+
+STRIPE_REFUND_RETRY_DELAY = 60
+
+STRIPE_REFUND_PROCESSING_TIMEOUT = 600
+
+#
+# Connections to the APNs gateway kept open by every worker process, and
+# seconds before an idle one is closed (see
+# tandlr.notifications.push.apple.pool).
+#
+APNS_POOL_SIZE = 2
+
+APNS_POOL_IDLE_TIMEOUT = 300
+
+#
+# Devices notified by every chunk of a mass notification, retries of a chunk
+# when the APNs can't be reached and seconds between them (see
+# tandlr.notifications.tasks).
+#
+MASS_NOTIFICATION_CHUNK_SIZE = 1000
+
+MASS_NOTIFICATION_RETRIES = 3
+
+MASS_NOTIFICATION_RETRY_DELAY = 30
+
+#
+# Pending notifications pushed by every batch of the dispatcher, and seconds
+# between the batches that weren't full (see tandlr.notifications.dispatch).
+#
+NOTIFICATION_DISPATCH_BATCH_SIZE = 500
+
+NOTIFICATION_DISPATCH_INTERVAL = 0.2
+
+#
+# Users whose unread notification counters are reconciled by every chunk
+# (see tandlr.notifications.counters).
+#
+NOTIFICATION_COUNTER_CHUNK_SIZE = 1000
+
+#
+# Seconds while the notifications of a receiver about the same target are
+# merged in a single push, 0 disables the coalescing (see
+# tandlr.notifications.dispatch).
+#
+NOTIFICATION_COALESCING_WINDOW = 30
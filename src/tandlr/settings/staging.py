@@ -135,6 +135,9 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Cache
+CACHES['default']['LOCATION'] = os.environ.get('REDIS_URL')
+
 REPORT_EMAILS = [
     'fernanda@mellow.cc',
     'pablo@tandlr.com'
@@ -43,6 +43,27 @@ if LooseVersion(spatialite_version) >= LooseVersion("4.2"):
     SPATIALITE_LIBRARY_PATH = 'mod_spatialite'
 
 
+# Cache
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
+# Presence store in the memory of the process
+PRESENCE_BACKEND = 'tandlr.users.presence.LocalPresenceBackend'
+
+
+# Channel layer in the memory of the process
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'asgiref.inmemory.ChannelLayer',
+        'ROUTING': 'tandlr.notifications.routing.channel_routing',
+    },
+}
+
+
 # Simple password hasher for tests speed up
 PASSWORD_HASHERS = (
     'django.contrib.auth.hashers.MD5PasswordHasher',
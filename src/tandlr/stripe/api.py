@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from django.conf import settings
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 
 from rest_framework import status
 from rest_framework.response import Response
@@ -176,6 +177,8 @@ class CardViewSet(mixins.CreateModelMixin,
             card.is_active = False
             card.is_default = False
             card.card_id = None
+            card.validity_status = StripeCard.INVALID
+            card.verified_at = timezone.now()
             card.save()
 
             return Response(
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stripe', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stripecard',
+            name='validity_status',
+            field=models.CharField(default='unknown', max_length=10, verbose_name='validity status', choices=[('unknown', 'unknown'), ('valid', 'valid'), ('invalid', 'invalid')]),
+        ),
+        migrations.AddField(
+            model_name='stripecard',
+            name='verified_at',
+            field=models.DateTimeField(null=True, verbose_name='verified at', blank=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='stripecard',
+            index_together=set([('customer', 'is_active', 'validity_status')]),
+        ),
+    ]
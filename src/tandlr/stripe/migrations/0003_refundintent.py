@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduled_classes', '0021_class_acceptance_status'),
+        ('stripe', '0002_stripecard_validity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RefundIntent',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('charge_id', models.CharField(max_length=100, verbose_name='charge id')),
+                ('amount', models.PositiveIntegerField(help_text='Amount in cents, the whole charge is refunded if empty', null=True, verbose_name='amount', blank=True)),
+                ('status', models.CharField(default='pending', max_length=20, verbose_name='status', choices=[('pending', 'pending'), ('processing', 'processing'), ('succeeded', 'succeeded'), ('failed', 'failed')])),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='attempts')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='next attempt at')),
+                ('refund_id', models.CharField(max_length=255, null=True, verbose_name='refund id', blank=True)),
+                ('error', models.TextField(verbose_name='error', blank=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='created at')),
+                ('bill', models.OneToOneField(related_name='refund_intent', verbose_name='bill', to='scheduled_classes.ClassBill')),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='refundintent',
+            index_together=set([('status', 'next_attempt_at')]),
+        ),
+    ]
@@ -5,10 +5,23 @@ from django.db import models
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
-from tandlr.scheduled_classes.models import Class
+from tandlr.scheduled_classes.models import Class, ClassBill
 
 
 class StripeCard(models.Model):
+    """
+    Card of a Stripe customer. The validity of the card in Stripe is cached
+    in the card, see ```tandlr.stripe.validity```.
+    """
+    UNKNOWN = 'unknown'
+    VALID = 'valid'
+    INVALID = 'invalid'
+
+    VALIDITY_CHOICES = (
+        (UNKNOWN, _('unknown')),
+        (VALID, _('valid')),
+        (INVALID, _('invalid')),
+    )
 
     card_id = models.CharField(
         null=True, blank=True,
@@ -153,6 +166,24 @@ class StripeCard(models.Model):
         verbose_name=_("is active")
     )
 
+    validity_status = models.CharField(
+        max_length=10,
+        choices=VALIDITY_CHOICES,
+        default=UNKNOWN,
+        verbose_name=_("validity status")
+    )
+
+    verified_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_("verified at")
+    )
+
+    class Meta:
+        index_together = [
+            ('customer', 'is_active', 'validity_status'),
+        ]
+
 
 class StripeCustomer(models.Model):
     """
@@ -297,3 +328,82 @@ class StripeCharge(models.Model):
         related_name="payments",
         verbose_name=_("related class")
     )
+
+
+class RefundIntent(models.Model):
+    """
+    Refund of the charge of a bill requested by a cancellation. The intents
+    are refunded in Stripe in the background, see
+    ```tandlr.stripe.refunds```.
+    """
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (PENDING, _('pending')),
+        (PROCESSING, _('processing')),
+        (SUCCEEDED, _('succeeded')),
+        (FAILED, _('failed')),
+    )
+
+    bill = models.OneToOneField(
+        ClassBill,
+        related_name="refund_intent",
+        verbose_name=_("bill")
+    )
+
+    charge_id = models.CharField(
+        max_length=100,
+        verbose_name=_("charge id")
+    )
+
+    amount = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text=_("Amount in cents, the whole charge is refunded if empty"),
+        verbose_name=_("amount")
+    )
+
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+        verbose_name=_("status")
+    )
+
+    attempts = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("attempts")
+    )
+
+    next_attempt_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_("next attempt at")
+    )
+
+    refund_id = models.CharField(
+        max_length=255,
+        null=True,
+        blank=True,
+        verbose_name=_("refund id")
+    )
+
+    error = models.TextField(
+        blank=True,
+        verbose_name=_("error")
+    )
+
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_("created at")
+    )
+
+    class Meta:
+        index_together = [
+            ('status', 'next_attempt_at'),
+        ]
+
+    def __unicode__(self):
+        return u'{0} - {1}'.format(self.charge_id, self.status)
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+Refunds of the cancelled sessions.
+
+The cancellation of a session only records a ```RefundIntent``` for every
+charged bill that must be refunded, so it never waits for Stripe. The
+```process_refunds``` task refunds the pending intents in batches of
+STRIPE_REFUND_BATCH_SIZE:
+
+    - A batch is claimed with a single ```UPDATE``` (its intents move to
+      processing), the intents claimed by a worker that died are claimed
+      again after STRIPE_REFUND_PROCESSING_TIMEOUT seconds.
+    - The refunds of a batch are made by a pool of threads. The pool starts
+      with STRIPE_REFUND_CONCURRENCY threads, it's halved for the next batch
+      when Stripe rate limits a request and grows back one thread per batch
+      that wasn't limited.
+    - Every refund uses the id of its intent as idempotency key, so a refund
+      that is retried is never made twice.
+    - The rate limited and connection errors are retried with an exponential
+      back off up to STRIPE_REFUND_MAX_ATTEMPTS times, the other errors fail
+      the intent.
+"""
+from datetime import timedelta
+from multiprocessing.pool import ThreadPool
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+import stripe
+
+from tandlr.stripe.models import RefundIntent, StripeCharge
+
+
+#
+# Outcomes of a refund that must be retried.
+#
+RATE_LIMITED = 'rate_limited'
+RETRY = 'retry'
+
+#
+# Amount that Stripe keeps when a meeting now session is cancelled before
+# its start, in cents.
+#
+MEETING_NOW_CANCELLATION_FEE = 500
+
+
+def record_cancellation(session, now=None):
+    """
+    Records the refunds of the bills of the given cancelled session, returns
+    the number of recorded intents.
+
+    The sessions cancelled more than a day before their start are refunded
+    completely, the meeting now sessions cancelled before their start are
+    refunded but the cancellation fee. The bills without a charge (the ones
+    of the 100% promotion codes) and the ones that already have an intent
+    are skipped.
+    """
+    now = now or timezone.now()
+
+    if not session.meeting_now and (
+        session.class_start_date - now > timedelta(days=1)
+    ):
+        fee = None
+    elif session.meeting_now and now < session.class_start_date:
+        fee = MEETING_NOW_CANCELLATION_FEE
+    else:
+        return 0
+
+    bills = session.bills.filter(
+        charge_id__isnull=False,
+        refund_intent__isnull=True
+    ).exclude(
+        charge_id=''
+    ).values_list(
+        'id',
+        'charge_id',
+        'subtotal'
+    )
+
+    intents = []
+
+    for bill_id, charge_id, subtotal in bills:
+        amount = None
+
+        if fee is not None:
+            amount = int(subtotal * 100) - fee
+
+            if amount <= 0:
+                continue
+
+        intents.append(
+            RefundIntent(
+                bill_id=bill_id,
+                charge_id=charge_id,
+                amount=amount,
+                next_attempt_at=now
+            )
+        )
+
+    try:
+        with transaction.atomic():
+            RefundIntent.objects.bulk_create(intents)
+    except IntegrityError:
+        #
+        # A concurrent cancellation recorded the refunds first.
+        #
+        return 0
+
+    return len(intents)
+
+
+def process(now=None):
+    """
+    Refunds all the pending intents, batch by batch. Returns the number of
+    processed intents.
+    """
+    now = now or timezone.now()
+    concurrency = settings.STRIPE_REFUND_CONCURRENCY
+    processed = 0
+
+    stripe.api_key = settings.STRIPE_PRIVATE_KEY
+
+    while True:
+        intents = claim(now)
+
+        if not intents:
+            return processed
+
+        results = run(intents, concurrency)
+        save(intents, results, now)
+
+        if any(outcome == RATE_LIMITED for _, outcome, _ in results):
+            concurrency = max(concurrency // 2, 1)
+        else:
+            concurrency = min(
+                concurrency + 1,
+                settings.STRIPE_REFUND_CONCURRENCY
+            )
+
+        processed += len(intents)
+
+
+def claim(now):
+    """
+    Moves a batch of the pending intents to processing, returns their
+    (id, charge id, amount, attempts).
+    """
+    timeout = timedelta(seconds=settings.STRIPE_REFUND_PROCESSING_TIMEOUT)
+
+    with transaction.atomic():
+        intent_ids = list(
+            RefundIntent.objects.select_for_update().filter(
+                Q(
+                    status=RefundIntent.PENDING,
+                    next_attempt_at__lte=now
+                ) |
+                #
+                # The claim date of the processing intents is their next
+                # attempt date.
+                #
+                Q(
+                    status=RefundIntent.PROCESSING,
+                    next_attempt_at__lte=now - timeout
+                )
+            ).order_by(
+                'next_attempt_at',
+                'id'
+            ).values_list(
+                'id',
+                flat=True
+            )[:settings.STRIPE_REFUND_BATCH_SIZE]
+        )
+
+        RefundIntent.objects.filter(
+            id__in=intent_ids
+        ).update(
+            status=RefundIntent.PROCESSING,
+            next_attempt_at=now,
+            attempts=F('attempts') + 1
+        )
+
+        return list(
+            RefundIntent.objects.filter(
+                id__in=intent_ids
+            ).values_list(
+                'id',
+                'charge_id',
+                'amount',
+                'attempts'
+            )
+        )
+
+
+def run(intents, concurrency):
+    """
+    Refunds the given intents in Stripe with a pool of threads, returns
+    their (id, outcome, refund id or error).
+    """
+    pool = ThreadPool(min(concurrency, len(intents)))
+
+    try:
+        return pool.map(refund, intents)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def refund(intent):
+    intent_id, charge_id, amount, _ = intent
+
+    params = {
+        'charge': charge_id,
+        'idempotency_key': 'refund-intent-{}'.format(intent_id)
+    }
+
+    if amount is not None:
+        params['amount'] = amount
+
+    try:
+        created_refund = stripe.Refund.create(**params)
+    except stripe.error.RateLimitError as e:
+        return intent_id, RATE_LIMITED, e.message
+    except stripe.error.APIConnectionError as e:
+        return intent_id, RETRY, e.message
+    except stripe.error.StripeError as e:
+        return intent_id, RefundIntent.FAILED, e.message
+
+    return intent_id, RefundIntent.SUCCEEDED, created_refund.id
+
+
+def save(intents, results, now):
+    """
+    Stores the results of the given intents. The intents that must be
+    retried are rescheduled with a single ```UPDATE``` per attempt.
+    """
+    attempts = dict((intent[0], intent[3]) for intent in intents)
+    amounts = dict((intent[0], intent[2]) for intent in intents)
+    retries = {}
+    refunded_ids = []
+
+    for intent_id, outcome, value in results:
+        if outcome == RefundIntent.SUCCEEDED:
+            RefundIntent.objects.filter(
+                id=intent_id
+            ).update(
+                status=RefundIntent.SUCCEEDED,
+                refund_id=value,
+                error=''
+            )
+
+            if amounts[intent_id] is None:
+                refunded_ids.append(intent_id)
+
+        elif (
+            outcome == RefundIntent.FAILED or
+            attempts[intent_id] >= settings.STRIPE_REFUND_MAX_ATTEMPTS
+        ):
+            RefundIntent.objects.filter(
+                id=intent_id
+            ).update(
+                status=RefundIntent.FAILED,
+                error=value
+            )
+
+        else:
+            retries.setdefault(attempts[intent_id], []).append(intent_id)
+
+    for attempt, intent_ids in retries.items():
+        RefundIntent.objects.filter(
+            id__in=intent_ids
+        ).update(
+            status=RefundIntent.PENDING,
+            next_attempt_at=now + timedelta(
+                seconds=settings.STRIPE_REFUND_RETRY_DELAY * 2 ** (attempt - 1)
+            )
+        )
+
+    if refunded_ids:
+        StripeCharge.objects.filter(
+            charge_id__in=RefundIntent.objects.filter(
+                id__in=refunded_ids
+            ).values('charge_id')
+        ).update(
+            refunded=True
+        )
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from celery import shared_task
+
+from . import refunds
+from .models import StripeCard
+from .validity import verify_card
+
+
+@shared_task
+def refresh_card_validity(card_id):
+    """
+    Verifies the given card in Stripe and refreshes its cached validity, see
+    ```tandlr.stripe.validity```.
+    """
+    card = StripeCard.objects.select_related(
+        'customer'
+    ).filter(
+        pk=card_id
+    ).first()
+
+    if card is not None and card.customer.customer_id:
+        verify_card(card)
+
+
+@shared_task
+def process_refunds():
+    """
+    Refunds in Stripe the pending refund intents of the cancelled sessions,
+    see ```tandlr.stripe.refunds```.
+    """
+    return refunds.process()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from datetime import time, timedelta
+from decimal import Decimal
+
+from django.contrib.gis.geos import GEOSGeometry
+from django.test import TestCase
+from django.utils import timezone
+
+from tandlr.scheduled_classes.models import Class, ClassBill
+from tandlr.scheduled_classes.tests.test_availability import (
+    AvailabilityTestMixin
+)
+from tandlr.stripe import refunds
+from tandlr.stripe.models import RefundIntent
+
+
+class RefundsTestCase(AvailabilityTestMixin, TestCase):
+    """
+    Tests for the refund intents of ```tandlr.stripe.refunds```, none of
+    them calls Stripe.
+    """
+    def create_session(self, start_date, meeting_now=False):
+        username = 'teacher{}'.format(Class.objects.count())
+
+        session = Class.objects.create(
+            teacher=self.create_teacher(username),
+            student=self.student,
+            subject=self.subject,
+            class_start_date=start_date,
+            class_end_date=start_date + timedelta(hours=1),
+            class_time=time(1, 0),
+            class_status_id=3,
+            location=GEOSGeometry('SRID=4326;POINT(0 0)'),
+            time_zone_conf=0,
+            participants=1,
+            meeting_now=meeting_now
+        )
+
+        # Only the charged bill is refunded.
+        for charge_id in ('ch_{}'.format(session.id), None):
+            ClassBill.objects.create(
+                session=session,
+                subtotal=Decimal('20.00'),
+                charge_id=charge_id
+            )
+
+        return session
+
+    def test_record_cancellation(self):
+        now = timezone.now()
+
+        early = self.create_session(now + timedelta(days=2))
+        late = self.create_session(now + timedelta(hours=2))
+        meeting_now = self.create_session(
+            now + timedelta(minutes=10),
+            meeting_now=True
+        )
+
+        self.assertEqual(refunds.record_cancellation(early, now), 1)
+        self.assertEqual(refunds.record_cancellation(early, now), 0)
+        self.assertEqual(refunds.record_cancellation(late, now), 0)
+        self.assertEqual(refunds.record_cancellation(meeting_now, now), 1)
+
+        self.assertEqual(
+            dict(
+                RefundIntent.objects.values_list(
+                    'bill__session_id',
+                    'amount'
+                )
+            ),
+            {early.id: None, meeting_now.id: 1500}
+        )
+
+    def test_claim(self):
+        now = timezone.now()
+        session = self.create_session(now + timedelta(days=2))
+        refunds.record_cancellation(session, now)
+
+        intent = RefundIntent.objects.get()
+
+        self.assertEqual(
+            refunds.claim(now),
+            [(intent.id, intent.charge_id, None, 1)]
+        )
+        self.assertEqual(refunds.claim(now), [])
+
+        # The intents of a dead worker are claimed again.
+        self.assertEqual(
+            len(refunds.claim(now + timedelta(hours=1))),
+            1
+        )
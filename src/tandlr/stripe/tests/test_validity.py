@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+
+from tandlr.stripe import validity
+from tandlr.stripe.models import StripeCard, StripeCustomer
+
+
+class CardValidityTestCase(TestCase):
+    """
+    Tests for the cached validity of the cards, none of them calls Stripe.
+    """
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='student',
+            email='student@example.com',
+            password='secret'
+        )
+        self.customer = StripeCustomer.objects.create(
+            user=self.user,
+            customer_id='cus_test'
+        )
+
+    def create_card(self, card_id, validity_status, verified_at, **kwargs):
+        kwargs.setdefault('exp_year', date.today().year + 1)
+
+        return StripeCard.objects.create(
+            customer=self.customer,
+            card_id=card_id,
+            exp_month=12,
+            validity_status=validity_status,
+            verified_at=verified_at,
+            **kwargs
+        )
+
+    def test_fresh_valid_card(self):
+        now = timezone.now()
+        self.create_card('card_invalid', StripeCard.INVALID, now)
+        self.create_card('card_valid', StripeCard.VALID, now)
+
+        self.assertTrue(validity.has_valid_card(self.user, now))
+
+    def test_fresh_invalid_cards(self):
+        now = timezone.now()
+        self.create_card('card_invalid', StripeCard.INVALID, now)
+        self.create_card(
+            'card_removed',
+            StripeCard.VALID,
+            now,
+            is_active=False
+        )
+
+        self.assertFalse(validity.has_valid_card(self.user, now))
+
+    def test_expired_card(self):
+        now = timezone.now()
+        card = self.create_card(
+            'card_expired',
+            StripeCard.UNKNOWN,
+            None,
+            exp_year=2015
+        )
+
+        self.assertFalse(validity.has_valid_card(self.user, now))
+
+        card.refresh_from_db()
+        self.assertEqual(card.validity_status, StripeCard.INVALID)
+        self.assertEqual(card.verified_at, now)
+
+    def test_is_expired(self):
+        card = StripeCard(exp_month=9, exp_year=2016)
+
+        self.assertFalse(validity.is_expired(card, date(2016, 9, 30)))
+        self.assertTrue(validity.is_expired(card, date(2016, 10, 1)))
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from django.conf import settings
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 
 from rest_framework import status
 from rest_framework.response import Response
@@ -179,7 +180,9 @@ def make_stripe_charge(
     currency,
     description,
     customer_id,
-    card_token
+    card_token,
+    idempotency_key=None,
+    raise_transient=False
 ):
     """
     Makes a stripe change by giving the following information:
@@ -189,6 +192,10 @@ def make_stripe_charge(
         * description (optional)
         * customer_id (optional could be customer_id or card_token)
         * card_token (optional could be customer_id or card_token)
+        * idempotency_key (optional, the retries of a charge with the same
+          key don't charge twice)
+        * raise_transient (optional, raise the connection and rate limit
+          errors instead of returning them, so the charge can be retried)
     """
     stripe.api_key = settings.STRIPE_PRIVATE_KEY
 
@@ -204,6 +211,7 @@ def make_stripe_charge(
                 amount=amount,
                 currency=currency,
                 description=description,
+                idempotency_key=idempotency_key
             )
         elif (customer_id):
             charge = stripe.Charge.create(
@@ -211,6 +219,7 @@ def make_stripe_charge(
                 currency=currency,
                 customer=customer_id,
                 description=description,
+                idempotency_key=idempotency_key
             )
 
         stripe_customer = StripeCustomer.objects.get(
@@ -245,6 +254,8 @@ def make_stripe_charge(
 
     except stripe.error.APIConnectionError as e:
         # Failure to connecr to Stripe's API
+        if raise_transient:
+            raise
         return generate_exception_response(e.message, e.code)
 
     except stripe.error.AuthenticationError as e:
@@ -253,6 +264,8 @@ def make_stripe_charge(
 
     except stripe.error.RateLimitError as e:
         # Too many request hit to the API of Stripe
+        if raise_transient:
+            raise
         return generate_exception_response(e.message, e.code)
 
     except stripe.error.StripeError as e:
@@ -293,6 +306,11 @@ def create_card(card, customer, is_default=False):
         last4=card.last4,
         fingerprint=card.fingerprint,
         card_id=card.id,
-        is_default=is_default
+        is_default=is_default,
+        #
+        # Stripe just returned the card, so it's valid.
+        #
+        validity_status=StripeCard.VALID,
+        verified_at=timezone.now()
     )
     return card
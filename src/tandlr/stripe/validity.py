@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Local cache of the validity of the cards in Stripe.
+
+Every ```StripeCard``` keeps the result of its last verification in Stripe
+(```validity_status``` and ```verified_at```) and the fingerprint that
+Stripe returned. A verification is fresh for STRIPE_CARD_VALIDITY_HOURS:
+
+    - The bookings check the cards of the student with a single query over
+      the ```(customer, is_active, validity_status)``` index, and only call
+      Stripe when none of the cards has a fresh verification.
+    - The cards verified more than half of that time ago are refreshed in
+      the background by the ```refresh_card_validity``` task, so the cache
+      of the active students never goes stale.
+    - The cards created through the API are verified by their creation, the
+      removed ones are invalid from their removal.
+"""
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+import stripe
+
+from tandlr.stripe.models import StripeCard
+
+
+def get_validity_age():
+    return timedelta(hours=settings.STRIPE_CARD_VALIDITY_HOURS)
+
+
+def is_expired(card, today=None):
+    """
+    Returns True if the expiration month of the given card already passed.
+    """
+    if not card.exp_month or not card.exp_year:
+        return False
+
+    today = today or date.today()
+
+    return (card.exp_year, card.exp_month) < (today.year, today.month)
+
+
+def mark(card, validity_status, fingerprint=None, now=None):
+    """
+    Stores the result of a verification of the given card.
+    """
+    card.validity_status = validity_status
+    card.verified_at = now or timezone.now()
+
+    if fingerprint:
+        card.fingerprint = fingerprint
+
+    StripeCard.objects.filter(
+        pk=card.pk
+    ).update(
+        validity_status=card.validity_status,
+        verified_at=card.verified_at,
+        fingerprint=card.fingerprint
+    )
+
+
+def verify_card(card, now=None):
+    """
+    Verifies the given card in Stripe and caches the result. Returns True if
+    the card is valid.
+
+    The connection errors are raised and the cache isn't changed.
+    """
+    if not card.is_active or not card.card_id or is_expired(card):
+        mark(card, StripeCard.INVALID, now=now)
+        return False
+
+    stripe.api_key = settings.STRIPE_PRIVATE_KEY
+
+    try:
+        customer = stripe.Customer.retrieve(card.customer.customer_id)
+        source = customer.sources.retrieve(card.card_id)
+    except stripe.InvalidRequestError:
+        mark(card, StripeCard.INVALID, now=now)
+        return False
+
+    if not source:
+        mark(card, StripeCard.INVALID, now=now)
+        return False
+
+    mark(
+        card,
+        StripeCard.VALID,
+        fingerprint=source.get('fingerprint'),
+        now=now
+    )
+    return True
+
+
+def has_valid_card(user, now=None):
+    """
+    Returns True if the given user has a valid card.
+
+    The cache is checked first, the cards are only verified in Stripe when
+    none of them was verified as valid recently.
+    """
+    from tandlr.stripe.tasks import refresh_card_validity
+
+    now = now or timezone.now()
+    max_age = get_validity_age()
+
+    cards = StripeCard.objects.filter(
+        customer__user=user,
+        is_active=True,
+        card_id__isnull=False
+    ).select_related(
+        'customer'
+    )
+
+    cached = cards.filter(
+        validity_status=StripeCard.VALID,
+        verified_at__gt=now - max_age
+    ).order_by(
+        '-is_default',
+        '-verified_at'
+    ).first()
+
+    if cached is not None and not is_expired(cached, now.date()):
+        if cached.verified_at <= now - max_age / 2:
+            refresh_card_validity.delay(cached.pk)
+
+        return True
+
+    #
+    # The cards that were verified as invalid recently are skipped.
+    #
+    stale_cards = cards.exclude(
+        validity_status=StripeCard.INVALID,
+        verified_at__gt=now - max_age
+    ).order_by(
+        '-is_default',
+        'id'
+    )
+
+    for card in stale_cards:
+        if not card.customer.customer_id:
+            continue
+
+        #
+        # A user can have multiple cards associated. If one of them doesn't
+        # work try another.
+        #
+        if verify_card(card, now=now):
+            return True
+
+    return False
@@ -4,9 +4,6 @@ from datetime import datetime, timedelta
 
 from django.conf import settings
 from django.contrib.gis.geos import Polygon
-from django.core.mail import EmailMultiAlternatives
-from django.db.models import Q
-from django.template.loader import render_to_string
 from django.utils import timezone
 
 import pytz
@@ -20,8 +17,25 @@ from tandlr.api.v2. routers import router
 from tandlr.core.api import mixins, viewsets
 from tandlr.core.api.routers.single import SingleObjectRouter
 from tandlr.payments.api import TeacherPaymentInformationViewSet
-from tandlr.scheduled_classes.models import Class, Slot, Subject
+from tandlr.reports.models import UnmetSearch
+from tandlr.scheduled_classes import freebusy
+from tandlr.scheduled_classes.availability import (
+    SEARCH_WINDOW_DAYS,
+    find_available_teachers,
+    get_busy_teachers_ids
+)
+from tandlr.scheduled_classes.models import Slot, Subject, minute_of_day
+from tandlr.users import search_cache
+from tandlr.users.candidates import get_index
+from tandlr.users.geo import (
+    exclude_placeholders,
+    get_bbox,
+    nearest_locations,
+    rank_by_distance
+)
 from tandlr.users.permissions import IsSuperUser
+from tandlr.users.presence import get_backend
+from tandlr.users.ranking import rank_locations
 from tandlr.users.serializers import (
     LocationTeacherV2Serializer,
     LocationsV2Serializer,
@@ -35,7 +49,7 @@ from tandlr.users.serializers import (
 )
 from tandlr.utils.permissions import IsStudent, IsTeacher
 
-from .models import DeviceUser, LocationUser
+from .models import DeviceUser, LocationUser, User
 
 
 class CurrentUserViewSet(
@@ -318,7 +332,37 @@ class LocationViewSet(mixins.UpdateModelMixin,
         produces:
             - application/json
         """
-        return super(LocationViewSet, self).update(request)
+        location = self.get_object()
+        presence = get_backend()
+
+        if location is None or presence is None:
+            return super(LocationViewSet, self).update(request)
+
+        #
+        # The position is kept in the presence store, it's written to the
+        # database periodically (see ```tandlr.users.presence```).
+        #
+        serializer = self.get_serializer(
+            location,
+            data=request.data,
+            action='update'
+        )
+        serializer.is_valid(raise_exception=True)
+
+        presence.update_location(
+            request.user,
+            serializer.validated_data['latitude'],
+            serializer.validated_data['longitude'],
+            serializer.validated_data.get(
+                'place_description',
+                'No description'
+            )
+        )
+        presence.apply_positions([location])
+
+        return Response(
+            self.get_serializer(location, action='retrieve').data
+        )
 
     def get_object(self):
         if hasattr(self.request.user, 'location_user'):
@@ -327,7 +371,42 @@ class LocationViewSet(mixins.UpdateModelMixin,
             return None
 
 
+class SubjectPriceContextMixin(object):
+    """
+    Adds the price per hour of the searched subject to the context of the
+    serializers, so it's loaded once instead of once per teacher.
+    """
+    def get_serializer_context(self):
+        context = super(
+            SubjectPriceContextMixin,
+            self
+        ).get_serializer_context()
+
+        context['subject_price_per_hour'] = self.get_subject_price_per_hour()
+
+        return context
+
+    def get_subject_price_per_hour(self):
+        """
+        Returns the price per hour of the searched subject.
+        """
+        if not hasattr(self, '_subject_price_per_hour'):
+            subject = self.request.query_params.get('subject', '')
+            self._subject_price_per_hour = None
+
+            if subject.isdigit():
+                self._subject_price_per_hour = Subject.objects.filter(
+                    pk=subject
+                ).values_list(
+                    'price_per_hour',
+                    flat=True
+                ).first()
+
+        return self._subject_price_per_hour
+
+
 class SearchTeacherViewSet(
+    SubjectPriceContextMixin,
     mixins.ListModelMixin,
     viewsets.GenericViewSet
 ):
@@ -347,6 +426,9 @@ class SearchTeacherViewSet(
 
             - type: meeting_now_session
               search-teacher?subject=5&lat_1=15.757035&lat_2=37.817035&lng_1=-80.438027&lng_2=-122.378027&exclude_users_id=21
+
+            - type: meeting_now_session (nearest teachers)
+              search-teacher?subject=5&lat=19.432608&lng=-99.133209&radius=5&limit=10
         ---
 
         parameters:
@@ -400,6 +482,30 @@ class SearchTeacherViewSet(
               type: double
               in: query
 
+            - name: lat
+              description: Latitude of the nearest teachers search.
+              required: false
+              type: double
+              in: query
+
+            - name: lng
+              description: Longitude of the nearest teachers search.
+              required: false
+              type: double
+              in: query
+
+            - name: radius
+              description: Radius (km) of the nearest teachers search.
+              required: false
+              type: double
+              in: query
+
+            - name: limit
+              description: Max number of teachers of the nearest search.
+              required: false
+              type: integer
+              in: query
+
         responseMessages:
             - code: 200
               message: OK
@@ -433,6 +539,15 @@ class SearchTeacherViewSet(
                 content = {'detail': 'the date should be greater than today'}
                 return Response(content, status=status.HTTP_400_BAD_REQUEST)
 
+        #
+        # The subject must be the id of a subject.
+        #
+        subject = self.request.query_params.get('subject')
+
+        if subject and not subject.strip().isdigit():
+            content = {'detail': 'the subject should be an integer'}
+            return Response(content, status=status.HTTP_400_BAD_REQUEST)
+
         #
         # If the user doesn't have a university associated with him, return
         # and error
@@ -444,12 +559,126 @@ class SearchTeacherViewSet(
         return super(SearchTeacherViewSet, self).list(request)
 
     def get_queryset(self):
+        """
+        Returns the search results, cached by the normalized query (see
+        ```tandlr.users.search_cache```).
+        """
+        results = search_cache.get_or_compute(
+            search_cache.make_key(
+                'teachers',
+                self.request,
+                origin=self.get_origin()
+            ),
+            self.get_search_results
+        )
+        ids = [location_id for location_id, _ in results]
+
+        #
+        # The ratings and sessions of the teachers are read from their
+        # summary, loaded with the same query.
+        #
+        queryset = LocationUser.objects.select_related(
+            'user__user_summary'
+        )
+
+        locations = queryset.in_bulk(ids)
+
+        for location_id, distance in results:
+            locations[location_id].distance = distance
+
+        locations = [locations[location_id] for location_id in ids]
+        presence = get_backend()
+
+        # The meeting now searches show the latest position of the teachers.
+        if presence is not None and not self.is_scheduled_search():
+            presence.apply_positions(locations)
+
+        return locations
+
+    def is_scheduled_search(self):
+        params = self.request.query_params
+
+        return bool(
+            params.get('scheduling_datetime') and
+            params.get('duration') and
+            params.get('timezone_conf')
+        )
+
+    def is_nearest_search(self):
+        params = self.request.query_params
+
+        return bool(
+            not self.is_scheduled_search() and
+            not (
+                params.get('lat_1') and params.get('lat_2') and
+                params.get('lng_1') and params.get('lng_2')
+            ) and
+            params.get('lat') and
+            params.get('lng')
+        )
+
+    def get_search_results(self):
+        """
+        Returns the (id, distance) pairs of the locations of the teachers
+        found by the search, the distance is None unless the search is by
+        distance.
+
+        The nearest teachers searches are ordered by distance, the others
+        are ranked by ```tandlr.users.ranking```.
+        """
+        locations = self.search_teachers()
+
+        if self.is_nearest_search():
+            return [
+                (location.pk, location.distance) for location in locations
+            ]
+
+        return [
+            (location_id, None)
+            for location_id in rank_locations(
+                locations,
+                origin=self.get_origin(),
+                price_per_hour=self.get_subject_price_per_hour()
+            )
+        ]
+
+    def get_origin(self):
+        """
+        Returns the rounded location of the student that ranks the results,
+        None if he doesn't have one or the search is by distance.
+
+        The ranking uses the rounded location, so the cached results are the
+        same for all the students of the same key.
+        """
+        if self.is_nearest_search():
+            return None
+
+        student_location = getattr(self.request.user, 'location_user', None)
+
+        if student_location is None or not (
+            student_location.point.x or student_location.point.y
+        ):
+            return None
+
+        return search_cache.round_origin(
+            (student_location.point.x, student_location.point.y)
+        )
+
+    def search_teachers(self):
         # Polygon parameters.
         lat_1 = self.request.query_params.get('lat_1')
         lat_2 = self.request.query_params.get('lat_2')
         lng_1 = self.request.query_params.get('lng_1')
         lng_2 = self.request.query_params.get('lng_2')
 
+        # Nearest teachers parameters.
+        lat = self.request.query_params.get('lat')
+        lng = self.request.query_params.get('lng')
+        nearest = False
+
+        presence = get_backend()
+        meeting_now_bbox = None
+
         scheduling_datetime = self.request.query_params.get(
             'scheduling_datetime'
         )
@@ -470,22 +699,34 @@ class SearchTeacherViewSet(
         subject = self.request.query_params.get('subject')
 
         # Base query.
-        queryset = LocationUser.objects.filter(
-            user__is_active=True,
-            user__is_teacher=True
+        queryset = LocationUser.objects.select_related(
+            'user__user_summary'
         )
 
         # Subject is mandatory.
         if subject:
 
+            scheduled = scheduling_datetime and duration and timezone_conf
+            meeting_now = not scheduled and (
+                (lat_1 and lat_2 and lng_1 and lng_2) or (lat and lng)
+            )
+
+            #
+            # The active teachers of the university that impart the subject
+            # (and are available for the meeting now searches) come from the
+            # in process index, see ```tandlr.users.candidates```.
+            #
             queryset = queryset.filter(
-                user__subject_teacher__subject__id=subject,
-                user__university=self.request.user.university
+                user__pk__in=get_index().candidates(
+                    self.request.user.university_id,
+                    int(subject),
+                    available=bool(meeting_now)
+                )
             )
 
             # If the scheduling_datetime was provided and all mandatory data
             # is available.
-            if scheduling_datetime and duration and timezone_conf:
+            if scheduled:
 
                 start_datetime = timezone.datetime.strptime(
                     scheduling_datetime,
@@ -504,19 +745,6 @@ class SearchTeacherViewSet(
                     '%H:%M'
                 ).time()
 
-                busy_teachers_ids = Class.objects.filter(
-                    class_start_date__year=start_datetime.year,
-                    class_start_date__month=start_datetime.month,
-                    class_start_date__day=start_datetime.day,
-                    class_start_date__hour=start_datetime.hour,
-                    class_start_date__minute=start_datetime.minute
-                ).distinct(
-                    'teacher__id'
-                ).values_list(
-                    'teacher__id',
-                    flat=True
-                )
-
                 # Calculating the end datetime.
                 local_start_datetime = start_datetime + timedelta(
                     hours=timezone_conf
@@ -526,43 +754,49 @@ class SearchTeacherViewSet(
                     hours=duration.hour,
                     minutes=duration.minute
                 )
-                start_date = local_start_datetime.date()
-                start_time = local_start_datetime.time()
-                end_time = local_end_datetime.time()
-
-                week_day = local_start_datetime.weekday()
-
-                week_days = [
-                    'monday', 'tuesday', 'wednesday', 'thursday',
-                    'friday', 'saturday', 'sunday'
-                ]
-
-                available_teachers_ids = Slot.objects.filter(
-                    # Filter all slots with "is_unique" configuration.
-                    (
-                        (Q(is_unique=True) & Q(date=start_date)) |
-                        # Filter all concurrent slots.
-                        (Q(is_unique=False) & Q(**{week_days[week_day]: True}))
-                    ) &
-                    # Time should be between
-                    # slot's star_time and slot's end_time
-                    (
-                        Q(start_time__lte=start_time) &
-                        Q(end_time__gte=end_time)
+
+                # Teachers with a session overlapping the requested one.
+                busy_teachers_ids = get_busy_teachers_ids(
+                    start_datetime,
+                    start_datetime + timedelta(
+                        hours=duration.hour,
+                        minutes=duration.minute
                     )
-                ).distinct(
-                    'teacher__id'
-                ).values_list(
-                    'teacher__id',
-                    flat=True
                 )
 
-                # If there are teachers to exclude.
-                if busy_teachers_ids:
-                    queryset = queryset.exclude(
-                        user__pk__in=busy_teachers_ids
+                #
+                # Inside the horizon of the materialized calendar the free
+                # teachers are found with a single range query, see
+                # ```tandlr.scheduled_classes.freebusy```.
+                #
+                if freebusy.covers(local_start_datetime, local_end_datetime):
+                    available_teachers_ids = freebusy.available_teachers_ids(
+                        local_start_datetime,
+                        local_end_datetime
+                    )
+
+                else:
+                    #
+                    # The slots of the day (by their week days bitmask) that
+                    # contain the session, in a single indexed query.
+                    #
+                    available_teachers_ids = Slot.objects.on_date(
+                        local_start_datetime.date()
+                    ).covering(
+                        minute_of_day(local_start_datetime),
+                        minute_of_day(local_end_datetime)
+                    ).distinct(
+                        'teacher__id'
+                    ).values_list(
+                        'teacher__id',
+                        flat=True
                     )
 
+                # Excluding the busy teachers.
+                queryset = queryset.exclude(
+                    user__pk__in=busy_teachers_ids
+                )
+
                 # If there are teachers to include.
                 queryset = queryset.filter(
                     user__pk__in=available_teachers_ids
@@ -573,24 +807,86 @@ class SearchTeacherViewSet(
                 # If is meeting_now.
                 bbox = (lat_2, lng_2, lat_1, lng_1)
 
-                polygon = Polygon.from_bbox(bbox)
+                if presence is not None:
+                    # The online teachers are read from the presence store.
+                    meeting_now_bbox = (
+                        min(float(lat_1), float(lat_2)),
+                        min(float(lng_1), float(lng_2)),
+                        max(float(lat_1), float(lat_2)),
+                        max(float(lng_1), float(lng_2))
+                    )
 
-                # Filtering by location
-                queryset = queryset.filter(
-                    point__within=polygon,
-                    user__settings__available=True
-                )
+                else:
+                    polygon = Polygon.from_bbox(bbox)
+
+                    # Filtering by location
+                    queryset = exclude_placeholders(queryset).filter(
+                        point__within=polygon
+                    )
+
+            elif lat and lng:
+
+                # If is meeting_now by distance.
+                nearest = True
 
             # If a user should be excluded.
             if excluded_users_ids:
                 queryset = queryset.exclude(
                     user__pk__in=map(int, excluded_users_ids.split(','))
                 )
+
+        else:
+            queryset = queryset.filter(
+                user__is_active=True,
+                user__is_teacher=True
+            )
+
         # Excluding session's user.
-        return queryset.exclude(user__pk=self.request.user.id)
+        queryset = queryset.exclude(user__pk=self.request.user.id)
+
+        if meeting_now_bbox:
+            return presence.locations_within(queryset, meeting_now_bbox)
+
+        if nearest:
+            lat = float(lat)
+            lng = float(lng)
+            radius = self.request.query_params.get('radius')
+            radius = float(radius) if radius else None
+            limit = self.request.query_params.get('limit')
+            limit = min(
+                int(limit) if limit else settings.MEETING_NOW_SEARCH_LIMIT,
+                settings.REST_FRAMEWORK['MAX_PAGINATE_BY']
+            )
+
+            if presence is not None:
+                return rank_by_distance(
+                    presence.locations_within(
+                        queryset,
+                        get_bbox(
+                            lat,
+                            lng,
+                            radius or settings.MEETING_NOW_SEARCH_RADIUS
+                        )
+                    ),
+                    lat,
+                    lng,
+                    radius=radius,
+                    limit=limit
+                )
+
+            return nearest_locations(
+                queryset,
+                lat,
+                lng,
+                radius=radius,
+                limit=limit
+            )
+
+        return queryset
 
 
 class SearchFutureTeacherViewSet(
+    SubjectPriceContextMixin,
     mixins.ListModelMixin,
     viewsets.GenericViewSet
 ):
@@ -679,6 +975,15 @@ class SearchFutureTeacherViewSet(
                 content = {'detail': 'the date should be greater than today'}
                 return Response(content, status=status.HTTP_400_BAD_REQUEST)
 
+        #
+        # The subject must be the id of a subject.
+        #
+        subject = self.request.query_params.get('subject')
+
+        if subject and not subject.strip().isdigit():
+            content = {'detail': 'the subject should be an integer'}
+            return Response(content, status=status.HTTP_400_BAD_REQUEST)
+
         #
         # If the user doesn't have a university associated with him, return
         # and error
@@ -690,7 +995,55 @@ class SearchFutureTeacherViewSet(
         return super(SearchFutureTeacherViewSet, self).list(request)
 
     def get_queryset(self):
+        """
+        Returns the search results, cached by the normalized query (see
+        ```tandlr.users.search_cache```).
+        """
+        results = search_cache.get_or_compute(
+            search_cache.make_key('future-teachers', self.request),
+            self.get_search_results
+        )
+
+        #
+        # Every unmet search is logged, even when its empty result was
+        # cached.
+        #
+        if not results:
+            self.log_unmet_search()
+
+        slots = Slot.objects.in_bulk(
+            [slot_id for slot_id, _, _ in results]
+        )
+        teachers = User.objects.select_related(
+            'user_summary'
+        ).in_bulk(
+            [teacher_id for _, _, teacher_id in results]
+        )
+
+        return [
+            {
+                'slot': slots[slot_id],
+                'date': date,
+                'teacher': teachers[teacher_id]
+            }
+            for slot_id, date, teacher_id in results
+        ]
+
+    def get_search_results(self):
+        """
+        Returns the (slot id, date, teacher id) of the dates found by the
+        search.
+        """
+        return [
+            (available['slot'].pk, available['date'], available['teacher'].pk)
+            for available in self.search_available_dates()
+        ]
 
+    def get_search_params(self):
+        """
+        Returns the subject, the local start datetime and the duration of the
+        searched sessions, or None when a mandatory parameter is missing.
+        """
         scheduling_datetime = self.request.query_params.get(
             'scheduling_datetime'
         )
@@ -702,299 +1055,119 @@ class SearchFutureTeacherViewSet(
         if timezone_conf:
             timezone_conf = int(timezone_conf)
 
-        # Parameter for exclude user.
-        excluded_users_ids = self.request.query_params.get(
-            'excluded_users_ids',
-            ''
-        ).split(',')
-
         # Filter by subject
         subject = self.request.query_params.get('subject')
 
-        # Subject is mandatory.
-        available_dates = []
-        if subject:
-
-            # If the scheduling_datetime was provided and all mandatory data
-            # is available.
-            if scheduling_datetime and duration and timezone_conf:
+        # Subject is mandatory, and all the scheduling data.
+        if not (subject and scheduling_datetime and duration and
+                timezone_conf):
+            return None
 
-                start_datetime = timezone.datetime.strptime(
-                    scheduling_datetime,
-                    '%Y-%m-%dT%H:%M:%S.%fZ'
-                )
-                #
-                # Setting timezone to naive datetime value, and making the
-                # query without seconds or microseconds.
-                #
-                utc = pytz.UTC
-                start_datetime = utc.localize(start_datetime)
+        start_datetime = timezone.datetime.strptime(
+            scheduling_datetime,
+            '%Y-%m-%dT%H:%M:%S.%fZ'
+        )
+        #
+        # Setting timezone to naive datetime value, and making the
+        # query without seconds or microseconds.
+        #
+        utc = pytz.UTC
+        start_datetime = utc.localize(start_datetime)
+
+        # Mandatory query param to calculate the end time of the class.
+        duration = timezone.datetime.strptime(
+            duration,
+            '%H:%M'
+        ).time()
+
+        # Calculating the end datetime.
+        local_start_datetime = start_datetime + timedelta(
+            hours=timezone_conf
+        )
 
-                # Mandatory query param to calculate the end time of the class.
-                duration = timezone.datetime.strptime(
-                    duration,
-                    '%H:%M'
-                ).time()
+        duration = timedelta(
+            hours=duration.hour,
+            minutes=duration.minute
+        )
 
-                # Calculating the end datetime.
-                local_start_datetime = start_datetime + timedelta(
-                    hours=timezone_conf
-                )
-                start_date = local_start_datetime.date()
+        return subject, local_start_datetime, duration
 
-                initial_day = local_start_datetime
-                days = []
-                available_slots = Slot.objects.exclude(
-                    date__lt=start_date
-                )
-                available_teachers_ids = []
-                week_days = [
-                    'monday', 'tuesday', 'wednesday', 'thursday',
-                    'friday', 'saturday', 'sunday'
-                ]
+    def log_unmet_search(self):
+        """
+        Logs the search without results, the admins get a periodic digest of
+        them (see ```tandlr.reports.tasks.unmet_searches_digest```).
+        """
+        search_params = self.get_search_params()
+
+        if search_params is None:
+            return
+
+        subject, local_start_datetime, duration = search_params
+
+        UnmetSearch.objects.create(
+            hour=timezone.now().replace(
+                minute=0,
+                second=0,
+                microsecond=0
+            ),
+            university_id=self.request.user.university_id,
+            subject_id=subject,
+            student=self.request.user,
+            scheduling_datetime=local_start_datetime,
+            duration=duration.seconds // 60
+        )
 
-                #
-                # calculate the next 7 dates starting from given date
-                #
-                for i in range(0, 8):
-                    days.append(initial_day + timedelta(days=i))
-
-                for current_day in days:
-                    for slot in available_slots:
-                        teacher = slot.teacher
-                        session_user = self.request.user
-
-                        #
-                        # - Discard if the current day dont belogs to slot
-                        # - The end-point just search the frist 3 available
-                        #   teachers
-                        # - Each teacher just can be add 1 time in suggestion
-                        # - If slots teacher is given in excluded_teachers_ids,
-                        #   then, we don't add it in the results
-                        # - Discard the user sessions
-                        # - The teacher should be impart sessions in the same
-                        #   university that current user
-                        # - Return just the teachers that impart the given
-                        #   subject
-                        #
-                        slot_is_unique_valid = (
-                            slot.is_unique and
-                            current_day.date() == slot.date
-                        )
+    def search_available_dates(self):
+        search_params = self.get_search_params()
 
-                        slot_is_not_unique_valid = getattr(
-                            slot, week_days[current_day.weekday()]
-                        )
+        if search_params is None:
+            return []
 
-                        user_is_valid = (
-                            len(available_teachers_ids) < 3 and
-                            teacher.id not in available_teachers_ids and
-                            teacher.id not in excluded_users_ids and
-                            teacher.id != session_user.id and
-                            teacher.university == session_user.university and
-                            teacher.subject_teacher.filter(
-                                subject_id=subject
-                            ).exists()
-                        )
+        subject, local_start_datetime, duration = search_params
 
-                        if (user_is_valid and
-                                (slot_is_not_unique_valid or
-                                    slot_is_unique_valid)):
-                            #
-                            # Define the date of the weekday of slot to
-                            # filter the classes that exists in this date and
-                            # after of time define in the slot.
-                            #
-                            initial_time = datetime(
-                                current_day.year,
-                                current_day.month,
-                                current_day.day,
-                                slot.start_time.hour,
-                                slot.start_time.minute,
-                                tzinfo=current_day.tzinfo
-                            )
-
-                            #
-                            # Define the date of weekday of slot to after
-                            # filter the classes that exists in this date and
-                            # before of time define in the slot.
-                            #
-                            limit_time = datetime(
-                                current_day.year,
-                                current_day.month,
-                                current_day.day,
-                                slot.end_time.hour,
-                                slot.end_time.minute,
-                                tzinfo=current_day.tzinfo
-                            )
-
-                            #
-                            # Get the classes that are in a range which is
-                            # created with the date of dates starting by
-                            # given date and hours/minutes of current slot.
-                            #
-                            classes = Class.objects.filter(
-                                class_start_date__gte=initial_time,
-                                class_start_date__lte=limit_time,
-                                class_end_date__gte=initial_time,
-                                class_end_date__lte=limit_time
-                            ).distinct('teacher_id')
-
-                            #
-                            # Total hours is the sum of sessions duration that
-                            # are scheduling in the date of current slot. We
-                            # init the variable with the duration of the
-                            # session that the user want to scheduling.
-                            #
-                            total_hours = timedelta(
-                                    hours=duration.hour,
-                                    minutes=duration.minute
-                            )
-
-                            #
-                            # The hours available in the slot
-                            #
-                            limit_hours = (
-                                timedelta(
-                                    hours=slot.end_time.hour,
-                                    minutes=slot.end_time.minute
-                                ) - timedelta(
-                                    hours=slot.start_time.hour,
-                                    minutes=slot.start_time.minute
-                                )
-                            )
-
-                            #
-                            # Sum the duration time of the all sessions that
-                            # are scheduling in the date/time of current slot.
-                            #
-                            for session in classes:
-                                total_hours += timedelta(
-                                    hours=session.class_time.hour,
-                                    minutes=session.class_time.minute
-                                )
-
-                            #
-                            # Total hours scheduling should be limit hours of
-                            # slot.
-                            #
-                            if (total_hours <= limit_hours):
-                                #
-                                # Build the initial_time_slot with the date and
-                                # the start time of slot
-                                #
-                                initial_time_slot = datetime(
-                                    current_day.year,
-                                    current_day.month,
-                                    current_day.day,
-                                    slot.start_time.hour,
-                                    slot.start_time.minute
-                                )
-
-                                #
-                                # The firts limit_time_slot is the sum beetwen
-                                # the initial_time_slot and the duration of
-                                # session that the user want to schedulind
-                                #
-                                limit_time_slot = (
-                                    initial_time_slot + timedelta(
-                                        hours=duration.hour,
-                                        minutes=duration.minute
-                                    )
-                                )
-
-                                #
-                                # search the time wich can used by the user to
-                                # scheduling a session
-                                #
-                                for session in classes:
-                                    #
-                                    # Search sessions wich are scheduled in
-                                    # the slots of size of the given duration
-                                    #
-                                    session_curr_hour = Class.objects.filter(
-                                        class_start_date__gte=(
-                                            initial_time_slot
-                                        ),
-                                        class_end_date__lte=limit_time_slot
-                                    ).distinct('teacher_id')
-
-                                    #
-                                    # If dont exists any session mean that the
-                                    # session can be scheduling in this slot.
-                                    #
-                                    if (not session_curr_hour.exists() and
-                                            teacher.id not in
-                                            available_teachers_ids):
-
-                                        #
-                                        # Add the slot in the array that will
-                                        # be returned as result.
-                                        #
-                                        available_dates.append({
-                                            'slot': slot,
-                                            'date': initial_time_slot,
-                                            'teacher': slot.teacher
-                                        })
-
-                                        available_teachers_ids.append(
-                                                teacher.id
-                                        )
-
-                                #
-                                # If any class is included in the current slot,
-                                # that means that, we can include the teacher
-                                # as available
-                                #
-                                if not classes.exists():
-                                    available_dates.append({
-                                        'slot': slot,
-                                        'date': initial_time_slot,
-                                        'teacher': slot.teacher
-                                    })
-
-                                    available_teachers_ids.append(
-                                        teacher.id
-                                    )
-
-                if len(available_dates) == 0:
-                    # if the queryset is empty, then, we send a email to
-                    # Tandlr admins
-                    context = {
-                        'subject': Subject.objects.get(pk=subject),
-                        'request': self.request,
-                        'scheduling_datetime': local_start_datetime,
-                        'duration': duration,
-                        'user': ' - '.join([
-                            self.request.user.get_full_name(),
-                            self.request.user.email
-                        ])
-                    }
-
-                    subject_template = (
-                        'email/user/search_without_results_subject.txt'
-                    )
-                    body_template = 'email/user/search_without_results.txt'
-                    html_template = 'email/user/search_without_results.html'
-
-                    subject = render_to_string(
-                            subject_template, context
-                    ).strip()
-                    body = render_to_string(body_template, context)
-                    html = render_to_string(html_template, context)
-
-                    message = EmailMultiAlternatives(
-                        subject,
-                        body,
-                        settings.DEFAULT_FROM_EMAIL,
-                        settings.REPORT_EMAILS
-                    )
+        # Parameter for exclude user.
+        excluded_users_ids = [
+            int(user_id) for user_id in self.request.query_params.get(
+                'excluded_users_ids',
+                ''
+            ).split(',') if user_id.strip().isdigit()
+        ]
+
+        window_end = local_start_datetime + timedelta(
+            days=SEARCH_WINDOW_DAYS
+        )
+        teacher_ids = get_index().candidates(
+            self.request.user.university_id,
+            int(subject)
+        )
 
-                    if html is not None:
-                        message.attach_alternative(html, 'text/html')
-                        message.send()
+        if freebusy.covers(local_start_datetime, window_end):
+            #
+            # The search window is inside the horizon of the materialized
+            # calendar, see ```tandlr.scheduled_classes.freebusy```.
+            #
+            return freebusy.find_available_occurrences(
+                self.request.user,
+                subject,
+                local_start_datetime,
+                duration,
+                excluded_users_ids=excluded_users_ids,
+                teacher_ids=teacher_ids
+            )
 
-        return available_dates
+        #
+        # The availability is computed in memory with the slots and sessions
+        # of the whole search window, see
+        # ```tandlr.scheduled_classes.availability```.
+        #
+        return find_available_teachers(
+            self.request.user,
+            subject,
+            local_start_datetime,
+            duration,
+            excluded_users_ids=excluded_users_ids,
+            teacher_ids=teacher_ids
+        )
 
 
 class DeviceUserViewSet(viewsets.GenericViewSet):
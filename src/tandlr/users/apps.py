@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
+from celery.signals import task_postrun
+
 from django.apps import AppConfig
-from django.db.models.signals import post_save
+from django.core.signals import request_finished
+from django.db.models.signals import post_delete, post_init, post_save
 
 from . import signals
 
@@ -28,3 +31,41 @@ class UsersAppConfig(AppConfig):
             signals.crate_settings,
             sender=user_model
         )
+        post_init.connect(
+            signals.remember_candidate_state,
+            sender=user_model
+        )
+        post_save.connect(
+            signals.update_candidates_on_user_change,
+            sender=user_model
+        )
+        post_delete.connect(
+            signals.update_candidates_on_user_delete,
+            sender=user_model
+        )
+
+        #
+        # The changes of the candidate index made inside a transaction are
+        # applied when it's over.
+        #
+        request_finished.connect(signals.apply_candidate_changes)
+        task_postrun.connect(signals.apply_candidate_changes)
+
+        settings_model = self.get_model('UserSettings')
+        post_init.connect(
+            signals.remember_settings_availability,
+            sender=settings_model
+        )
+        post_save.connect(
+            signals.invalidate_searches_on_availability_change,
+            sender=settings_model
+        )
+        location_model = self.get_model('LocationUser')
+        post_init.connect(
+            signals.remember_location,
+            sender=location_model
+        )
+        post_save.connect(
+            signals.invalidate_searches_on_location_change,
+            sender=location_model
+        )
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""
+In process index of the candidate teachers of the searches.
+
+Every search starts with the active teachers of a university that impart a
+subject (and, for the meeting now searches, that are available). The index
+keeps those sets as integer bitsets (bit n is the user with id n), so the
+candidates of a search are a couple of bitwise ANDs instead of a join of
+four tables.
+
+The index is built on the first search of every process, and it's kept
+fresh in two ways:
+
+    - The signals of ```User```, ```UserSettings``` and ```SubjectTeacher```
+      mark the changed users. Once the transaction of the change is over
+      (the next search, the end of the request or of the celery task), the
+      bits of those users are read again from the database, so a change
+      that was rolled back never gets into the index.
+    - Every applied change bumps a version shared in the cache, and the
+      changed users are kept in the cache with their version. The other
+      processes read again the bits of the users changed since their
+      version, and only rebuild their whole index when some of those
+      changes are missing (they left the cache, or there are more than
+      CANDIDATE_INDEX_LOG_SIZE of them). The version is only bumped after
+      the commit, so the other processes never read the users before the
+      change.
+"""
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+
+VERSION_KEY = 'candidates:version'
+
+CHANGES_KEY = 'candidates:changes:{0}'
+
+
+def iter_bits(bitset):
+    """
+    Yields the positions of the bits set in the given integer.
+    """
+    while bitset:
+        lowest = bitset & -bitset
+        yield lowest.bit_length() - 1
+        bitset ^= lowest
+
+
+class CandidateIndex(object):
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.version = None
+        self.teachers = 0
+        self.available = 0
+        self.universities = defaultdict(int)
+        self.subjects = defaultdict(int)
+        self.changed_user_ids = set()
+
+    def build(self):
+        """
+        Loads the whole index from the database with three queries.
+        """
+        from tandlr.scheduled_classes.models import SubjectTeacher
+        from tandlr.users.models import User, UserSettings
+
+        version = get_version()
+
+        teachers = 0
+        available = 0
+        universities = defaultdict(int)
+        subjects = defaultdict(int)
+
+        for user_id, university_id in User.objects.filter(
+            is_active=True,
+            is_teacher=True
+        ).values_list('id', 'university_id'):
+            teachers |= 1 << user_id
+
+            if university_id is not None:
+                universities[university_id] |= 1 << user_id
+
+        for teacher_id, subject_id in SubjectTeacher.objects.values_list(
+            'teacher_id',
+            'subject_id'
+        ):
+            subjects[subject_id] |= 1 << teacher_id
+
+        for user_id in UserSettings.objects.filter(
+            available=True
+        ).values_list('user_id', flat=True):
+            available |= 1 << user_id
+
+        with self._lock:
+            self.teachers = teachers
+            self.available = available
+            self.universities = universities
+            self.subjects = subjects
+            self.version = version
+
+    def ensure_fresh(self):
+        """
+        Applies the pending changes and the changes of the other processes,
+        rebuilds the index if some of them are missing.
+        """
+        self.apply_changes()
+
+        version = get_version()
+
+        if self.version == version:
+            return
+
+        user_ids = None
+
+        if self.version is not None:
+            user_ids = get_changes(self.version, version)
+
+        if user_ids is None:
+            self.build()
+            return
+
+        self._reload(user_ids)
+
+        with self._lock:
+            self.version = version
+
+    def candidates(self, university_id, subject_id, available=False):
+        """
+        Returns the sorted ids of the active teachers of the given university
+        that impart the given subject, and are available if requested.
+        """
+        self.ensure_fresh()
+
+        with self._lock:
+            bitset = (
+                self.teachers &
+                self.universities.get(university_id, 0) &
+                self.subjects.get(subject_id, 0)
+            )
+
+            if available:
+                bitset &= self.available
+
+        return list(iter_bits(bitset))
+
+    def mark_changed(self, *user_ids):
+        """
+        Marks the given users as changed, their bits are read again once the
+        current transaction is over. Meanwhile, the index of this process
+        has the changes of the transaction.
+        """
+        with self._lock:
+            self.changed_user_ids.update(user_ids)
+
+        if connection.in_atomic_block:
+            if self.version is not None:
+                self._reload(user_ids)
+        else:
+            self.apply_changes()
+
+    def apply_changes(self):
+        """
+        Reads again the bits of the changed users and bumps the shared
+        version. It does nothing inside a transaction, the changes may not
+        be committed yet.
+        """
+        if connection.in_atomic_block:
+            return
+
+        with self._lock:
+            user_ids, self.changed_user_ids = self.changed_user_ids, set()
+
+        if not user_ids:
+            return
+
+        if self.version is not None:
+            self._reload(user_ids)
+
+        self._bump(user_ids)
+
+    def _reload(self, user_ids):
+        """
+        Loads the bits of the given users from the database with three
+        queries.
+        """
+        from tandlr.scheduled_classes.models import SubjectTeacher
+        from tandlr.users.models import User, UserSettings
+
+        mask = 0
+
+        for user_id in user_ids:
+            mask |= 1 << user_id
+
+        teachers = list(
+            User.objects.filter(
+                pk__in=user_ids,
+                is_active=True,
+                is_teacher=True
+            ).values_list('id', 'university_id')
+        )
+
+        subjects = list(
+            SubjectTeacher.objects.filter(
+                teacher_id__in=user_ids
+            ).values_list('teacher_id', 'subject_id')
+        )
+
+        available = list(
+            UserSettings.objects.filter(
+                user_id__in=user_ids,
+                available=True
+            ).values_list('user_id', flat=True)
+        )
+
+        with self._lock:
+            self.teachers &= ~mask
+            self.available &= ~mask
+
+            for bitsets in (self.universities, self.subjects):
+                for key in list(bitsets):
+                    bitsets[key] &= ~mask
+
+            for user_id, university_id in teachers:
+                self.teachers |= 1 << user_id
+
+                if university_id is not None:
+                    self.universities[university_id] |= 1 << user_id
+
+            for teacher_id, subject_id in subjects:
+                self.subjects[subject_id] |= 1 << teacher_id
+
+            for user_id in available:
+                self.available |= 1 << user_id
+
+    def _bump(self, user_ids):
+        """
+        Bumps the shared version with the given changed users. The index of
+        this process takes the new version only if it had the previous one,
+        otherwise its next search applies the changes that it missed.
+        """
+        previous = self.version
+        version = bump_version(user_ids)
+
+        with self._lock:
+            if previous is not None and version == previous + 1:
+                self.version = version
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+
+    if version is None:
+        cache.add(VERSION_KEY, _initial_version(), None)
+        version = cache.get(VERSION_KEY)
+
+    return version
+
+
+def bump_version(user_ids):
+    """
+    Bumps the shared version and keeps the given changed users with it,
+    returns the new version.
+    """
+    try:
+        version = cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, _initial_version(), None)
+        version = cache.incr(VERSION_KEY)
+
+    cache.set(
+        CHANGES_KEY.format(version),
+        sorted(user_ids),
+        settings.CANDIDATE_INDEX_LOG_TIMEOUT
+    )
+
+    return version
+
+
+def get_changes(since, version):
+    """
+    Returns the ids of the users changed after the given version up to the
+    given one, None if some of the changes are missing.
+    """
+    if not since < version <= since + settings.CANDIDATE_INDEX_LOG_SIZE:
+        return None
+
+    keys = [
+        CHANGES_KEY.format(number) for number in range(since + 1, version + 1)
+    ]
+    changes = cache.get_many(keys)
+
+    if len(changes) < len(keys):
+        return None
+
+    user_ids = set()
+
+    for changed_user_ids in changes.values():
+        user_ids.update(changed_user_ids)
+
+    return user_ids
+
+
+def _initial_version():
+    #
+    # The versions start from the current time, so a process never takes a
+    # version that was evicted from the cache as its own.
+    #
+    return int(time.time() * 1000)
+
+
+_index = CandidateIndex()
+
+
+def get_index():
+    """
+    Returns the candidate index of this process.
+    """
+    return _index
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Spatial helpers for the locations of the users.
+
+The points of the users are stored as ```POINT(latitude longitude)```, so x
+is the latitude and y is the longitude.
+
+Every user gets a ```POINT(0 0)``` placeholder when he is created (see
+```tandlr.users.signals.crate_settings```). The placeholders are left out of
+the partial GiST index ```location_user_point_located_gist```, and the
+queries that want to use it must repeat its condition, see
+```exclude_placeholders```.
+"""
+import math
+
+from django.conf import settings
+from django.contrib.gis.geos import Polygon
+from django.db import connection
+
+
+PLACEHOLDER_POINT = 'SRID=4326;POINT(0 0)'
+
+#
+# Condition of the partial index, it must match the one of the migration
+# ```users.0008_location_user_point_located_gist```.
+#
+PLACEHOLDER_CONDITION = (
+    'NOT (ST_X("location_user"."point") = 0 AND '
+    'ST_Y("location_user"."point") = 0)'
+)
+
+EARTH_RADIUS = 6371.0088
+
+KM_PER_DEGREE = 111.32
+
+
+def exclude_placeholders(queryset):
+    """
+    Excludes the locations that still have the placeholder point from the
+    given ```LocationUser``` queryset.
+    """
+    return queryset.extra(where=[PLACEHOLDER_CONDITION])
+
+
+def get_bbox(latitude, longitude, radius):
+    """
+    Returns the (min_lat, min_lng, max_lat, max_lng) box that contains the
+    circle of the given radius (km) around the given coordinates.
+    """
+    latitude_delta = radius / KM_PER_DEGREE
+    longitude_delta = radius / (
+        KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01)
+    )
+
+    return (
+        max(latitude - latitude_delta, -90),
+        max(longitude - longitude_delta, -180),
+        min(latitude + latitude_delta, 90),
+        min(longitude + longitude_delta, 180)
+    )
+
+
+def distance(latitude_1, longitude_1, latitude_2, longitude_2):
+    """
+    Returns the great circle distance in km between the given coordinates.
+    """
+    latitude_1, longitude_1, latitude_2, longitude_2 = map(
+        math.radians,
+        (latitude_1, longitude_1, latitude_2, longitude_2)
+    )
+
+    a = (
+        math.sin((latitude_2 - latitude_1) / 2) ** 2 +
+        math.cos(latitude_1) * math.cos(latitude_2) *
+        math.sin((longitude_2 - longitude_1) / 2) ** 2
+    )
+
+    return 2 * EARTH_RADIUS * math.asin(min(1, math.sqrt(a)))
+
+
+def nearest_locations(queryset, latitude, longitude, radius=None,
+                      limit=None):
+    """
+    Returns the list of the nearest locations of the given queryset inside
+    the given radius (km), ordered by distance. Every location gets a
+    ```distance``` attribute in km.
+
+    The box that contains the radius is looked up with the spatial index and,
+    in PostGIS, the candidates are ordered by the index with the KNN operator
+    (```<->```). The KNN distance is planar (in degrees), so some extra
+    candidates are fetched and ranked again by their great circle distance.
+    """
+    radius = radius or settings.MEETING_NOW_SEARCH_RADIUS
+    limit = limit or settings.MEETING_NOW_SEARCH_LIMIT
+
+    queryset = exclude_placeholders(queryset).filter(
+        point__within=Polygon.from_bbox(get_bbox(latitude, longitude, radius))
+    )
+
+    if connection.vendor == 'postgresql':
+        queryset = queryset.extra(
+            select={
+                'knn_distance': (
+                    '"location_user"."point" <-> '
+                    'ST_GeomFromEWKT(%s)'
+                )
+            },
+            select_params=[
+                'SRID=4326;POINT({0} {1})'.format(latitude, longitude)
+            ],
+            order_by=['knn_distance']
+        )[:limit * 4]
+
+    return rank_by_distance(queryset, latitude, longitude, radius, limit)
+
+
+def rank_by_distance(locations, latitude, longitude, radius=None, limit=None):
+    """
+    Returns the given locations inside the given radius (km) ordered by
+    their great circle distance, up to the given limit. Every location gets
+    a ```distance``` attribute in km.
+    """
+    radius = radius or settings.MEETING_NOW_SEARCH_RADIUS
+    limit = limit or settings.MEETING_NOW_SEARCH_LIMIT
+    ranked = []
+
+    for location in locations:
+        location.distance = distance(
+            latitude,
+            longitude,
+            location.point.x,
+            location.point.y
+        )
+
+        if location.distance <= radius:
+            ranked.append(location)
+
+    ranked.sort(key=lambda location: location.distance)
+
+    return ranked[:limit]
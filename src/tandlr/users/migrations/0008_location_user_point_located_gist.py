@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+#
+# The placeholder POINT(0 0) given to every new user is left out of the
+# index, see ```tandlr.users.geo```.
+#
+CREATE_INDEX = (
+    'CREATE INDEX location_user_point_located_gist ON location_user '
+    'USING GIST (point) '
+    'WHERE NOT (ST_X("location_user"."point") = 0 AND '
+    'ST_Y("location_user"."point") = 0)'
+)
+
+DROP_INDEX = 'DROP INDEX IF EXISTS location_user_point_located_gist'
+
+
+def create_index(apps, schema_editor):
+    # Partial indexes are only available in PostgreSQL.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_INDEX)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_auto_20160905_2359'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
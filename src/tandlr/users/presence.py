@@ -0,0 +1,468 @@
+# -*- coding: utf-8 -*-
+"""
+Presence of the online teachers for the meeting now searches.
+
+The apps of the teachers send their position very often, so the latest
+position and availability of every online teacher is kept in a presence
+store instead of the ```location_user``` table:
+
+    - The teachers are grouped in geo buckets (cells of PRESENCE_BUCKET_SIZE
+      degrees), so a search only reads the buckets that overlap its box.
+    - The updates that moved less than PRESENCE_MIN_DISTANCE meters in less
+      than PRESENCE_MIN_INTERVAL seconds are dropped.
+    - A teacher is online while his position is younger than PRESENCE_TTL
+      seconds.
+    - The accepted positions are written to ```LocationUser``` periodically
+      by the ```tandlr.users.tasks.flush_presence``` task. The positions of
+      a flush that fails are marked as dirty again, so the next one retries
+      them.
+
+The store is shared by all the workers with the Redis backend, the local
+backend keeps it in the memory of the process and it's meant for tests.
+"""
+import json
+import math
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.gis.geos import GEOSGeometry
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from tandlr.users.geo import distance
+
+
+#
+# Max number of buckets read by a search, bigger boxes read all the online
+# teachers instead.
+#
+MAX_SEARCH_BUCKETS = 400
+
+
+class BasePresenceBackend(object):
+    """
+    Logic of the presence store, the subclasses only implement the storage.
+
+    The entries are dictionaries with the user_id, latitude, longitude,
+    place_description, available and updated_at (timestamp) keys.
+    """
+
+    def get(self, user_id):
+        """
+        Returns the entry of the given user, or None.
+        """
+        raise NotImplementedError
+
+    def get_many(self, user_ids):
+        """
+        Returns the entries of the given users that exist.
+        """
+        raise NotImplementedError
+
+    def set(self, entry, previous=None, dirty=True):
+        """
+        Stores the given entry, previous is the entry that it replaces. The
+        dirty entries are written to the database by the next flush.
+        """
+        raise NotImplementedError
+
+    def members(self, buckets):
+        """
+        Returns the ids of the online users in the given buckets, or of all
+        the online users if buckets is None.
+        """
+        raise NotImplementedError
+
+    def pop_dirty(self):
+        """
+        Returns the dirty entries and marks them as clean.
+        """
+        raise NotImplementedError
+
+    def mark_dirty(self, user_ids):
+        """
+        Marks the entries of the given users as dirty again.
+        """
+        raise NotImplementedError
+
+    def get_bucket(self, latitude, longitude):
+        size = settings.PRESENCE_BUCKET_SIZE
+
+        return (
+            int(math.floor(latitude / size)),
+            int(math.floor(longitude / size))
+        )
+
+    def get_buckets(self, bbox):
+        """
+        Returns the buckets that overlap the given (min_lat, min_lng,
+        max_lat, max_lng) box, or None if there are too many.
+        """
+        min_lat, min_lng = self.get_bucket(bbox[0], bbox[1])
+        max_lat, max_lng = self.get_bucket(bbox[2], bbox[3])
+
+        count = (max_lat - min_lat + 1) * (max_lng - min_lng + 1)
+
+        if count > MAX_SEARCH_BUCKETS:
+            return None
+
+        return [
+            (lat, lng)
+            for lat in range(min_lat, max_lat + 1)
+            for lng in range(min_lng, max_lng + 1)
+        ]
+
+    def is_online(self, entry, now=None):
+        now = now or time.time()
+
+        return entry['updated_at'] > now - settings.PRESENCE_TTL
+
+    def update_location(self, user, latitude, longitude, place_description):
+        """
+        Updates the position of the given user, returns False if the update
+        was dropped because it's too close to the previous one.
+        """
+        now = time.time()
+        previous = self.get(user.id)
+
+        if previous is not None and self.is_online(previous, now):
+            moved = distance(
+                previous['latitude'],
+                previous['longitude'],
+                latitude,
+                longitude
+            ) * 1000
+
+            elapsed = now - previous['updated_at']
+
+            if (
+                moved < settings.PRESENCE_MIN_DISTANCE and
+                elapsed < settings.PRESENCE_MIN_INTERVAL and
+                previous['place_description'] == place_description
+            ):
+                return False
+
+        if previous is not None:
+            available = previous['available']
+        else:
+            available = user.settings.available
+
+        self.set(
+            {
+                'user_id': user.id,
+                'latitude': latitude,
+                'longitude': longitude,
+                'place_description': place_description,
+                'available': available,
+                'updated_at': now
+            },
+            previous=previous
+        )
+
+        return True
+
+    def set_available(self, user_id, available):
+        """
+        Updates the availability of the given user, if he's in the store.
+        """
+        entry = self.get(user_id)
+
+        if entry is not None and entry['available'] != available:
+            updated = dict(entry, available=available)
+            self.set(updated, previous=entry, dirty=False)
+
+    def search(self, bbox):
+        """
+        Returns the entries of the online and available users inside the
+        given (min_lat, min_lng, max_lat, max_lng) box.
+        """
+        now = time.time()
+        entries = self.get_many(self.members(self.get_buckets(bbox)))
+
+        return [
+            entry for entry in entries
+            if entry['available'] and self.is_online(entry, now) and
+            bbox[0] <= entry['latitude'] <= bbox[2] and
+            bbox[1] <= entry['longitude'] <= bbox[3]
+        ]
+
+    def locations_within(self, queryset, bbox):
+        """
+        Returns the locations of the given ```LocationUser``` queryset that
+        belong to online and available users inside the given box, with
+        their latest position.
+        """
+        entries = dict(
+            (entry['user_id'], entry) for entry in self.search(bbox)
+        )
+
+        if not entries:
+            return []
+
+        locations = list(
+            queryset.filter(
+                user_id__in=list(entries)
+            ).order_by(
+                'user_id'
+            )
+        )
+
+        for location in locations:
+            self._apply(location, entries[location.user_id])
+
+        return locations
+
+    def apply_positions(self, locations):
+        """
+        Replaces the position of the given locations by the latest one of the
+        store.
+        """
+        entries = dict(
+            (entry['user_id'], entry)
+            for entry in self.get_many(
+                [location.user_id for location in locations]
+            )
+        )
+
+        for location in locations:
+            if location.user_id in entries:
+                self._apply(location, entries[location.user_id])
+
+        return locations
+
+    def flush(self):
+        """
+        Writes the dirty positions to ```LocationUser```, returns the number
+        of written positions.
+        """
+        from .models import LocationUser
+        from .search_cache import bump_users_versions
+
+        entries = self.pop_dirty()
+
+        try:
+            with transaction.atomic():
+                for entry in entries:
+                    point = _make_point(entry)
+                    updated = LocationUser.objects.filter(
+                        user_id=entry['user_id']
+                    ).update(
+                        point=point,
+                        place_description=entry['place_description']
+                    )
+
+                    if not updated:
+                        LocationUser.objects.create(
+                            user_id=entry['user_id'],
+                            point=point,
+                            place_description=entry['place_description']
+                        )
+        except Exception:
+            #
+            # The next flush writes the latest positions of these users.
+            #
+            self.mark_dirty([entry['user_id'] for entry in entries])
+            raise
+
+        #
+        # The positions are written without the signals of the model, the
+        # cached searches of the moved teachers are invalidated here.
+        #
+        if entries:
+            bump_users_versions([entry['user_id'] for entry in entries])
+
+        return len(entries)
+
+    def _apply(self, location, entry):
+        location.point = _make_point(entry)
+        location.place_description = entry['place_description']
+
+
+class LocalPresenceBackend(BasePresenceBackend):
+    """
+    Presence store in the memory of the process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._buckets = defaultdict(set)
+        self._dirty = set()
+
+    def get(self, user_id):
+        return self._entries.get(user_id)
+
+    def get_many(self, user_ids):
+        return [
+            self._entries[user_id] for user_id in user_ids
+            if user_id in self._entries
+        ]
+
+    def set(self, entry, previous=None, dirty=True):
+        with self._lock:
+            if previous is not None:
+                previous_bucket = self.get_bucket(
+                    previous['latitude'],
+                    previous['longitude']
+                )
+                self._buckets[previous_bucket].discard(previous['user_id'])
+
+            self._entries[entry['user_id']] = entry
+            self._buckets[
+                self.get_bucket(entry['latitude'], entry['longitude'])
+            ].add(entry['user_id'])
+
+            if dirty:
+                self._dirty.add(entry['user_id'])
+
+    def members(self, buckets):
+        if buckets is None:
+            return list(self._entries)
+
+        user_ids = set()
+
+        for bucket in buckets:
+            user_ids.update(self._buckets.get(bucket, ()))
+
+        return list(user_ids)
+
+    def pop_dirty(self):
+        with self._lock:
+            user_ids, self._dirty = self._dirty, set()
+
+        return self.get_many(user_ids)
+
+    def mark_dirty(self, user_ids):
+        with self._lock:
+            self._dirty.update(user_ids)
+
+
+class RedisPresenceBackend(BasePresenceBackend):
+    """
+    Presence store in Redis, shared by all the workers.
+
+    Every entry is a JSON string that expires after PRESENCE_TTL seconds,
+    the buckets are sorted sets scored by the time of the last update, so
+    the users that went offline are removed from them when they are read.
+    """
+    ENTRY_KEY = 'presence:user:{0}'
+    BUCKET_KEY = 'presence:bucket:{0}:{1}'
+    ONLINE_KEY = 'presence:online'
+    DIRTY_KEY = 'presence:dirty'
+
+    def __init__(self):
+        from django_redis import get_redis_connection
+
+        self.redis = get_redis_connection('default')
+
+    def get(self, user_id):
+        value = self.redis.get(self.ENTRY_KEY.format(user_id))
+
+        return json.loads(value) if value else None
+
+    def get_many(self, user_ids):
+        if not user_ids:
+            return []
+
+        values = self.redis.mget(
+            [self.ENTRY_KEY.format(user_id) for user_id in user_ids]
+        )
+
+        return [json.loads(value) for value in values if value]
+
+    def set(self, entry, previous=None, dirty=True):
+        user_id = entry['user_id']
+        bucket = self.get_bucket(entry['latitude'], entry['longitude'])
+
+        pipeline = self.redis.pipeline()
+
+        if previous is not None:
+            previous_bucket = self.get_bucket(
+                previous['latitude'],
+                previous['longitude']
+            )
+
+            if previous_bucket != bucket:
+                pipeline.zrem(
+                    self.BUCKET_KEY.format(*previous_bucket),
+                    user_id
+                )
+
+        pipeline.set(
+            self.ENTRY_KEY.format(user_id),
+            json.dumps(entry),
+            ex=settings.PRESENCE_TTL
+        )
+        pipeline.zadd(
+            self.BUCKET_KEY.format(*bucket),
+            entry['updated_at'],
+            user_id
+        )
+        pipeline.zadd(self.ONLINE_KEY, entry['updated_at'], user_id)
+
+        if dirty:
+            pipeline.sadd(self.DIRTY_KEY, user_id)
+
+        pipeline.execute()
+
+    def members(self, buckets):
+        if buckets is None:
+            keys = [self.ONLINE_KEY]
+        else:
+            keys = [self.BUCKET_KEY.format(*bucket) for bucket in buckets]
+
+        offline = time.time() - settings.PRESENCE_TTL
+        pipeline = self.redis.pipeline()
+
+        for key in keys:
+            pipeline.zremrangebyscore(key, '-inf', offline)
+            pipeline.zrange(key, 0, -1)
+
+        user_ids = set()
+
+        for members in pipeline.execute()[1::2]:
+            user_ids.update(int(user_id) for user_id in members)
+
+        return list(user_ids)
+
+    def pop_dirty(self):
+        pipeline = self.redis.pipeline()
+        pipeline.smembers(self.DIRTY_KEY)
+        pipeline.delete(self.DIRTY_KEY)
+        user_ids = pipeline.execute()[0]
+
+        return self.get_many([int(user_id) for user_id in user_ids])
+
+    def mark_dirty(self, user_ids):
+        if user_ids:
+            self.redis.sadd(self.DIRTY_KEY, *user_ids)
+
+
+_backend = None
+
+
+def get_backend():
+    """
+    Returns the presence backend configured in PRESENCE_BACKEND, or None if
+    the presence store is disabled.
+    """
+    global _backend
+
+    if not settings.PRESENCE_BACKEND:
+        return None
+
+    if _backend is None:
+        _backend = import_string(settings.PRESENCE_BACKEND)()
+
+    return _backend
+
+
+def _make_point(entry):
+    return GEOSGeometry(
+        'SRID=4326;POINT({0} {1})'.format(
+            entry['latitude'],
+            entry['longitude']
+        )
+    )
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Ranking of the teachers found by the searches.
+
+The features of all the candidates are loaded in NumPy arrays and scored in
+a single vectorized pass:
+
+    - rating: ```UserSummary.score_average_teacher```, higher is better.
+    - sessions: ```UserSummary.sessions_as_teacher``` (logarithmic), higher
+      is better.
+    - distance: great circle distance to the location of the student, lower
+      is better.
+    - price: ```Subject.price_per_hour```, lower is better.
+
+Every feature is scaled to [0, 1] among the candidates and weighted with
+TEACHER_RANKING_WEIGHTS.
+"""
+from django.conf import settings
+
+import numpy as np
+
+from tandlr.users.geo import EARTH_RADIUS
+
+
+#
+# Direction of every feature, 1 when higher values are better and -1 when
+# lower values are better.
+#
+FEATURES = (
+    ('rating', 1),
+    ('sessions', 1),
+    ('distance', -1),
+    ('price', -1),
+)
+
+
+def scale(values):
+    """
+    Scales the given array to [0, 1], the missing values (NaN) get the mean
+    of the others.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    missing = np.isnan(values)
+
+    if missing.all():
+        return np.zeros_like(values)
+
+    if missing.any():
+        values[missing] = values[~missing].mean()
+
+    low = values.min()
+    spread = values.max() - low
+
+    if spread == 0:
+        return np.zeros_like(values)
+
+    return (values - low) / spread
+
+
+def distances(latitudes, longitudes, origin):
+    """
+    Returns the great circle distances (km) of the given coordinates arrays
+    to the given (latitude, longitude) origin.
+    """
+    latitudes = np.radians(latitudes)
+    longitudes = np.radians(longitudes)
+    origin_latitude, origin_longitude = np.radians(origin)
+
+    a = (
+        np.sin((latitudes - origin_latitude) / 2) ** 2 +
+        np.cos(origin_latitude) * np.cos(latitudes) *
+        np.sin((longitudes - origin_longitude) / 2) ** 2
+    )
+
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1)))
+
+
+def rank(ids, ratings, sessions, latitudes, longitudes, prices, origin=None,
+         limit=None):
+    """
+    Returns the top ids by their weighted score, best first.
+
+    ratings, sessions, latitudes, longitudes and prices are sequences in the
+    same order as ids, the missing values must be None. The distance is
+    ignored if there isn't an origin.
+    """
+    ids = np.asarray(ids)
+    limit = limit or settings.TEACHER_RANKING_LIMIT
+
+    if not len(ids):
+        return []
+
+    features = {
+        'rating': scale(np.array(ratings, dtype=np.float64)),
+        'sessions': scale(np.log1p(np.array(sessions, dtype=np.float64))),
+        'price': scale(np.array(prices, dtype=np.float64)),
+    }
+
+    if origin is not None:
+        features['distance'] = scale(
+            distances(
+                np.array(latitudes, dtype=np.float64),
+                np.array(longitudes, dtype=np.float64),
+                origin
+            )
+        )
+
+    weights = settings.TEACHER_RANKING_WEIGHTS
+    scores = np.zeros(len(ids))
+
+    for name, direction in FEATURES:
+        if name in features:
+            scores += direction * weights.get(name, 0) * features[name]
+
+    if limit < len(ids):
+        top = np.argpartition(-scores, limit - 1)[:limit]
+    else:
+        top = np.arange(len(ids))
+
+    # Best score first, ties by id to keep the pagination stable.
+    top = top[np.lexsort((ids[top], -scores[top]))]
+
+    return ids[top].tolist()
+
+
+def rank_locations(locations, origin=None, price_per_hour=None, limit=None):
+    """
+    Returns the top ids of the given ```LocationUser``` queryset or list.
+
+    The price of all the candidates is the price of the searched subject,
+    so it only changes the ranking if the candidates come from several
+    subjects.
+    """
+    if isinstance(locations, list):
+        rows = [
+            (
+                location.pk,
+                location.user.user_summary.score_average_teacher,
+                location.user.user_summary.sessions_as_teacher,
+                location.point.x,
+                location.point.y
+            )
+            for location in locations
+        ]
+    else:
+        rows = locations.extra(
+            select={
+                'latitude': 'ST_X("location_user"."point")',
+                'longitude': 'ST_Y("location_user"."point")'
+            }
+        ).values_list(
+            'pk',
+            'user__user_summary__score_average_teacher',
+            'user__user_summary__sessions_as_teacher',
+            'latitude',
+            'longitude'
+        )
+
+    rows = list(rows)
+
+    if not rows:
+        return []
+
+    ids, ratings, sessions, latitudes, longitudes = zip(*rows)
+
+    return rank(
+        ids,
+        ratings,
+        [value or 0 for value in sessions],
+        latitudes,
+        longitudes,
+        [price_per_hour] * len(ids),
+        origin=origin,
+        limit=limit
+    )
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+Shared cache of the results of the teachers search endpoints.
+
+The results are cached by the normalized query of the search, the rounded
+location of the user (the ranked searches depend on it) and by the version
+of the university of the user. The version is bumped every time
+something that changes the results of the searches of the university
+changes (slots, sessions, subjects of the teachers, availability and
+locations), so a cached result is never served after such a change.
+
+Only the ids of the results are cached, they are loaded again from the
+database on every request.
+
+When some workers miss the same key at the same time only one of them
+computes the result, the others wait until it is in the cache.
+"""
+import hashlib
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+
+from tandlr.users.models import User
+
+
+VERSION_KEY = 'search:version:{0}'
+
+RESULT_KEY = 'search:{0}:{1}:{2}:{3}'
+
+#
+# Query parameters of the searches that are part of the key.
+#
+SEARCH_PARAMS = (
+    'subject',
+    'scheduling_datetime',
+    'duration',
+    'timezone_conf',
+    'lat_1',
+    'lat_2',
+    'lng_1',
+    'lng_2',
+    'lat',
+    'lng',
+    'radius',
+    'limit',
+)
+
+#
+# Decimals of the location of the user in the key (about 1 km).
+#
+ORIGIN_DECIMALS = 2
+
+#
+# Seconds between the checks of the workers that wait for a result.
+#
+WAIT_INTERVAL = 0.05
+
+
+def get_version(university_id):
+    """
+    Returns the current version of the searches of the given university.
+    """
+    key = VERSION_KEY.format(university_id)
+    version = cache.get(key)
+
+    if version is None:
+        cache.add(key, _initial_version(), None)
+        version = cache.get(key)
+
+    return version
+
+
+def bump_version(university_id):
+    """
+    Invalidates the cached searches of the given university.
+    """
+    key = VERSION_KEY.format(university_id)
+
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _initial_version(), None)
+
+
+def bump_user_version(user_id):
+    """
+    Invalidates the cached searches of the university of the given user.
+    """
+    university_id = User.objects.filter(
+        pk=user_id
+    ).values_list(
+        'university_id',
+        flat=True
+    ).first()
+
+    if university_id is not None:
+        bump_version(university_id)
+
+
+def bump_users_versions(user_ids):
+    """
+    Invalidates the cached searches of the universities of the given users.
+    """
+    university_ids = set(
+        User.objects.filter(
+            pk__in=user_ids,
+            university_id__isnull=False
+        ).values_list(
+            'university_id',
+            flat=True
+        )
+    )
+
+    for university_id in university_ids:
+        bump_version(university_id)
+
+
+def normalize_param(name, value):
+    """
+    Returns the normalized value of the given query parameter, so the same
+    search always gets the same key.
+    """
+    try:
+        if name == 'scheduling_datetime':
+            return datetime.strptime(
+                value,
+                '%Y-%m-%dT%H:%M:%S.%fZ'
+            ).strftime('%Y-%m-%dT%H:%M')
+
+        if name in ('subject', 'timezone_conf', 'limit'):
+            return str(int(value))
+
+        if name in ('lat_1', 'lat_2', 'lng_1', 'lng_2', 'lat', 'lng'):
+            return '{0:.6f}'.format(float(value))
+
+        if name == 'radius':
+            return '{0:.3f}'.format(float(value))
+    except ValueError:
+        pass
+
+    return value.strip()
+
+
+def round_origin(origin):
+    """
+    Returns the given (latitude, longitude) origin rounded to
+    ORIGIN_DECIMALS, or None.
+    """
+    if origin is None:
+        return None
+
+    return tuple(round(value, ORIGIN_DECIMALS) for value in origin)
+
+
+def make_key(name, request, origin=None):
+    """
+    Returns the cache key of the search of the given request, from the
+    given origin, which must be rounded with ```round_origin```.
+    """
+    user = request.user
+    params = []
+
+    for param in SEARCH_PARAMS:
+        value = request.query_params.get(param)
+
+        if value:
+            params.append((param, normalize_param(param, value)))
+
+    excluded_users_ids = set(
+        int(user_id) for user_id in request.query_params.get(
+            'excluded_users_ids',
+            ''
+        ).split(',') if user_id.strip().isdigit()
+    )
+
+    #
+    # The user is always excluded from the results, it only matters when he
+    # is a teacher too.
+    #
+    if user.is_teacher:
+        excluded_users_ids.add(user.id)
+
+    params.append(('excluded_users_ids', sorted(excluded_users_ids)))
+    params.append(('origin', origin))
+
+    return RESULT_KEY.format(
+        name,
+        user.university_id,
+        get_version(user.university_id),
+        hashlib.md5(repr(params).encode('utf-8')).hexdigest()
+    )
+
+
+def get_or_compute(key, compute):
+    """
+    Returns the cached value of the given key, or computes it with the given
+    function and caches it.
+
+    Only one worker computes a missing key at the same time, the others wait
+    for its result until the lock expires.
+    """
+    value = cache.get(key)
+
+    if value is not None:
+        return value
+
+    lock_key = '{0}:lock'.format(key)
+    lock_timeout = settings.SEARCH_CACHE_LOCK_TIMEOUT
+
+    if not cache.add(lock_key, True, lock_timeout):
+        deadline = time.time() + lock_timeout
+
+        while time.time() < deadline:
+            time.sleep(WAIT_INTERVAL)
+            value = cache.get(key)
+
+            if value is not None:
+                return value
+
+            # The worker that had the lock failed.
+            if cache.get(lock_key) is None:
+                break
+
+    try:
+        value = compute()
+        cache.set(key, value, settings.SEARCH_CACHE_TIMEOUT)
+    finally:
+        cache.delete(lock_key)
+
+    return value
+
+
+def _initial_version():
+    #
+    # The versions start from the current time, so the keys of a version
+    # that was evicted from the cache are never used again.
+    #
+    return int(time.time() * 1000)
@@ -521,6 +521,16 @@ class UserTeacherDetailV2Serializer(serializers.ModelSerializer):
         return instance.get_rating_as_a_student()
 
     def get_price_per_hour(self, obj):
+        #
+        # The searches load the price of the subject once for all the
+        # teachers (see ```SubjectPriceContextMixin```).
+        #
+        if 'subject_price_per_hour' in self.context:
+            if obj.is_teacher:
+                return self.context['subject_price_per_hour']
+
+            return None
+
         subject_id = self.context.get('request').query_params.get('subject')
         return obj.price_per_hour(subject_id)
 
@@ -530,6 +540,7 @@ class LocationTeacherV2Serializer(serializers.ModelSerializer):
     user = UserTeacherDetailV2Serializer()
     latitude = serializers.SerializerMethodField()
     longitude = serializers.SerializerMethodField()
+    distance = serializers.SerializerMethodField()
 
     class Meta:
         model = LocationUser
@@ -537,7 +548,8 @@ class LocationTeacherV2Serializer(serializers.ModelSerializer):
             'user',
             'place_description',
             'latitude',
-            'longitude'
+            'longitude',
+            'distance'
         )
 
     def get_latitude(self, obj):
@@ -546,6 +558,15 @@ class LocationTeacherV2Serializer(serializers.ModelSerializer):
     def get_longitude(self, obj):
         return obj.point.get_y()
 
+    def get_distance(self, obj):
+        """
+        Distance (km) to the searched point, only in the nearest teachers
+        search.
+        """
+        distance = getattr(obj, 'distance', None)
+
+        return round(distance, 3) if distance is not None else None
+
 
 class DeviceUserV2Serializer(serializers.ModelSerializer):
 
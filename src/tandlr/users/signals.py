@@ -40,3 +40,109 @@ def crate_settings(sender, instance, created, *args, **kwargs):
 
         point = GEOSGeometry('SRID=4326;POINT({0} {1})'.format(0, 0))
         LocationUser.objects.create(user=instance, point=point)
+
+
+def remember_settings_availability(sender, instance, **kwargs):
+    """
+    Keeps the availability of the user, to know later if it was changed.
+    """
+    instance._initial_available = instance.available
+
+
+def invalidate_searches_on_availability_change(sender, instance, created,
+                                               *args, **kwargs):
+    """
+    Invalidates the cached teacher searches of the university of the user
+    and updates his presence and the candidate index when his availability
+    changes.
+    """
+    from .candidates import get_index
+    from .presence import get_backend
+    from .search_cache import bump_user_version
+
+    initial_available = getattr(instance, '_initial_available', None)
+
+    if created or initial_available != instance.available:
+        bump_user_version(instance.user_id)
+        get_index().mark_changed(instance.user_id)
+
+        presence = get_backend()
+
+        if presence is not None:
+            presence.set_available(instance.user_id, instance.available)
+
+    instance._initial_available = instance.available
+
+
+def _location_state(instance):
+    return instance.point.coords if instance.point else None
+
+
+def remember_location(sender, instance, **kwargs):
+    """
+    Keeps the position of the user, to know later if it was changed.
+    """
+    instance._initial_location = _location_state(instance)
+
+
+def invalidate_searches_on_location_change(sender, instance, created,
+                                           *args, **kwargs):
+    """
+    Invalidates the cached teacher searches of the university of the user
+    when his position changes.
+    """
+    from .search_cache import bump_user_version
+
+    location = _location_state(instance)
+
+    if created or getattr(instance, '_initial_location', None) != location:
+        bump_user_version(instance.user_id)
+
+    instance._initial_location = location
+
+
+def _candidate_state(instance):
+    return (instance.is_active, instance.is_teacher, instance.university_id)
+
+
+def remember_candidate_state(sender, instance, **kwargs):
+    """
+    Keeps the values of the user that make him a candidate of the teacher
+    searches, to know later if they were changed.
+    """
+    instance._candidate_state = _candidate_state(instance)
+
+
+def update_candidates_on_user_change(sender, instance, created, *args,
+                                     **kwargs):
+    """
+    Updates the candidate index when a user becomes or stops being a
+    teacher, or changes of university.
+    """
+    from .candidates import get_index
+
+    state = _candidate_state(instance)
+
+    if created or getattr(instance, '_candidate_state', None) != state:
+        get_index().mark_changed(instance.id)
+
+    instance._candidate_state = state
+
+
+def update_candidates_on_user_delete(sender, instance, *args, **kwargs):
+    """
+    Removes the deleted user from the candidate index.
+    """
+    from .candidates import get_index
+
+    get_index().mark_changed(instance.id)
+
+
+def apply_candidate_changes(sender, **kwargs):
+    """
+    Applies the changes of the candidate index made by the request or the
+    task that just finished.
+    """
+    from .candidates import get_index
+
+    get_index().apply_changes()
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+from celery import shared_task
+
+from .presence import get_backend
+
+
+@shared_task
+def flush_presence():
+    """
+    Writes the latest positions of the presence store to the locations of
+    the users.
+    """
+    backend = get_backend()
+
+    if backend is not None:
+        backend.flush()
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TransactionTestCase
+
+from tandlr.catalogues.models import University
+from tandlr.scheduled_classes.models import Subject, SubjectTeacher
+from tandlr.users.candidates import (
+    CHANGES_KEY,
+    CandidateIndex,
+    get_index,
+    get_version,
+    iter_bits
+)
+from tandlr.users.models import User
+
+
+class CandidateIndexTestCase(TransactionTestCase):
+    """
+    The changes are applied to the index after their commit, the tests run
+    outside of a transaction.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+        self.university = University.objects.create(
+            name='University',
+            initial='U'
+        )
+        self.subject = Subject.objects.create(
+            name='Math',
+            university=self.university,
+            price_per_hour=20
+        )
+        self.teacher = User.objects.create_user(
+            username='teacher',
+            email='teacher@example.com',
+            password='secret',
+            is_teacher=True,
+            university=self.university
+        )
+        SubjectTeacher.objects.create(
+            teacher=self.teacher,
+            subject=self.subject
+        )
+
+    def test_iter_bits(self):
+        self.assertEqual(list(iter_bits(0)), [])
+        self.assertEqual(list(iter_bits(0b100101)), [0, 2, 5])
+
+    def test_signals_keep_the_index_fresh(self):
+        index = get_index()
+
+        self.assertEqual(
+            index.candidates(self.university.id, self.subject.id),
+            [self.teacher.id]
+        )
+
+        settings = self.teacher.settings
+        settings.available = True
+        settings.save()
+
+        self.assertEqual(
+            index.candidates(
+                self.university.id,
+                self.subject.id,
+                available=True
+            ),
+            [self.teacher.id]
+        )
+
+        self.teacher.is_active = False
+        self.teacher.save()
+
+        self.assertEqual(
+            index.candidates(self.university.id, self.subject.id),
+            []
+        )
+
+    def create_other_index(self):
+        """
+        Returns the index of another process, which counts its builds.
+        """
+        other = CandidateIndex()
+        other.build()
+        other.builds = 0
+        build = other.build
+
+        def count_build():
+            other.builds += 1
+            build()
+
+        other.build = count_build
+
+        return other
+
+    def test_other_processes_apply_the_changes(self):
+        other = self.create_other_index()
+
+        SubjectTeacher.objects.filter(teacher=self.teacher).delete()
+
+        # The deletes signal inside their transaction, the change is applied
+        # at the end of the request.
+        get_index().apply_changes()
+
+        self.assertEqual(
+            other.candidates(self.university.id, self.subject.id),
+            []
+        )
+        self.assertEqual(other.builds, 0)
+
+    def test_other_processes_rebuild_after_missing_changes(self):
+        other = self.create_other_index()
+
+        SubjectTeacher.objects.filter(teacher=self.teacher).delete()
+        get_index().apply_changes()
+
+        cache.delete(CHANGES_KEY.format(get_version()))
+
+        self.assertEqual(
+            other.candidates(self.university.id, self.subject.id),
+            []
+        )
+        self.assertEqual(other.builds, 1)
+
+    def test_rolled_back_changes_are_not_applied(self):
+        index = get_index()
+        index.candidates(self.university.id, self.subject.id)
+        version = get_version()
+
+        try:
+            with transaction.atomic():
+                SubjectTeacher.objects.filter(teacher=self.teacher).delete()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+        # The other processes weren't told about the change.
+        self.assertEqual(get_version(), version)
+
+        self.assertEqual(
+            index.candidates(self.university.id, self.subject.id),
+            [self.teacher.id]
+        )
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+from django.core.cache import cache
+from django.test import TestCase
+
+from tandlr.catalogues.models import University
+from tandlr.users import presence, search_cache
+from tandlr.users.models import LocationUser, User
+from tandlr.users.presence import LocalPresenceBackend
+
+
+class LocalPresenceBackendTestCase(TestCase):
+    """
+    Tests for ```tandlr.users.presence``` with the local backend.
+    """
+    def setUp(self):
+        self.presence = LocalPresenceBackend()
+        self.teacher = User.objects.create_user(
+            username='teacher',
+            email='teacher@example.com',
+            password='secret',
+            is_teacher=True
+        )
+        self.teacher.settings.available = True
+        self.teacher.settings.save()
+
+    def test_drops_small_updates(self):
+        self.assertTrue(
+            self.presence.update_location(self.teacher, 19.4326, -99.1332, 'A')
+        )
+
+        # About 10 meters away.
+        self.assertFalse(
+            self.presence.update_location(self.teacher, 19.4327, -99.1332, 'A')
+        )
+
+        # About 1 km away.
+        self.assertTrue(
+            self.presence.update_location(self.teacher, 19.4416, -99.1332, 'A')
+        )
+
+    def test_search_and_flush(self):
+        self.presence.update_location(self.teacher, 19.4326, -99.1332, 'A')
+
+        self.assertEqual(
+            [
+                entry['user_id']
+                for entry in self.presence.search((19, -100, 20, -99))
+            ],
+            [self.teacher.id]
+        )
+        self.assertEqual(self.presence.search((20, -100, 21, -99)), [])
+
+        self.presence.set_available(self.teacher.id, False)
+        self.assertEqual(self.presence.search((19, -100, 20, -99)), [])
+
+        self.assertEqual(self.presence.flush(), 1)
+        self.assertEqual(self.presence.flush(), 0)
+
+        location = LocationUser.objects.get(user=self.teacher)
+        self.assertEqual(location.point.x, 19.4326)
+        self.assertEqual(location.point.y, -99.1332)
+
+    def test_flush_invalidates_searches(self):
+        cache.clear()
+        university = University.objects.create(name='University', initial='U')
+        self.teacher.university = university
+        self.teacher.save()
+
+        version = search_cache.get_version(university.id)
+        self.presence.update_location(self.teacher, 19.4326, -99.1332, 'A')
+        self.presence.flush()
+
+        self.assertNotEqual(search_cache.get_version(university.id), version)
+
+    def test_failed_flush_is_retried(self):
+        cache.clear()
+        university = University.objects.create(name='University', initial='U')
+        self.teacher.university = university
+        self.teacher.save()
+
+        version = search_cache.get_version(university.id)
+        self.presence.update_location(self.teacher, 19.4326, -99.1332, 'A')
+
+        make_point = presence._make_point
+
+        def fail(entry):
+            raise ValueError('The point could not be built')
+
+        presence._make_point = fail
+
+        try:
+            with self.assertRaises(ValueError):
+                self.presence.flush()
+        finally:
+            presence._make_point = make_point
+
+        # Nothing was written and the searches are still valid.
+        location = LocationUser.objects.get(user=self.teacher)
+        self.assertEqual((location.point.x, location.point.y), (0, 0))
+        self.assertEqual(search_cache.get_version(university.id), version)
+
+        # The position is written by the next flush.
+        self.assertEqual(self.presence.flush(), 1)
+
+        location = LocationUser.objects.get(user=self.teacher)
+        self.assertEqual(location.point.x, 19.4326)
+        self.assertNotEqual(search_cache.get_version(university.id), version)
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from django.test import SimpleTestCase, override_settings
+
+from tandlr.users import ranking
+
+
+@override_settings(
+    TEACHER_RANKING_WEIGHTS={
+        'rating': 0.5,
+        'sessions': 0.2,
+        'distance': 0.3,
+        'price': 0
+    },
+    TEACHER_RANKING_LIMIT=2
+)
+class RankTestCase(SimpleTestCase):
+    """
+    Tests for ```tandlr.users.ranking.rank```.
+    """
+    def test_rank_by_weighted_features(self):
+        ids = ranking.rank(
+            [1, 2, 3],
+            [3.0, 5.0, None],
+            [10, 10, 10],
+            [19.43, 19.43, 19.43],
+            [-99.13, -99.13, -99.13],
+            [20, 20, 20]
+        )
+
+        # The teacher without rating gets the mean one.
+        self.assertEqual(ids, [2, 3])
+
+    def test_closer_teachers_win_ties(self):
+        ids = ranking.rank(
+            [1, 2, 3],
+            [5.0, 5.0, 5.0],
+            [10, 10, 10],
+            [19.9, 19.5, 19.43],
+            [-99.13, -99.13, -99.13],
+            [20, 20, 20],
+            origin=(19.43, -99.13)
+        )
+
+        self.assertEqual(ids, [3, 2])
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime, time, timedelta
+
+from django.contrib.gis.geos import GEOSGeometry
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+
+from tandlr.catalogues.models import University
+from tandlr.reports.models import UnmetSearch
+from tandlr.scheduled_classes import freebusy
+from tandlr.scheduled_classes.models import Slot, Subject, SubjectTeacher
+from tandlr.users import geo, search_cache
+from tandlr.users.models import LocationUser, User
+
+
+class SearchTeacherQueriesTestCase(TestCase):
+    """
+    The number of queries of the teachers search must not depend on the
+    number of teachers found.
+    """
+    fixtures = ['class_status']
+
+    def setUp(self):
+        self.university = University.objects.create(
+            name='University',
+            initial='U'
+        )
+        self.subject = Subject.objects.create(
+            name='Math',
+            university=self.university,
+            price_per_hour=20
+        )
+        self.student = User.objects.create_user(
+            username='student',
+            email='student@example.com',
+            password='secret',
+            is_student=True,
+            university=self.university
+        )
+        self.teachers_count = 0
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.student)
+
+        self.day = timezone.now().date() + timedelta(days=1)
+
+    def create_teachers(self, count):
+        teacher_ids = []
+
+        for index in range(self.teachers_count, self.teachers_count + count):
+            teacher = User.objects.create_user(
+                username='teacher{}'.format(index),
+                email='teacher{}@example.com'.format(index),
+                password='secret',
+                is_teacher=True,
+                university=self.university
+            )
+            SubjectTeacher.objects.create(
+                teacher=teacher,
+                subject=self.subject
+            )
+            Slot.objects.create(
+                teacher=teacher,
+                start_time=time(8, 0),
+                end_time=time(12, 0),
+                is_unique=True,
+                date=self.day
+            )
+            teacher_ids.append(teacher.id)
+
+        freebusy.refresh_teacher_availability(teacher_ids)
+        self.teachers_count += count
+
+    def search(self):
+        cache.clear()
+
+        # 10:00 in UTC-5.
+        scheduling_datetime = datetime.combine(self.day, time(15, 0))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('api:v2:search-teacher-list'),
+                {
+                    'subject': self.subject.id,
+                    'scheduling_datetime': scheduling_datetime.strftime(
+                        '%Y-%m-%dT%H:%M:%S.%fZ'
+                    ),
+                    'duration': '01:00',
+                    'timezone_conf': -5,
+                    'page_size': 50
+                }
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], self.teachers_count)
+
+        return len(queries)
+
+    def test_queries_do_not_depend_on_results(self):
+        self.create_teachers(5)
+        queries = self.search()
+
+        self.create_teachers(45)
+        self.assertEqual(self.search(), queries)
+
+    @override_settings(TEACHER_RANKING_WEIGHTS={'distance': 1})
+    def test_ranking_depends_on_the_student_location(self):
+        cache.clear()
+        self.create_teachers(2)
+        other_student = User.objects.create_user(
+            username='other_student',
+            email='other_student@example.com',
+            password='secret',
+            is_student=True,
+            university=self.university
+        )
+        scheduling_datetime = datetime.combine(self.day, time(15, 0))
+
+        for user, point in (
+            (User.objects.get(username='teacher0'), '19.43 -99.13'),
+            (User.objects.get(username='teacher1'), '40.71 -74.0'),
+            (self.student, '19.4 -99.1'),
+            (other_student, '40.7 -74.01'),
+        ):
+            user.location_user.point = GEOSGeometry(
+                'SRID=4326;POINT({0})'.format(point)
+            )
+            user.location_user.save()
+
+        # The same search, each student gets his nearest teacher first.
+        for student, latitude in (
+            (self.student, 19.43),
+            (other_student, 40.71)
+        ):
+            self.client.force_authenticate(user=student)
+            response = self.client.get(
+                reverse('api:v2:search-teacher-list'),
+                {
+                    'subject': self.subject.id,
+                    'scheduling_datetime': scheduling_datetime.strftime(
+                        '%Y-%m-%dT%H:%M:%S.%fZ'
+                    ),
+                    'duration': '01:00',
+                    'timezone_conf': -5
+                }
+            )
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['results'][0]['latitude'], latitude)
+
+    def test_invalid_subject(self):
+        response = self.client.get(
+            reverse('api:v2:search-teacher-list'),
+            {'subject': 'math'}
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_unmet_searches_are_logged_when_cached(self):
+        cache.clear()
+        scheduling_datetime = datetime.combine(self.day, time(15, 0))
+
+        for _ in range(2):
+            response = self.client.get(
+                reverse('api:v2:search-future-teacher-list'),
+                {
+                    'subject': self.subject.id,
+                    'scheduling_datetime': scheduling_datetime.strftime(
+                        '%Y-%m-%dT%H:%M:%S.%fZ'
+                    ),
+                    'duration': '01:00',
+                    'timezone_conf': -5
+                }
+            )
+
+            self.assertEqual(response.status_code, 200)
+
+        # The second search is served from the cache.
+        self.assertEqual(
+            UnmetSearch.objects.filter(student=self.student).count(),
+            2
+        )
+
+
+class SearchCacheVersionTestCase(TestCase):
+    """
+    The version of the searches is only bumped when the values that feed
+    them change.
+    """
+    def setUp(self):
+        cache.clear()
+
+        self.university = University.objects.create(
+            name='University',
+            initial='U'
+        )
+        self.teacher = User.objects.create_user(
+            username='teacher',
+            email='teacher@example.com',
+            password='secret',
+            is_teacher=True,
+            university=self.university
+        )
+        self.slot = Slot.objects.create(
+            teacher=self.teacher,
+            start_time=time(8, 0),
+            end_time=time(12, 0),
+            is_unique=True,
+            date=timezone.now().date() + timedelta(days=1)
+        )
+
+    def assertBumped(self, bumped, save):
+        version = search_cache.get_version(self.university.id)
+        save()
+
+        self.assertEqual(
+            search_cache.get_version(self.university.id) != version,
+            bumped
+        )
+
+    def test_slot_changes(self):
+        slot = Slot.objects.get(pk=self.slot.pk)
+        self.assertBumped(False, slot.save)
+
+        slot.end_time = time(13, 0)
+        self.assertBumped(True, slot.save)
+
+        self.assertBumped(True, slot.delete)
+
+    def test_location_changes(self):
+        location = LocationUser.objects.get(user=self.teacher)
+
+        location.place_description = 'Library'
+        self.assertBumped(False, location.save)
+
+        location.point = GEOSGeometry('SRID=4326;POINT(1 1)')
+        self.assertBumped(True, location.save)
+
+
+class NearestLocationsTestCase(TestCase):
+    """
+    Tests for ```tandlr.users.geo.nearest_locations```, used by the meeting
+    now search.
+    """
+    def create_location(self, username, point):
+        user = User.objects.create_user(
+            username=username,
+            email='{}@example.com'.format(username),
+            password='secret',
+            is_teacher=True
+        )
+
+        if point is not None:
+            LocationUser.objects.filter(
+                user=user
+            ).update(
+                point=GEOSGeometry('SRID=4326;POINT({0} {1})'.format(*point))
+            )
+
+        return user
+
+    def nearest(self, latitude, longitude, **kwargs):
+        return [
+            location.user.username
+            for location in geo.nearest_locations(
+                LocationUser.objects.select_related('user'),
+                latitude,
+                longitude,
+                **kwargs
+            )
+        ]
+
+    def test_ordered_by_great_circle_distance(self):
+        #
+        # Around the latitude 60 a degree of longitude is half as long as a
+        # degree of latitude: the east location is the nearest one (27.8
+        # km), although it's the farthest in degrees.
+        #
+        self.create_location('east', (60, 10.5))
+        self.create_location('north', (60.3, 10))
+
+        # Inside the box of the radius, but outside of the radius (63 km).
+        self.create_location('corner', (60.4, 10.8))
+
+        self.assertEqual(self.nearest(60, 10, radius=50), ['east', 'north'])
+
+    def test_extra_candidates_are_ranked_again(self):
+        #
+        # The KNN operator returns the north location first, the extra
+        # candidates let the east one win.
+        #
+        self.create_location('north', (60.3, 10))
+        self.create_location('east', (60, 10.5))
+
+        self.assertEqual(
+            self.nearest(60, 10, radius=50, limit=1),
+            ['east']
+        )
+
+    def test_placeholders_are_excluded(self):
+        self.create_location('placeholder', None)
+        self.create_location('located', (0.02, 0.02))
+
+        self.assertEqual(self.nearest(0.01, 0.01), ['located'])